@@ -0,0 +1,217 @@
+import argparse
+import csv
+import sys
+import threading
+from pathlib import Path
+
+import numpy as np
+
+# Access point position estimates for every BSSID of a SampleStore in one vectorized pass.
+# Samples are grouped by BSSID once and every step works on all groups at the same time.
+# 1. RSSI-weighted centroid, weights are the received power in mW relative to the group maximum.
+# 2. Log-distance path-loss fit rssi = p0 - 10 * n * log10(d), solved for (x, y, p0, n) of all
+#    BSSIDs together with batched Levenberg-Marquardt, starting from the centroid.
+#    https://en.wikipedia.org/wiki/Log-distance_path_loss_model
+# The confidence radius is twice the standard deviation of the fitted position, or for BSSIDs
+# that cannot be fitted the weighted spread of their samples around the centroid. All distances
+# are in metres, positions are returned in floor plan pixels like the samples.
+
+MIN_FIT_SAMPLES = 5
+MIN_DISTANCE = 1.0
+EXPONENT_RANGE = (1.5, 6.0)
+ITERATIONS = 30
+TABLE_HEADERS = ["bssid", "ssid", "samples", "x", "y", "radius_m", "method", "p0", "exponent", "centroid_x", "centroid_y", "max_rssi"]
+
+
+def group_sums(values, group, count):
+    return np.bincount(group, weights=values, minlength=count)
+
+
+def normal_equations(J, r, group, count):
+    # per BSSID J^T J (count x 4 x 4) and J^T r (count x 4)
+    JTJ = np.empty((count, 4, 4))
+    for i in range(4):
+        for j in range(i, 4):
+            JTJ[:, i, j] = JTJ[:, j, i] = group_sums(J[:, i] * J[:, j], group, count)
+    JTr = np.stack([group_sums(J[:, i] * r, group, count) for i in range(4)], axis=1)
+    return JTJ, JTr
+
+
+def localize(x, y, rssi, group, count, scale, iterations=ITERATIONS):
+    # x, y in pixels, group the BSSID number (0 .. count-1) of every sample
+    xm = np.asarray(x, dtype=np.float64) * scale
+    ym = np.asarray(y, dtype=np.float64) * scale
+    rssi = np.asarray(rssi, dtype=np.float64)
+    samples = np.bincount(group, minlength=count)
+
+    max_rssi = np.full(count, -np.inf)
+    np.maximum.at(max_rssi, group, rssi)
+    w = 10 ** ((rssi - max_rssi[group]) / 10)
+    wsum = group_sums(w, group, count)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cx = group_sums(w * xm, group, count) / wsum
+        cy = group_sums(w * ym, group, count) / wsum
+        spread = np.sqrt(group_sums(w * ((xm - cx[group]) ** 2 + (ym - cy[group]) ** 2), group, count) / wsum)
+
+    # parameters per BSSID: x, y, p0, n
+    theta = np.stack([cx, cy, max_rssi + 10.0, np.full(count, 3.0)], axis=1)
+    fit = samples >= MIN_FIT_SAMPLES
+    theta[~fit] = 0.0
+    damping = np.full(count, 1e-2)
+
+    def residuals(t):
+        dx, dy = t[group, 0] - xm, t[group, 1] - ym
+        d2 = dx * dx + dy * dy + MIN_DISTANCE ** 2
+        predicted = t[group, 2] - 5 * t[group, 3] * np.log10(d2)
+        return rssi - predicted, dx, dy, d2
+
+    r, dx, dy, d2 = residuals(theta)
+    cost = group_sums(r * r, group, count)
+    for _ in range(iterations):
+        # Jacobian of the prediction, one row of four per sample
+        k = -10 * theta[group, 3] / np.log(10) / d2
+        J = np.stack([k * dx, k * dy, np.ones_like(r), -5 * np.log10(d2)], axis=1)
+        JTJ, JTr = normal_equations(J, r, group, count)
+        A = JTJ + damping[:, None, None] * (JTJ * np.eye(4) + 1e-9 * np.eye(4))
+        A[~fit] = np.eye(4)
+        JTr[~fit] = 0.0
+        step = np.linalg.solve(A, JTr[:, :, None])[:, :, 0]
+        candidate = theta + step
+        candidate[:, 3] = np.clip(candidate[:, 3], *EXPONENT_RANGE)
+        r_new, dx_new, dy_new, d2_new = residuals(candidate)
+        cost_new = group_sums(r_new * r_new, group, count)
+        better = fit & (cost_new < cost)
+        theta[better] = candidate[better]
+        cost[better] = cost_new[better]
+        damping = np.where(better, damping / 3, np.minimum(damping * 3, 1e6))
+        accepted = better[group]
+        r = np.where(accepted, r_new, r)
+        dx = np.where(accepted, dx_new, dx)
+        dy = np.where(accepted, dy_new, dy)
+        d2 = np.where(accepted, d2_new, d2)
+
+    # position covariance = sigma^2 * (J^T J)^-1 at the solution
+    k = -10 * theta[group, 3] / np.log(10) / d2
+    J = np.stack([k * dx, k * dy, np.ones_like(r), -5 * np.log10(d2)], axis=1)
+    JTJ, _ = normal_equations(J, r, group, count)
+    JTJ[~fit] = np.eye(4)
+    sigma2 = cost / np.maximum(samples - 4, 1)
+    covariance = np.linalg.pinv(JTJ) * sigma2[:, None, None]
+    radius = 2 * np.sqrt(np.maximum(covariance[:, 0, 0] + covariance[:, 1, 1], 0))
+
+    # a fit that ran far from its samples (or did not converge) is not better than the centroid
+    fitted = fit & np.isfinite(radius) & (radius < 4 * np.maximum(spread, MIN_DISTANCE) + 10)
+    return {
+        "samples": samples,
+        "max_rssi": max_rssi,
+        "centroid_x": cx / scale,
+        "centroid_y": cy / scale,
+        "x": np.where(fitted, theta[:, 0], cx) / scale,
+        "y": np.where(fitted, theta[:, 1], cy) / scale,
+        "radius_m": np.where(fitted, radius, 2 * spread),
+        "p0": np.where(fitted, theta[:, 2], np.nan),
+        "exponent": np.where(fitted, theta[:, 3], np.nan),
+        "fitted": fitted,
+    }
+
+
+def localize_store(store, scale):
+    # every non-empty BSSID of store, in store.bssids() order
+    return localize_arrays(store.to_arrays(), scale)
+
+
+def localize_arrays(arrays, scale):
+    # localize_store for SampleStore.to_arrays output, so it can run on a worker thread while the
+    # store grows. BSSIDs are numbered in order of first appearance, like store.bssids().
+    codes = arrays["bssid"]
+    present, first = np.unique(codes, return_index=True)
+    order = np.argsort(first)
+    present, first = present[order], first[order]
+    named = arrays["bssid.values"][present] != ""
+    present, first = present[named], first[named]
+    lookup = np.full(len(arrays["bssid.values"]), -1, dtype=np.int64)
+    lookup[present] = np.arange(len(present))
+    group = lookup[codes] if len(codes) else np.empty(0, dtype=np.int64)
+    keep = group >= 0
+    result = localize(arrays["x"][keep], arrays["y"][keep], arrays["rssi"][keep], group[keep], len(present), scale)
+    bssids = arrays["bssid.values"][present].tolist()
+    result["bssid"] = bssids
+    result["ssid"] = [ssid or "hidden" for ssid in arrays["ssid.values"][arrays["ssid"][first]].tolist()]
+    result["index"] = {b: i for i, b in enumerate(bssids)}
+    return result
+
+
+class APLocator:
+    # keeps the result for the last (sample version, scale), a new sample invalidates it.
+    # Like ChannelPlanner, result and positions run on a worker thread with a key and arrays taken
+    # on the GUI thread, the cached (key, result) pair is replaced as a whole. Jobs for the same key
+    # wait for the one fit instead of all running it.
+
+    def __init__(self):
+        self._cached = None
+        self._lock = threading.Lock()
+
+    def key(self, store, scale):
+        return (store.version, float(scale))
+
+    def locate(self, store, scale):
+        return self.result(self.key(store, scale), store.to_arrays())
+
+    def result(self, key, arrays):
+        with self._lock:
+            cached = self._cached
+            if cached is None or cached[0] != key:
+                cached = self._cached = (key, localize_arrays(arrays, key[1]))
+            return cached[1]
+
+    def cached(self, key):
+        # the result for key if it has been computed already, else None
+        cached = self._cached
+        return cached[1] if cached is not None and cached[0] == key else None
+
+    def positions(self, key, arrays, bssids):
+        # (x, y, radius in metres) arrays for the given BSSIDs
+        return select(self.result(key, arrays), bssids)
+
+
+def select(result, bssids):
+    rows = [result["index"][b] for b in bssids if b in result["index"]]
+    return result["x"][rows], result["y"][rows], result["radius_m"][rows]
+
+
+def table_rows(result):
+    for i, bssid in enumerate(result["bssid"]):
+        yield [bssid, result["ssid"][i], int(result["samples"][i]),
+               f"{result['x'][i]:.1f}", f"{result['y'][i]:.1f}", f"{result['radius_m'][i]:.1f}",
+               "path_loss" if result["fitted"][i] else "centroid",
+               "" if np.isnan(result["p0"][i]) else f"{result['p0'][i]:.1f}",
+               "" if np.isnan(result["exponent"][i]) else f"{result['exponent'][i]:.2f}",
+               f"{result['centroid_x'][i]:.1f}", f"{result['centroid_y'][i]:.1f}", int(result["max_rssi"][i])]
+
+
+def write_table(result, path):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(TABLE_HEADERS)
+        writer.writerows(table_rows(result))
+    return len(result["bssid"])
+
+
+def main(argv=None):
+    from project_io import read_project
+
+    parser = argparse.ArgumentParser(description="Estimate access point positions of a .wht project")
+    parser.add_argument("project")
+    parser.add_argument("-o", "--output", help="CSV table, defaults to <project>_aps.csv")
+    args = parser.parse_args(argv)
+
+    project = read_project(args.project)
+    result = localize_store(project["store"], float(project["scale"]))
+    output = args.output or str(Path(args.project).with_suffix("")) + "_aps.csv"
+    write_table(result, output)
+    print(f"{output}: {len(result['bssid'])} access point(s), {int(result['fitted'].sum())} fitted")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
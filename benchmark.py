@@ -0,0 +1,203 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tomllib
+from pathlib import Path
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import numpy as np
+from PyQt6 import QtWidgets
+from PyQt6.QtCore import Qt
+
+import heatmap_engine
+from project_io import write_project
+from synthetic_survey import survey_for_rows, generate_floorplan
+
+# Headless benchmarks of the real MainWindow code paths on synthetic surveys.
+# python benchmark.py --sizes 1000 10000 100000 --output results.json --compare previous.json
+
+BASE_DIR = Path(__file__).resolve().parent
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(fn):
+        BENCHMARKS[name] = fn
+        return fn
+    return register
+
+
+def wait_for_heatmaps(app, window):
+    while window.pending_heatmaps:
+        app.processEvents()
+        time.sleep(0.001)
+
+
+def wait_for_io(app, window, key):
+    while window.io_worker.is_pending(key):
+        app.processEvents()
+        time.sleep(0.001)
+
+
+def largest_network(window):
+    items = [window.listSSID.item(i) for i in range(window.listSSID.count())]
+    item = max(items, key=lambda item: len(window.scan_results.rows_for_bssids(item.data(Qt.ItemDataRole.UserRole))))
+    return item.data(Qt.ItemDataRole.UserRole), item.text()
+
+
+# every benchmark returns (setup, run), only run is timed
+@benchmark("interpolation")
+def bench_interpolation(app, window, survey):
+    bssids, key = largest_network(window)
+    X, Y, rssi = window.scan_results.heatmap_input(bssids)
+    run = lambda: heatmap_engine.compute_heatmap(X, Y, rssi, window.image_width_pixels, window.image_height_pixels, window.scale, method=window.interpolation)
+    return None, run
+
+
+@benchmark("plot_wifi_heatmap_griddata")
+def bench_plot(app, window, survey):
+    bssids, key = largest_network(window)
+
+    def setup():
+        window.heatmap_cache.clear()
+        window.remove_ap_markers()
+
+    def run():
+        window.plot_wifi_heatmap_griddata(bssid_list=bssids, key=key)
+        wait_for_heatmaps(app, window)
+    return setup, run
+
+
+@benchmark("import_project")
+def bench_import(app, window, survey):
+    def run():
+        window.import_project()
+        wait_for_io(app, window, "import")
+    return None, run
+
+
+@benchmark("save_project_dialog")
+def bench_save(app, window, survey):
+    return None, window.save_project_dialog
+
+
+@benchmark("build_map_ui_markers_from_scan_results")
+def bench_markers(app, window, survey):
+    return None, window.build_map_ui_markers_from_scan_results
+
+
+@benchmark("update_list_widget")
+def bench_list(app, window, survey):
+    return window.clear_network_list, lambda: window.update_list_widget(survey)
+
+
+@benchmark("update_table_from_latest_scan")
+def bench_table(app, window, survey):
+    def setup():
+        window.scan_table.clear()
+        window.latest_scan = survey
+    return setup, window.update_table_from_latest_scan
+
+
+def measure(setup, run, repeat):
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def environment():
+    with open(BASE_DIR / "pyproject.toml", "rb") as f:
+        version = tomllib.load(f)["project"]["version"]
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    return {"version": version, "commit": commit, "python": platform.python_version(), "numpy": np.__version__, "platform": platform.platform()}
+
+
+def run_benchmarks(sizes, repeat, selected, bssids_per_scan):
+    # main.py finds wifi_UI.ui and the icons relative to the working directory
+    cwd = os.getcwd()
+    os.chdir(BASE_DIR)
+    import main
+    from scanner import ReplayScanner
+
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv)
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        # no scans and a journal of its own, the benchmark never touches lswifi or the user's capture journal
+        trace_path = os.path.join(workdir, "no_scans.jsonl")
+        Path(trace_path).write_text("")
+        for size in sizes:
+            survey = survey_for_rows(size, bssids_per_scan=bssids_per_scan)
+            project_path = os.path.join(workdir, f"survey_{size}.wht")
+            floorplan = generate_floorplan()
+            write_project(project_path, survey, floorplan, 0.02)
+            floorplan_path = os.path.join(workdir, "floorplan_source.png")
+            floorplan.save(floorplan_path)
+
+            os.chdir(BASE_DIR)
+            window = main.MainWindow(ReplayScanner(trace_path), journal_dir=os.path.join(workdir, "capture_journal"))
+            # the dialogs are replaced so save/open run without user input
+            QtWidgets.QFileDialog.getOpenFileName = staticmethod(lambda *args, **kwargs: (project_path, ""))
+            QtWidgets.QFileDialog.getSaveFileName = staticmethod(lambda *args, **kwargs: (os.path.join(workdir, "saved.wht"), ""))
+            os.chdir(workdir)
+            window.import_project()
+            wait_for_io(app, window, "import")
+            window.current_image_path = floorplan_path
+
+            for name in selected:
+                setup, run = BENCHMARKS[name](app, window, survey)
+                times = measure(setup, run, repeat)
+                results.append({"name": name, "rows": size, "repeat": repeat, "min": min(times),
+                                "median": statistics.median(times), "mean": statistics.fmean(times)})
+                print(f"{name:<40} {size:>8} rows  min {min(times) * 1000:10.2f} ms  median {statistics.median(times) * 1000:10.2f} ms", flush=True)
+            window.close()
+            window.deleteLater()
+            app.processEvents()
+        os.chdir(cwd)
+    return results
+
+
+def compare(results, previous_path):
+    with open(previous_path) as f:
+        previous = {(r["name"], r["rows"]): r for r in json.load(f)["results"]}
+    for r in results:
+        old = previous.get((r["name"], r["rows"]))
+        if old:
+            print(f"{r['name']:<40} {r['rows']:>8} rows  {old['median'] / r['median']:6.2f}x vs previous")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark WiFi Heatmap Tool code paths on synthetic surveys")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1000, 10000, 100000], help="number of scan_results rows")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--bssids-per-scan", type=int, default=20)
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", help="results file of a previous run")
+    args = parser.parse_args(argv)
+
+    output = os.path.abspath(args.output)
+    results = run_benchmarks(args.sizes, args.repeat, args.only, args.bssids_per_scan)
+    with open(output, "w") as f:
+        json.dump({"environment": environment(), "results": results}, f, indent=2)
+    if args.compare:
+        compare(results, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
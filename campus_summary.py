@@ -0,0 +1,139 @@
+import argparse
+import csv
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+
+import heatmap_engine
+from footprint import Footprint
+from project_io import read_project
+from sample_bins import SampleAggregator
+
+# Campus-wide summary of many .wht projects, one per floor. Every floor is loaded and all its
+# networks are interpolated in a worker process, floors are independent so the run scales with
+# the number of cores up to the number of floors. Only the small per-network statistics (and,
+# with --heatmaps, the grids saved by the worker) come back to the parent process.
+# Every floor is interpolated like the GUI shows it: the samples are merged with the project's
+# aggregation settings and the heatmap is limited to its saved building footprint, so coverage
+# is the share of the building, not of the whole image. A floor that fails is reported in
+# "errors" and the others are still summarized.
+# python campus_summary.py building/*.wht -o campus.json --csv coverage.csv --threshold -67
+
+DEFAULT_THRESHOLD = -67
+
+
+def summarize_floor(path, threshold=DEFAULT_THRESHOLD, grid_scale=heatmap_engine.GRID_SCALE, sigma=heatmap_engine.SIGMA,
+                    method=None, heatmap_dir=None, use_footprint=True):
+    project = read_project(path)
+    store = project["store"]
+    width, height = project["image"].size
+    scale = float(project["scale"])
+    method = method or project.get("interpolation", heatmap_engine.DEFAULT_METHOD)
+    floor = project.get("floor") or Path(path).stem
+    mask = None
+    if use_footprint and project.get("footprint_bytes") and project.get("footprint_enabled", True):
+        mask = Footprint.from_png(project["footprint_bytes"], width, height).grid(grid_scale)
+    aggregator = SampleAggregator(**(project.get("aggregation") or {}))
+    bssid_values = store.dictionary("bssid")
+
+    networks = {}
+    grids = {}
+    for key in store.network_keys():
+        rows = store.rows_for_network(key)
+        first = store.row(rows[0])
+        bssids = [bssid_values[code] for code in np.unique(store.codes("bssid")[rows]).tolist()]
+        stats = {"ssid": first["ssid"] or "hidden", "band": heatmap_engine.convert_frequency(first["channel_frequency"]),
+                 "samples": len(rows), "bssids": len(bssids),
+                 "max_rssi": int(store.rssi[rows].max()), "coverage": None}
+        if aggregator.radius > 0:
+            x, y, rssi = aggregator.heatmap_input(store, scale, bssids)
+        else:
+            x, y, rssi = store.x[rows], store.y[rows], store.rssi[rows]
+        try:
+            grid = heatmap_engine.compute_heatmap(x, y, rssi, width, height, scale, grid_scale=grid_scale, sigma=sigma, method=method, mask=mask)
+        except ValueError:
+            grid = None
+        if grid is not None:
+            # share of the interpolated floor area (inside the footprint) at or above the threshold
+            cells = np.isfinite(grid)
+            stats["coverage"] = float(np.count_nonzero(grid[cells] >= threshold) / max(np.count_nonzero(cells), 1))
+            grids[key] = grid
+        networks[key] = stats
+    if heatmap_dir and grids:
+        Path(heatmap_dir).mkdir(parents=True, exist_ok=True)
+        np.savez_compressed(Path(heatmap_dir) / f"{Path(path).stem}.npz", **grids)
+
+    bssids = {bssid: store.row(store.bssid_index[bssid].array[0])["ssid"] or "hidden" for bssid in store.bssids() if bssid}
+    return {"floor": floor, "path": str(path), "samples": len(store), "networks": networks, "bssids": bssids}
+
+
+def summarize_campus(paths, threshold=DEFAULT_THRESHOLD, workers=None, **kwargs):
+    floors = []
+    errors = {}
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        futures = {pool.submit(summarize_floor, path, threshold, **kwargs): path for path in paths}
+        for future in as_completed(futures):
+            try:
+                floors.append(future.result())
+            except Exception as e:
+                # one broken floor does not abort the campus
+                errors[str(futures[future])] = f"{type(e).__name__}: {e}"
+    order = {str(path): i for i, path in enumerate(paths)}
+    floors.sort(key=lambda floor: order[floor["path"]])
+    return campus_statistics(floors, threshold, errors)
+
+
+def campus_statistics(floors, threshold, errors=None):
+    coverage = {}
+    bssid_floors = {}
+    for floor in floors:
+        for key, stats in floor["networks"].items():
+            coverage.setdefault(key, {})[floor["floor"]] = stats["coverage"]
+        for bssid in floor["bssids"]:
+            bssid_floors.setdefault(bssid, []).append(floor["floor"])
+    return {"threshold": threshold, "floors": floors, "coverage": coverage, "bssid_floors": bssid_floors, "errors": errors or {}}
+
+
+def write_coverage_csv(path, campus):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["floor", "network", "ssid", "band", "samples", "bssids", "max_rssi", f"coverage_{campus['threshold']}dbm"])
+        for floor in campus["floors"]:
+            for key, stats in floor["networks"].items():
+                coverage = "" if stats["coverage"] is None else f"{stats['coverage'] * 100:.1f}"
+                writer.writerow([floor["floor"], key, stats["ssid"], stats["band"], stats["samples"], stats["bssids"], stats["max_rssi"], coverage])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize coverage of many .wht projects (one per floor)")
+    parser.add_argument("projects", nargs="+", help=".wht project files")
+    parser.add_argument("-o", "--output", default="campus.json")
+    parser.add_argument("--csv", help="also write per floor and network coverage as CSV")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="RSSI (dBm) counted as covered")
+    parser.add_argument("--workers", type=int, help="worker processes, defaults to the number of CPUs")
+    parser.add_argument("--grid-scale", type=int, default=heatmap_engine.GRID_SCALE)
+    parser.add_argument("--sigma", type=float, default=heatmap_engine.SIGMA)
+    parser.add_argument("--method", choices=list(heatmap_engine.INTERPOLATORS), help="interpolation method, defaults to the one saved in each project")
+    parser.add_argument("--heatmaps", help="directory for the per floor heatmap grids (.npz, one array per network)")
+    parser.add_argument("--no-footprint", action="store_true", help="ignore the building footprints saved in the projects")
+    args = parser.parse_args(argv)
+
+    campus = summarize_campus(args.projects, args.threshold, args.workers, grid_scale=args.grid_scale, sigma=args.sigma,
+                              method=args.method, heatmap_dir=args.heatmaps, use_footprint=not args.no_footprint)
+    with open(args.output, "w") as f:
+        json.dump(campus, f, indent=2)
+    if args.csv:
+        write_coverage_csv(args.csv, campus)
+    for floor in campus["floors"]:
+        print(f"{floor['floor']}: {len(floor['networks'])} network(s), {len(floor['bssids'])} BSSID(s)")
+    for path, error in campus["errors"].items():
+        print(f"{path}: {error}", file=sys.stderr)
+    return 1 if campus["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
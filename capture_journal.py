@@ -0,0 +1,181 @@
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+
+import numpy as np
+
+from sample_store import FLOAT_COLUMNS, INT_COLUMNS, CODED_COLUMNS
+
+# On-disk copy of a capture session, so a crash or closing the window during a survey does not
+# lose the samples that were not saved to a project yet. It mirrors SampleStore: samples.bin is a
+# row count followed by one fixed size record per sample (x, y, rssi and the dictionary codes) and
+# strings.jsonl holds the dictionary values in code order.
+# The journal is the storage of the capture SampleStore, its sample columns are the record fields
+# mapped from samples.bin, so the rows are written to the file as they are captured and the OS
+# can page them out, only the indexes and dictionaries stay in memory. An append writes the new
+# strings and then the row count, os.fsync runs at most every FSYNC_INTERVAL seconds, records
+# before the count. Resuming maps the records again, rows past the count are ignored.
+# https://numpy.org/doc/stable/reference/generated/numpy.memmap.html
+
+FSYNC_INTERVAL = 5.0
+SESSION_FILE = "session.json"
+SAMPLES_FILE = "samples.bin"
+STRINGS_FILE = "strings.jsonl"
+HEADER = np.dtype([("count", "<i8")])
+RECORD = np.dtype([(name, "<f8") for name in FLOAT_COLUMNS] + [(name, "<i4") for name in INT_COLUMNS + CODED_COLUMNS])
+
+
+class CaptureJournal:
+
+    def __init__(self, directory, fsync_interval=FSYNC_INTERVAL):
+        self.directory = Path(directory)
+        self.fsync_interval = fsync_interval
+        self._strings = None
+        self._header = None
+        self._records = None
+        self._columns = {}
+        self._store = None
+        self._written = 0
+        self._in_file = 0
+        self._strings_written = {}
+        self._last_sync = 0.0
+
+    def exists(self):
+        return (self.directory / SESSION_FILE).exists()
+
+    def is_open(self):
+        return self._strings is not None
+
+    def start(self, session, floorplan_bytes, image_file, store):
+        # session holds the project settings (scale, interpolation, ...) needed to resume, the rows
+        # of store are kept in the journal from now on
+        self.discard()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        (self.directory / image_file).write_bytes(floorplan_bytes)
+        self._write_session({**session, "image_file": image_file, "started": time.time()})
+        (self.directory / SAMPLES_FILE).write_bytes(np.zeros(1, dtype=HEADER).tobytes())
+        self._open(0, {name: 0 for name in CODED_COLUMNS})
+        self._attach(store)
+
+    def _write_session(self, session):
+        tmp = self.directory / (SESSION_FILE + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(session, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.directory / SESSION_FILE)
+
+    def _open(self, written, strings_written):
+        self._strings = open(self.directory / STRINGS_FILE, "a", encoding="utf-8")
+        self._header = np.memmap(self.directory / SAMPLES_FILE, dtype=HEADER, mode="r+", shape=(1,))
+        self._records = None
+        self._columns = {}
+        self._written = self._in_file = written
+        self._strings_written = strings_written
+        self._last_sync = time.monotonic()
+
+    def _attach(self, store):
+        self._store = store
+        store.set_storage(self)
+
+    def allocate(self, columns, size, capacity):
+        # SampleStore storage, the columns become the record fields of samples.bin mapped for
+        # capacity rows (numpy extends the file). Rows that are not in the file yet are copied.
+        if self._strings is None or capacity == 0:
+            return None
+        records = np.memmap(self.directory / SAMPLES_FILE, dtype=RECORD, mode="r+", offset=HEADER.itemsize, shape=(capacity,))
+        mapped = {name: records[name] for name in RECORD.names}
+        for name in RECORD.names:
+            if columns[name] is not self._columns.get(name):
+                mapped[name][self._in_file:size] = columns[name][self._in_file:size]
+        self._in_file = size
+        self._records, self._columns = records, mapped
+        return mapped
+
+    def append(self, store):
+        # writes the dictionary values added to store since the previous append and the new row
+        # count, the rows themselves are already in the mapping
+        if self._strings is None:
+            return
+        for name in CODED_COLUMNS:
+            values = store.dictionary(name)
+            for value in values[self._strings_written[name]:]:
+                self._strings.write(json.dumps([name, value]) + "\n")
+            self._strings_written[name] = len(values)
+        # strings first, so a record never refers to a value that is not on disk yet
+        self._strings.flush()
+        n = len(store)
+        if n > self._written:
+            self._header["count"] = n
+            self._written = self._in_file = n
+        if time.monotonic() - self._last_sync >= self.fsync_interval:
+            self.sync()
+
+    def sync(self):
+        if self._strings is None:
+            return
+        self._strings.flush()
+        os.fsync(self._strings.fileno())
+        if self._records is not None:
+            self._records.flush()
+        self._header.flush()
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        # the store keeps its mapped columns, they move to memory when it grows again
+        if self._strings is None:
+            return
+        self.sync()
+        self._strings.close()
+        self._strings = self._header = self._records = None
+        self._columns = {}
+
+    def discard(self):
+        store, self._store = self._store, None
+        if store is not None and store.storage is self:
+            store.set_storage(None)
+        self.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def load(self):
+        # -> (session, floorplan bytes, arrays for SampleStore.load_arrays), the arrays are mapped from samples.bin
+        session = json.loads((self.directory / SESSION_FILE).read_text())
+        floorplan_bytes = (self.directory / session["image_file"]).read_bytes()
+        values = {name: [] for name in CODED_COLUMNS}
+        strings_path = self.directory / STRINGS_FILE
+        if strings_path.exists():
+            with open(strings_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        name, value = json.loads(line)
+                    except ValueError:
+                        break
+                    values[name].append(value)
+        samples_path = self.directory / SAMPLES_FILE
+        size = samples_path.stat().st_size if samples_path.exists() else 0
+        count = 0
+        if size >= HEADER.itemsize:
+            count = min(int(np.fromfile(samples_path, dtype=HEADER, count=1)["count"][0]), (size - HEADER.itemsize) // RECORD.itemsize)
+        records = np.memmap(samples_path, dtype=RECORD, mode="r", offset=HEADER.itemsize, shape=(count,)) if count > 0 else np.empty(0, dtype=RECORD)
+        valid = np.ones(len(records), dtype=bool)
+        for name in CODED_COLUMNS:
+            valid &= (records[name] >= 0) & (records[name] < len(values[name]))
+        count = int(np.argmin(valid)) if not valid.all() else len(records)
+        arrays = {name: records[name][:count] for name in RECORD.names}
+        for name in CODED_COLUMNS:
+            arrays[f"{name}.values"] = np.array(values[name], dtype=str)
+        return session, floorplan_bytes, arrays
+
+    def resume(self, store):
+        # store holds what load returned, appending continues after its rows
+        tmp = self.directory / (STRINGS_FILE + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            for name in CODED_COLUMNS:
+                for value in store.dictionary(name):
+                    f.write(json.dumps([name, value]) + "\n")
+        os.replace(tmp, self.directory / STRINGS_FILE)
+        self._open(len(store), {name: len(store.dictionary(name)) for name in CODED_COLUMNS})
+        self._header["count"] = len(store)
+        self._attach(store)
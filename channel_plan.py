@@ -0,0 +1,290 @@
+import argparse
+import csv
+import hashlib
+import sys
+from pathlib import Path
+
+import numpy as np
+
+import heatmap_engine
+from sample_store import numeric_table
+
+# Channel-plan analytics of a whole survey in one batched pass over the SampleStore columns.
+# Every row gets its band (heatmap_engine.convert_frequency) and the frequency span its channel occupies: 20 MHz
+# around the primary channel, wider channels cover their aligned 40/80/160 MHz block (5 GHz
+# blocks start at 5170 MHz and at 5735 MHz for UNII-3, 6 GHz at 5945 MHz, 2.4 GHz 40 MHz
+# channels extend up from channels 1-7 and down from the rest).
+# Virtual BSSIDs of one radio (several SSIDs on the same channel) usually differ only in the last
+# hex digit of the MAC, they are merged into one radio so they are not counted as interferers.
+# Per location and band the strongest radio is the serving one, the other radios heard at or
+# above the threshold are
+# - co-channel when their span shares at least one 20 MHz channel with the serving radio
+# - adjacent-channel when the spans overlap by less than that (2.4 GHz channels 1 and 3)
+# Per channel: radios using it as primary, share of the locations where it is occupied (a
+# radio overlapping it heard above the threshold), mean number of such radios there (contention)
+# and share of the locations it serves.
+# The analysis works on SampleStore.to_arrays (column views and the dictionaries), taken on the
+# GUI thread, so the heatmap layers are analyzed and interpolated on the heatmap worker.
+# Results are keyed by a hash of the columns the analysis reads, so a heatmap cache key built from
+# it stays valid after the project is saved and opened again, like the per-network keys.
+# https://en.wikipedia.org/wiki/List_of_WLAN_channels
+
+BANDS = ("2.4 GHz", "5 GHz", "6 GHz")
+DEFAULT_THRESHOLD = -82
+CO_CHANNEL_OVERLAP = 20
+METRICS = {
+    # metric: (label, heatmap levels)
+    "co_channel": ("Co-channel interference", (0, 5)),
+    "adjacent": ("Adjacent-channel interference", (0, 5)),
+    "aps": ("APs above threshold", (0, 10)),
+}
+# the coded columns analyze_arrays reads, they are part of the content hash
+HASHED_COLUMNS = ("bssid", "channel_frequency", "channel_number", "channel_width")
+TABLE_HEADERS = ["band", "channel", "frequency_mhz", "radios", "bssids", "occupied_pct", "serving_pct", "mean_contenders"]
+
+
+def band_codes(frequencies):
+    # BANDS index of every channel_frequency dictionary value, -1 for unknown
+    codes = []
+    for value in frequencies:
+        try:
+            band = heatmap_engine.convert_frequency(value)
+        except ValueError:
+            band = "Unknown"
+        codes.append(BANDS.index(band) if band in BANDS else -1)
+    return np.array(codes, dtype=np.int64)
+
+
+def channel_spans(centre, width, channel, band):
+    # (low, high) MHz edges of the occupied spectrum around the primary channel centre
+    width = np.where(np.isfinite(width) & (width > 20), width, 20.0)
+    low = centre - 10
+    bonded = width > 20
+    two_four = bonded & (band == 0)
+    low[two_four] = np.where(channel[two_four] <= 7, centre[two_four] - 10, centre[two_four] + 10 - width[two_four])
+    base = np.where(band == 2, 5945.0, np.where(centre >= 5735, 5735.0, 5170.0))
+    block = bonded & (band > 0)
+    low[block] = base[block] + np.floor((centre[block] - base[block]) / width[block]) * width[block]
+    return low, low + width
+
+
+def radio_codes(arrays, group_radios=True):
+    # radio number of every row, per BSSID when group_radios is off
+    bssids = arrays["bssid.values"]
+    if group_radios:
+        macs = [bssid.lower()[:-1] for bssid in bssids]
+        _, mac_codes = np.unique(np.array(macs, dtype=object), return_inverse=True)
+    else:
+        mac_codes = np.arange(len(bssids))
+    pairs = mac_codes[arrays["bssid"]].astype(np.int64) * max(len(arrays["channel_frequency.values"]), 1) + arrays["channel_frequency"]
+    _, radio = np.unique(pairs, return_inverse=True)
+    return radio
+
+
+def analyze(x, y, rssi, radio, bssid, band, primary, low, high, channel, threshold=DEFAULT_THRESHOLD):
+    # per row arrays: band the BANDS index (-1 rows are skipped), primary the primary channel
+    # frequency and low, high the occupied span in MHz
+    first_rows, location = location_codes(x, y)
+    n_locations = len(first_rows)
+    rows = np.flatnonzero(band >= 0)
+
+    # strongest sample of every (location, radio)
+    key = location[rows].astype(np.int64) * (int(radio.max(initial=0)) + 1) + radio[rows]
+    order = np.lexsort((-rssi[rows], key))
+    first = np.r_[True, key[order][1:] != key[order][:-1]]
+    e = rows[order[first]]
+    e_location, e_band, e_rssi, e_low, e_high = location[e], band[e], rssi[e], low[e], high[e]
+
+    # the strongest radio of every (location, band) group serves it, ties go to the lowest radio number
+    group_key = e_location * len(BANDS) + e_band
+    order = np.lexsort((radio[e], -e_rssi, group_key))
+    e, e_location, e_band, e_rssi, e_low, e_high, group_key = (a[order] for a in (e, e_location, e_band, e_rssi, e_low, e_high, group_key))
+    serving = np.r_[True, group_key[1:] != group_key[:-1]]
+    group = np.cumsum(serving) - 1
+    heads = np.flatnonzero(serving)
+    overlap = np.minimum(e_high, e_high[heads][group]) - np.maximum(e_low, e_low[heads][group])
+    strong = e_rssi >= threshold
+    other = strong & ~serving
+    shape = (n_locations, len(BANDS))
+    cells = (e_location[heads], e_band[heads])
+
+    def per_group(values):
+        out = np.zeros(shape)
+        out[cells] = np.bincount(group, weights=values, minlength=len(heads))
+        return out
+
+    serving_rssi = np.full(shape, np.nan)
+    serving_rssi[cells] = e_rssi[heads]
+    result = {
+        "threshold": threshold,
+        "x": x[first_rows],
+        "y": y[first_rows],
+        "heard": ~np.isnan(serving_rssi),
+        "serving_rssi": serving_rssi,
+        "co_channel": per_group(other & (overlap >= CO_CHANNEL_OVERLAP)),
+        "adjacent": per_group(other & (overlap > 0) & (overlap < CO_CHANNEL_OVERLAP)),
+        "aps": per_group(strong),
+    }
+
+    # channels are the primary 20 MHz channels seen in the survey
+    channels, channel_rows, row_channel = np.unique(band[rows] * 100_000 + primary[rows].astype(np.int64), return_index=True, return_inverse=True)
+    n_channels = len(channels)
+    ch_band, ch_centre = channels // 100_000, (channels % 100_000).astype(float)
+    e_channel = np.empty(len(band), dtype=np.int64)
+    e_channel[rows] = row_channel
+    e_channel = e_channel[e]
+
+    # radios occupying each channel at each location, one batch over the (strong entry, channel) pairs
+    s = np.flatnonzero(strong)
+    pair_overlap = np.minimum(e_high[s, None], ch_centre[None, :] + 10) - np.maximum(e_low[s, None], ch_centre[None, :] - 10)
+    pair_entry, pair_channel = np.nonzero((pair_overlap >= CO_CHANNEL_OVERLAP) & (e_band[s, None] == ch_band[None, :]))
+    counts = np.bincount(e_location[s][pair_entry] * n_channels + pair_channel, minlength=n_locations * n_channels).reshape(n_locations, n_channels)
+    band_locations = np.maximum(result["heard"].sum(axis=0), 1)[ch_band]
+    occupied = np.count_nonzero(counts, axis=0)
+    result["channels"] = {
+        "band": ch_band,
+        "channel": channel[rows][channel_rows],
+        "frequency": ch_centre,
+        "radios": distinct_count(row_channel, radio[rows], n_channels),
+        "bssids": distinct_count(row_channel, bssid[rows], n_channels),
+        "occupied": occupied / band_locations,
+        "serving": np.bincount(e_channel[heads], minlength=n_channels) / band_locations,
+        "contention": counts.sum(axis=0) / np.maximum(occupied, 1),
+    }
+    return result
+
+
+def location_codes(x, y):
+    # (first row of every survey location, location number of every row)
+    order = np.lexsort((y, x))
+    change = np.r_[True, (np.diff(x[order]) != 0) | (np.diff(y[order]) != 0)]
+    location = np.empty(len(x), dtype=np.int64)
+    location[order] = np.cumsum(change) - 1
+    return order[change], location
+
+
+def distinct_count(index, values, count):
+    # number of distinct values per index
+    pairs = np.unique(index.astype(np.int64) * (int(values.max(initial=0)) + 1) + values)
+    return np.bincount(pairs // (int(values.max(initial=0)) + 1), minlength=count)
+
+
+def analyze_arrays(arrays, threshold=DEFAULT_THRESHOLD, group_radios=True):
+    # arrays as SampleStore.to_arrays returns them
+    def numeric(name):
+        return numeric_table(arrays[f"{name}.values"])[arrays[name]]
+
+    band = band_codes(arrays["channel_frequency.values"])[arrays["channel_frequency"]]
+    channel = numeric("channel_number")
+    primary = np.round(numeric("channel_frequency") * 1000)
+    low, high = channel_spans(primary, numeric("channel_width"), channel, band)
+    band[~np.isfinite(primary)] = -1
+    return analyze(arrays["x"], arrays["y"], arrays["rssi"], radio_codes(arrays, group_radios), arrays["bssid"].astype(np.int64),
+                   band, primary, low, high, channel, threshold)
+
+
+def analyze_store(store, threshold=DEFAULT_THRESHOLD, group_radios=True):
+    return analyze_arrays(store.to_arrays(), threshold, group_radios)
+
+
+class ChannelPlanner:
+    # keeps the result for the last (sample content, threshold, radio grouping), like APLocator.
+    # compute_layer runs on a worker thread, the cached (key, result) pair is replaced as a whole.
+    # key runs on the GUI thread: rows are only ever appended, so the content hash is a running
+    # hash of the row records that only reads the rows added since the last call.
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, group_radios=True):
+        self.threshold = threshold
+        self.group_radios = group_radios
+        self._cached = None
+        self._digest = None
+
+    def key(self, store):
+        digest = self._digest
+        if digest is None or digest[0] != store.generation or digest[1] > len(store):
+            digest = (store.generation, 0, hashlib.blake2b(digest_size=16))
+        generation, done, h = digest
+        n = len(store)
+        if n > done:
+            columns = [store.x[done:n], store.y[done:n], store.rssi[done:n]] + [store.codes(name)[done:n] for name in HASHED_COLUMNS]
+            h.update(np.column_stack(columns).astype(np.float64).tobytes())
+        self._digest = (generation, n, h)
+        h = h.copy()
+        for name in HASHED_COLUMNS:
+            h.update("\n".join(store.dictionary(name)).encode() + b"|")
+        return (h.hexdigest(), self.threshold, self.group_radios)
+
+    def result(self, key, arrays):
+        cached = self._cached
+        if cached is None or cached[0] != key:
+            cached = self._cached = (key, analyze_arrays(arrays, key[1], key[2]))
+        return cached[1]
+
+    def compute_layer(self, key, arrays, metric, band, width_pixels, height_pixels, scale, **kwargs):
+        # heatmap of one metric and band over every survey location, 0 where the band was not
+        # heard, None with fewer than MIN_SAMPLES locations, and the channel_summary of the band
+        result = self.result(key, arrays)
+        grid = heatmap_engine.compute_heatmap(result["x"], result["y"], result[metric][:, BANDS.index(band)],
+                                              width_pixels, height_pixels, scale, **kwargs)
+        return grid, channel_summary(result, band)
+
+
+def channel_summary(result, band):
+    # (channel, radios, occupied share) rows of the channels of band, by frequency
+    channels = result["channels"]
+    rows = [i for i in np.argsort(channels["frequency"]) if BANDS[channels["band"][i]] == band]
+    return np.array([(channels["channel"][i], channels["radios"][i], channels["occupied"][i]) for i in rows], dtype=np.float64).reshape(-1, 3)
+
+
+def table_rows(result):
+    channels = result["channels"]
+    for i in np.lexsort((channels["frequency"], channels["band"])):
+        yield [BANDS[channels["band"][i]], f"{channels['channel'][i]:g}", f"{channels['frequency'][i]:g}",
+               int(channels["radios"][i]), int(channels["bssids"][i]), f"{100 * channels['occupied'][i]:.1f}",
+               f"{100 * channels['serving'][i]:.1f}", f"{channels['contention'][i]:.2f}"]
+
+
+def write_table(result, path):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(TABLE_HEADERS)
+        writer.writerows(table_rows(result))
+    return len(result["channels"]["band"])
+
+
+def band_summary(result):
+    # {band: {"locations", "mean_co_channel", "p90_co_channel", "co_channel_pct", "mean_aps"}} of the heard bands
+    summary = {}
+    for b, band in enumerate(BANDS):
+        heard = result["heard"][:, b]
+        if not heard.any():
+            continue
+        co = result["co_channel"][heard, b]
+        summary[band] = {"locations": int(heard.sum()), "mean_co_channel": float(co.mean()), "p90_co_channel": float(np.percentile(co, 90)),
+                         "co_channel_pct": float(100 * np.count_nonzero(co) / len(co)), "mean_aps": float(result["aps"][heard, b].mean())}
+    return summary
+
+
+def main(argv=None):
+    from project_io import read_project
+
+    parser = argparse.ArgumentParser(description="Channel plan review of a .wht project")
+    parser.add_argument("project")
+    parser.add_argument("-o", "--output", help="per channel CSV table, defaults to <project>_channels.csv")
+    parser.add_argument("--threshold", type=int, default=DEFAULT_THRESHOLD, help="dBm at which a radio counts as heard")
+    parser.add_argument("--per-bssid", action="store_true", help="do not merge the virtual BSSIDs of a radio")
+    args = parser.parse_args(argv)
+
+    project = read_project(args.project)
+    result = analyze_store(project["store"], args.threshold, not args.per_bssid)
+    output = args.output or str(Path(args.project).with_suffix("")) + "_channels.csv"
+    write_table(result, output)
+    print(f"{output}: {len(result['channels']['band'])} channel(s) at {len(result['x'])} location(s)")
+    for band, stats in band_summary(result).items():
+        print(f"{band}: {stats['locations']} locations, co-channel radios mean {stats['mean_co_channel']:.2f} p90 {stats['p90_co_channel']:g}, "
+              f"{stats['co_channel_pct']:.0f} % of locations with co-channel interference, {stats['mean_aps']:.1f} APs above {args.threshold} dBm")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
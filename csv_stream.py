@@ -0,0 +1,79 @@
+import csv
+import gzip
+import io
+import os
+
+import numpy as np
+
+from sample_store import CSV_HEADERS, CODED_COLUMNS, SampleStore
+
+# Chunked CSV import and export of a SampleStore, the schema is CSV_HEADERS. Only one chunk of
+# CHUNK_ROWS rows is ever held as Python strings, on import each chunk goes straight into the
+# typed columns with SampleStore.extend_columns. Paths ending in .gz are gzip compressed.
+# progress(done, total) is called after every chunk, rows on export and bytes on import.
+
+CHUNK_ROWS = 20_000
+
+
+def is_gzip(path):
+    return str(path).lower().endswith(".gz")
+
+
+def export_csv(store, path, progress=None, chunk_rows=CHUNK_ROWS):
+    # the rows present when the export starts are written, a capture may keep appending meanwhile
+    total = len(store)
+    opener = gzip.open if is_gzip(path) else open
+    with opener(path, "wt", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_HEADERS)
+        for start in range(0, total, chunk_rows):
+            stop = min(start + chunk_rows, total)
+            columns = {"x": store.x[start:stop].tolist(), "y": store.y[start:stop].tolist(), "rssi": store.rssi[start:stop].tolist()}
+            for name in CODED_COLUMNS:
+                values = store.dictionary(name)
+                columns[name] = [values[code] for code in store.codes(name)[start:stop].tolist()]
+            writer.writerows(zip(*(columns[name] for name in CSV_HEADERS)))
+            if progress is not None:
+                progress(stop, total)
+    return total
+
+
+def read_chunks(f, chunk_rows=CHUNK_ROWS):
+    # f is a text file, yields (x, y, rssi, coded) column chunks for SampleStore.extend_columns
+    reader = csv.reader(f)
+    header = next(reader, None)
+    if header is None:
+        return
+    position = {name: i for i, name in enumerate(header)}
+    for name in ("x", "y", "rssi"):
+        if name not in position:
+            raise ValueError(f"CSV has no {name} column")
+    while True:
+        rows = [row for _, row in zip(range(chunk_rows), reader) if row]
+        if not rows:
+            return
+        width = len(header)
+        rows = [row if len(row) >= width else row + [""] * (width - len(row)) for row in rows]
+        columns = list(zip(*rows))
+        x = np.array(columns[position["x"]], dtype=np.float64)
+        y = np.array(columns[position["y"]], dtype=np.float64)
+        rssi = np.array(columns[position["rssi"]], dtype=np.float64).astype(np.int32)
+        coded = {name: list(columns[position[name]]) for name in CODED_COLUMNS if name in position}
+        yield x, y, rssi, coded
+
+
+def import_stream(raw, total_bytes, store=None, progress=None, chunk_rows=CHUNK_ROWS, compressed=False):
+    # raw is a binary file, progress reports its position against total_bytes
+    store = SampleStore() if store is None else store
+    source = gzip.GzipFile(fileobj=raw) if compressed else raw
+    text = io.TextIOWrapper(source, encoding="utf-8", errors="replace", newline="")
+    for x, y, rssi, coded in read_chunks(text, chunk_rows):
+        store.extend_columns(x, y, rssi, coded)
+        if progress is not None:
+            progress(raw.tell(), total_bytes)
+    return store
+
+
+def import_csv(path, store=None, progress=None, chunk_rows=CHUNK_ROWS):
+    with open(path, "rb") as raw:
+        return import_stream(raw, os.path.getsize(path), store, progress, chunk_rows, compressed=is_gzip(path))
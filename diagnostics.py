@@ -0,0 +1,102 @@
+from PyQt6.QtCore import QDir, QTimer
+from PyQt6.QtGui import QFontDatabase
+from PyQt6.QtWidgets import (QDialog, QFileDialog, QHBoxLayout, QHeaderView, QPlainTextEdit, QPushButton, QTableWidget,
+                             QTableWidgetItem, QVBoxLayout)
+
+from perf_trace import PERCENTILES, TRACER, Profiler
+
+# Diagnostics panel: rolling percentiles of every perf_trace span, refreshed once a second while
+# the panel is open, trace export and the opt-in cProfile capture of the GUI thread.
+
+REFRESH_MS = 1000
+COLUMNS = ["Span", "Count"] + [f"p{p} ms" for p in PERCENTILES] + ["Max ms", "Total ms"]
+
+
+class DiagnosticsDialog(QDialog):
+
+    def __init__(self, parent=None, tracer=TRACER):
+        super().__init__(parent)
+        self.setWindowTitle("Diagnostics")
+        self.resize(640, 480)
+        self.tracer = tracer
+        self.profiler = Profiler()
+
+        self.table = QTableWidget(0, len(COLUMNS))
+        self.table.setHorizontalHeaderLabels(COLUMNS)
+        self.table.verticalHeader().setVisible(False)
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+
+        self.buttonExport = QPushButton("Export trace...")
+        self.buttonExport.clicked.connect(self.export_trace)
+        self.buttonReset = QPushButton("Reset")
+        self.buttonReset.clicked.connect(self.reset)
+        self.buttonProfile = QPushButton("Start profiling")
+        self.buttonProfile.setCheckable(True)
+        self.buttonProfile.toggled.connect(self.toggle_profiling)
+        buttons = QHBoxLayout()
+        for button in (self.buttonExport, self.buttonReset, self.buttonProfile):
+            buttons.addWidget(button)
+        buttons.addStretch()
+
+        self.profileText = QPlainTextEdit()
+        self.profileText.setReadOnly(True)
+        self.profileText.setFont(QFontDatabase.systemFont(QFontDatabase.SystemFont.FixedFont))
+        self.profileText.setPlaceholderText("cProfile summary of the GUI thread appears here after profiling is stopped")
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.table, 2)
+        layout.addLayout(buttons)
+        layout.addWidget(self.profileText, 1)
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(REFRESH_MS)
+        self.timer.timeout.connect(self.refresh)
+
+    def showEvent(self, event):
+        self.refresh()
+        self.timer.start()
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self.timer.stop()
+        super().hideEvent(event)
+
+    def refresh(self):
+        stats = self.tracer.statistics()
+        self.table.setRowCount(len(stats))
+        for row, (name, values) in enumerate(stats.items()):
+            cells = [name, str(values["count"])] + [f"{values[f'p{p}']:.2f}" for p in PERCENTILES] + [f"{values['max']:.2f}", f"{values['total']:.0f}"]
+            for column, text in enumerate(cells):
+                self.table.setItem(row, column, QTableWidgetItem(text))
+
+    def reset(self):
+        self.tracer.reset()
+        self.refresh()
+
+    def export_trace(self):
+        filename, filter = QFileDialog.getSaveFileName(self, "Export trace", QDir.currentPath(),
+                                                       "Chrome trace (*.json);; Span statistics and events (*.json)")
+        if not filename:
+            return
+        if "Chrome" in filter:
+            self.tracer.write_chrome_trace(filename)
+        else:
+            self.tracer.write_json(filename)
+
+    def toggle_profiling(self, checked):
+        if checked:
+            self.buttonProfile.setText("Stop profiling")
+            self.profiler.start()
+            return
+        self.buttonProfile.setText("Start profiling")
+        if self.profiler.stop() is None:
+            return
+        self.profileText.setPlainText(self.profiler.summary())
+        filename, _ = QFileDialog.getSaveFileName(self, "Save profile", QDir.currentPath(), "cProfile output (*.prof)")
+        if filename:
+            self.profiler.dump(filename)
+
+    def closeEvent(self, event):
+        self.buttonProfile.setChecked(False)
+        super().closeEvent(event)
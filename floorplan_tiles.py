@@ -0,0 +1,216 @@
+import io
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pyqtgraph as pg
+from PIL import Image
+
+# Floor plans are shown as an image pyramid: level k is the plan reduced by 2**k, the coarsest
+# level (at most OVERVIEW_PIXELS on its longer side) is always shown, finer levels only as the
+# TILE_SIZE tiles that are visible at the current zoom. JPEG plans decode levels 1-3 directly at
+# 1/2, 1/4 or 1/8 size (PIL draft mode), other formats have no reduced decode: their full-size
+# image is decoded once, kept, and every level is reduced from it. Besides the overview the last
+# finer level used is kept, so panning only crops tiles out of it. Tiles live in an LRU keyed by
+# (level, tx, ty) that holds at least the visible tiles and a ring of neighbours for two levels
+# (fit_viewport). load_tiles is meant to run on a worker thread, cached_tiles on the GUI thread:
+# a pan shows the cached tiles at once and the overview under the rest until they are cut.
+# View coordinates stay those of the full-size plan: x is the pixel column and y = height - row,
+# so is_click_within_bounds and the heatmap setRect work unchanged.
+# https://pillow.readthedocs.io/en/stable/reference/Image.html#PIL.Image.Image.draft
+
+TILE_SIZE = 512
+TILE_CACHE = 64
+OVERVIEW_PIXELS = 2048
+# PIL refuses images over twice MAX_IMAGE_PIXELS as decompression bombs, the default (~89 Mpx)
+# is below the 20000 x 15000 px CAD exports seen in practice
+MAX_FLOORPLAN_PIXELS = 400_000_000
+Image.MAX_IMAGE_PIXELS = max(Image.MAX_IMAGE_PIXELS or 0, MAX_FLOORPLAN_PIXELS // 2)
+
+
+class FloorplanPyramid:
+
+    def __init__(self, data, tile_cache=TILE_CACHE):
+        self.data = data
+        image = Image.open(io.BytesIO(data))
+        self.format = image.format
+        self.width, self.height = image.size
+        # grayscale plans stay one byte per pixel
+        self.mode = "L" if image.mode in ("1", "L") else "RGB"
+        self.overview_level = max(0, math.ceil(math.log2(max(self.width, self.height) / OVERVIEW_PIXELS)))
+        self.tile_cache = tile_cache
+        self._overview = None
+        self._full = None
+        self._level = None
+        self._tiles = OrderedDict()
+        # _tiles_lock guards the LRU and is never held while decoding, _decode_lock the decoded levels
+        self._tiles_lock = threading.Lock()
+        self._decode_lock = threading.Lock()
+
+    def _open(self):
+        return Image.open(io.BytesIO(self.data))
+
+    def level_size(self, k):
+        # reduce(2) and the JPEG decoder both round up
+        width, height = self.width, self.height
+        for _ in range(k):
+            width, height = math.ceil(width / 2), math.ceil(height / 2)
+        return width, height
+
+    def level(self, k):
+        # the overview and the last other level asked for are kept
+        with self._decode_lock:
+            if k == self.overview_level:
+                if self._overview is None:
+                    self._overview = self._decode(k)
+                return self._overview
+            if self._level is None or self._level[0] != k:
+                self._level = None
+                self._level = (k, self._decode(k))
+            return self._level[1]
+
+    def _decode(self, k):
+        reduced = 0
+        if self.format == "JPEG":
+            image = self._open()
+            if k > 0:
+                reduced = min(k, 3)
+                image.draft(self.mode, self.level_size(reduced))
+            image = image.convert(self.mode) if image.mode != self.mode else image
+            image.load()
+        else:
+            if self._full is None:
+                image = self._open()
+                self._full = image.convert(self.mode) if image.mode != self.mode else image
+                self._full.load()
+            image = self._full
+        for _ in range(reduced, k):
+            image = image.reduce(2)
+        return image
+
+    def fit_viewport(self, width, height):
+        # level_for picks a level whose tiles cover TILE_SIZE / 2 to TILE_SIZE screen pixels, the
+        # cache holds what a width x height px view shows plus a ring of tiles for two levels
+        columns = math.ceil(2 * width / TILE_SIZE) + 3
+        rows = math.ceil(2 * height / TILE_SIZE) + 3
+        self.tile_cache = max(TILE_CACHE, 2 * columns * rows)
+
+    def level_for(self, image_pixels_per_screen_pixel):
+        if image_pixels_per_screen_pixel <= 1:
+            return 0
+        return min(int(math.log2(image_pixels_per_screen_pixel)), self.overview_level)
+
+    def rect(self, k, box):
+        # level k pixel box (left, top, right, bottom) -> (x, y, w, h) in full-size view coordinates
+        width, height = self.level_size(k)
+        sx, sy = self.width / width, self.height / height
+        left, top, right, bottom = box
+        return (left * sx, self.height - bottom * sy, (right - left) * sx, (bottom - top) * sy)
+
+    def tiles(self, k, region):
+        # (tx, ty) of the level k tiles overlapping region = (x0, y0, x1, y1) in view coordinates
+        width, height = self.level_size(k)
+        size_x = TILE_SIZE * self.width / width
+        size_y = TILE_SIZE * self.height / height
+        x0, y0, x1, y1 = region
+        top, bottom = self.height - y1, self.height - y0
+        return [(tx, ty)
+                for ty in range(max(0, int(top // size_y)), min(math.ceil(height / TILE_SIZE), int(bottom // size_y) + 1))
+                for tx in range(max(0, int(x0 // size_x)), min(math.ceil(width / TILE_SIZE), int(x1 // size_x) + 1))]
+
+    def cached_tiles(self, k, tiles):
+        # {(k, tx, ty): (data, rect)} of the level k tiles that are already cut, never decodes
+        result = {}
+        with self._tiles_lock:
+            for tx, ty in tiles:
+                tile = self._tiles.get((k, tx, ty))
+                if tile is not None:
+                    result[(k, tx, ty)] = tile
+                    self._tiles.move_to_end((k, tx, ty))
+        return result
+
+    def load_tiles(self, k, tiles):
+        # {(k, tx, ty): (data, rect)} of the level k tiles, the missing ones and a ring of their
+        # neighbours are cut out of the level in one pass
+        with self._tiles_lock:
+            cached = set(self._tiles)
+        missing = [tile for tile in tiles if (k, *tile) not in cached]
+        cut = {}
+        if missing:
+            image = self.level(k)
+            columns, rows = math.ceil(image.width / TILE_SIZE), math.ceil(image.height / TILE_SIZE)
+            xs, ys = [tx for tx, _ in tiles], [ty for _, ty in tiles]
+            ring = [(tx, ty) for ty in range(max(min(ys) - 1, 0), min(max(ys) + 2, rows))
+                    for tx in range(max(min(xs) - 1, 0), min(max(xs) + 2, columns))
+                    if (k, tx, ty) not in cached and (tx, ty) not in missing]
+            for tx, ty in ring[:max(self.tile_cache - len(tiles), 0)] + missing:
+                box = (tx * TILE_SIZE, ty * TILE_SIZE, min((tx + 1) * TILE_SIZE, image.width), min((ty + 1) * TILE_SIZE, image.height))
+                cut[(k, tx, ty)] = (np.flipud(np.asarray(image.crop(box))), self.rect(k, box))
+        result = {}
+        with self._tiles_lock:
+            self._tiles.update(cut)
+            for tx, ty in tiles:
+                result[(k, tx, ty)] = self._tiles[(k, tx, ty)]
+                self._tiles.move_to_end((k, tx, ty))
+            while len(self._tiles) > self.tile_cache:
+                self._tiles.popitem(last=False)
+        return result
+
+    def tile(self, k, tx, ty):
+        return self.load_tiles(k, [(tx, ty)])[(k, tx, ty)]
+
+    def overview(self):
+        image = self.level(self.overview_level)
+        return np.flipud(np.asarray(image)), self.rect(self.overview_level, (0, 0, image.width, image.height))
+
+
+def image_item(data, rect):
+    item = pg.ImageItem(data, axisOrder="row-major", levels=(0, 255))
+    item.setRect(pg.QtCore.QRectF(*rect))
+    return item
+
+
+class TiledFloorplanItem(pg.ItemGroup):
+
+    def __init__(self, pyramid):
+        super().__init__()
+        self.pyramid = pyramid
+        self.tile_items = {}
+        self.wanted = set()
+        self.overview = image_item(*pyramid.overview())
+        self.overview.setParentItem(self)
+
+    def boundingRect(self):
+        return pg.QtCore.QRectF(0, 0, self.pyramid.width, self.pyramid.height)
+
+    def dataBounds(self, axis, frac=1.0, orthoRange=None):
+        # the ViewBox auto range uses this, ItemGroup itself has no bounds
+        return (0, self.pyramid.width) if axis == 0 else (0, self.pyramid.height)
+
+    def update_tiles(self, region, image_pixels_per_screen_pixel):
+        # keeps exactly the tiles of the right level that overlap region, region None shows the
+        # overview only. Cached tiles are shown at once, returns (level, tiles) still to be loaded.
+        k = self.pyramid.level_for(image_pixels_per_screen_pixel)
+        self.wanted = set()
+        if region is not None and k < self.pyramid.overview_level:
+            self.wanted = {(k, tx, ty) for tx, ty in self.pyramid.tiles(k, region)}
+        for key in list(self.tile_items):
+            if key not in self.wanted:
+                item = self.tile_items.pop(key)
+                item.setParentItem(None)
+                if item.scene() is not None:
+                    item.scene().removeItem(item)
+        added = [(tx, ty) for _, tx, ty in sorted(self.wanted - set(self.tile_items))]
+        cached = self.pyramid.cached_tiles(k, added)
+        self.add_tiles(cached)
+        return k, [(tx, ty) for tx, ty in added if (k, tx, ty) not in cached]
+
+    def add_tiles(self, tiles):
+        # tiles from load_tiles, the ones no longer wanted after a pan are skipped
+        for key, tile in tiles.items():
+            if key in self.wanted and key not in self.tile_items:
+                item = image_item(*tile)
+                item.setZValue(1)
+                item.setParentItem(self)
+                self.tile_items[key] = item
@@ -0,0 +1,83 @@
+import io
+
+import numpy as np
+from PIL import Image, ImageDraw
+from scipy.ndimage import binary_fill_holes, distance_transform_edt, label
+
+from heatmap_engine import GRID_SCALE
+
+# Building footprint of the floor plan, heatmaps are only interpolated and blurred inside it and
+# stay transparent over outdoor areas, courtyards and white margins.
+# Detection works on the pyramid overview level (at most OVERVIEW_PIXELS, floorplan_tiles.py):
+# everything darker than INK_THRESHOLD is drawing, a morphological closing with a radius of
+# CLOSE_FRACTION of the longer side bridges door and window openings in the outer walls, the
+# enclosed area is filled and parts smaller than MIN_PART of the largest one (legend, title
+# block, scale bar) are dropped. Atria and courtyards surrounded by the building are filled as
+# well, they and any other mistakes are fixed by adding or removing polygons by hand.
+# The mask keeps its own resolution and is sampled at the cell centres of whatever grid is
+# computed, so one mask serves the 200x200 heatmap, the zoomed detail grids and reports.
+# https://docs.scipy.org/doc/scipy/reference/generated/scipy.ndimage.binary_fill_holes.html
+
+INK_THRESHOLD = 200
+CLOSE_FRACTION = 0.01
+MIN_PART = 0.1
+# a plan without a light background (a photo, a filled site plan) gives no usable footprint
+MAX_COVER = 0.98
+FOOTPRINT_MEMBER = "footprint.png"
+
+
+class Footprint:
+
+    def __init__(self, mask, width_pixels, height_pixels):
+        # mask rows run top to bottom like the image, view coordinates have y = height - row
+        self.mask = np.asarray(mask, dtype=bool)
+        self.width = width_pixels
+        self.height = height_pixels
+
+    @classmethod
+    def detect(cls, image, width_pixels, height_pixels, threshold=INK_THRESHOLD, close_fraction=CLOSE_FRACTION):
+        # image is a reduced level of the plan, None when nothing resembling a building is found
+        ink = np.asarray(image.convert("L")) < threshold
+        radius = close_fraction * max(ink.shape)
+        closed = distance_transform_edt(distance_transform_edt(~ink) <= radius) > radius
+        labels, count = label(binary_fill_holes(closed))
+        if count == 0:
+            return None
+        areas = np.bincount(labels.ravel())[1:]
+        mask = np.isin(labels, np.flatnonzero(areas >= MIN_PART * areas.max()) + 1)
+        if mask.mean() > MAX_COVER:
+            return None
+        return cls(mask, width_pixels, height_pixels)
+
+    @classmethod
+    def from_png(cls, data, width_pixels, height_pixels):
+        return cls(np.asarray(Image.open(io.BytesIO(data)).convert("1")), width_pixels, height_pixels)
+
+    def to_png(self):
+        out = io.BytesIO()
+        Image.fromarray(self.mask).save(out, "PNG", optimize=True)
+        return out.getvalue()
+
+    def sample(self, xs, ys):
+        # mask at the grid of pixel coordinates xs (columns) and ys (view y, rows)
+        rows, cols = self.mask.shape
+        r = np.clip(((self.height - np.asarray(ys, dtype=float)) * rows / self.height).astype(np.int64), 0, rows - 1)
+        c = np.clip((np.asarray(xs, dtype=float) * cols / self.width).astype(np.int64), 0, cols - 1)
+        return self.mask[r[:, None], c[None, :]]
+
+    def grid(self, grid_scale=GRID_SCALE):
+        # cells of heatmap_engine.make_grid
+        return self.sample(np.linspace(0, self.width, grid_scale), np.linspace(0, self.height, grid_scale))
+
+    def edit(self, points, add=True):
+        # points are (x, y) view coordinates of a polygon that is added to or cut out of the mask
+        rows, cols = self.mask.shape
+        outline = [(x * cols / self.width, (self.height - y) * rows / self.height) for x, y in points]
+        polygon = Image.new("1", (cols, rows))
+        ImageDraw.Draw(polygon).polygon(outline, fill=1)
+        inside = np.asarray(polygon)
+        mask = self.mask | inside if add else self.mask & ~inside
+        return Footprint(mask, self.width, self.height)
+
+    def coverage(self):
+        return float(self.mask.mean())
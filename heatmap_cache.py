@@ -0,0 +1,76 @@
+import hashlib
+import io
+from collections import OrderedDict
+
+import numpy as np
+
+# Bounded LRU cache of finished heatmap grids. The key covers everything the grid depends on:
+# the BSSID set, the number and content of its samples, the map scale, the grid settings and
+# the footprint mask.
+# Hashing the samples keeps keys valid across save/open, so cached grids can live in the .wht.
+
+CACHE_MEMBER = "heatmaps.npz"
+
+
+def make_key(bssids, x, y, rssi, scale, grid_scale, method, groups=None, mask=None):
+    h = hashlib.blake2b(digest_size=16)
+    h.update("\n".join(sorted(bssids)).encode())
+    h.update(f"|{len(rssi)}|{float(scale)!r}|{grid_scale}|{method}|".encode())
+    for column in (x, y, rssi):
+        h.update(np.ascontiguousarray(column, dtype=np.float64).tobytes())
+    if groups is not None:
+        h.update(np.ascontiguousarray(groups, dtype=np.int64).tobytes())
+    if mask is not None:
+        h.update(b"mask" + np.packbits(mask).tobytes())
+    return h.hexdigest()
+
+
+class HeatmapCache:
+
+    def __init__(self, max_entries=128, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key):
+        grid = self._entries.get(key)
+        if grid is not None:
+            self._entries.move_to_end(key)
+        return grid
+
+    def put(self, key, grid):
+        if grid.nbytes > self.max_bytes:
+            return
+        if key in self._entries:
+            self.nbytes -= self._entries.pop(key).nbytes
+        self._entries[key] = grid
+        self.nbytes += grid.nbytes
+        while len(self._entries) > self.max_entries or self.nbytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+
+    def discard(self, key):
+        grid = self._entries.pop(key, None)
+        if grid is not None:
+            self.nbytes -= grid.nbytes
+
+    def clear(self):
+        self._entries.clear()
+        self.nbytes = 0
+
+    def to_bytes(self):
+        buf = io.BytesIO()
+        np.savez_compressed(buf, **self._entries)
+        return buf.getvalue()
+
+    def load_bytes(self, data):
+        with np.load(io.BytesIO(data)) as archive:
+            for key in archive.files:
+                self.put(key, archive[key])
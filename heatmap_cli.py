@@ -0,0 +1,111 @@
+import argparse
+import re
+import sys
+from pathlib import Path
+from zipfile import BadZipFile
+
+import numpy as np
+
+import heatmap_engine
+from ap_localization import localize_store
+from footprint import Footprint
+from project_io import read_project
+from report_render import DEFAULT_DPI, render_report
+from sample_bins import SampleAggregator
+
+# Renders every network of one or many .wht projects without starting the GUI, png and tiff are
+# report images (floor plan, heatmap, survey points, access points, colorbar) from report_render.
+# A footprint saved in the project limits the heatmaps to the building and repeated samples are
+# merged with the project's aggregation settings, so the output matches the GUI.
+# python heatmap_cli.py survey1.wht survey2.wht -o reports --format png tiff npy --width 12000 --dpi 300
+
+
+def group_rows(store, per_bssid=False):
+    if per_bssid:
+        return {bssid: store.rows_for_bssids([bssid]) for bssid in store.bssids() if bssid}
+    return {key: store.rows_for_network(key) for key in store.network_keys()}
+
+
+def safe_filename(key):
+    return re.sub(r"[^\w.-]+", "_", key).strip("_") or "hidden"
+
+
+def render_project(path, output_dir, formats, grid_scale, sigma, per_bssid, method=None, report_width=None, dpi=DEFAULT_DPI,
+                   use_footprint=True):
+    project = read_project(path)
+    scale = float(project["scale"])
+    method = method or project.get("interpolation", heatmap_engine.DEFAULT_METHOD)
+    floorplan = project["image"]
+    width, height = floorplan.size
+    out = Path(output_dir) / Path(path).stem
+    out.mkdir(parents=True, exist_ok=True)
+
+    mask = None
+    if use_footprint and project.get("footprint_bytes") and project.get("footprint_enabled", True):
+        mask = Footprint.from_png(project["footprint_bytes"], width, height).grid(grid_scale)
+
+    store = project["store"]
+    aggregator = SampleAggregator(**(project.get("aggregation") or {}))
+    bssid_values = store.dictionary("bssid")
+    reports = [suffix for suffix in ("png", "tiff") if suffix in formats]
+    if reports:
+        points = store.locations()
+        aps = localize_store(store, scale)
+
+    rendered = 0
+    for key, rows in group_rows(store, per_bssid).items():
+        bssids = [bssid_values[code] for code in np.unique(store.codes("bssid")[rows]).tolist()]
+        if aggregator.radius > 0:
+            x, y, rssi = aggregator.heatmap_input(store, scale, bssids)
+        else:
+            x, y, rssi = store.x[rows], store.y[rows], store.rssi[rows]
+        try:
+            grid = heatmap_engine.compute_heatmap(x, y, rssi, width, height, scale, grid_scale=grid_scale, sigma=sigma, method=method, mask=mask)
+        except ValueError as e:
+            print(f"{path}: {key}: {e}", file=sys.stderr)
+            continue
+        if grid is None:
+            print(f"{path}: not enough data to create heatmap for {key}", file=sys.stderr)
+            continue
+        name = safe_filename(key)
+        if "npy" in formats:
+            np.save(out / f"{name}.npy", grid)
+        if reports:
+            ap_rows = [aps["index"][bssid] for bssid in bssids if bssid in aps["index"]]
+            markers = (aps["x"][ap_rows], aps["y"][ap_rows], aps["radius_m"][ap_rows] / scale)
+        for suffix in reports:
+            render_report(out / f"{name}.{suffix}", floorplan, width, height, [grid], points=points, aps=markers,
+                          width=report_width, dpi=dpi, title=key)
+        rendered += 1
+    return rendered
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render WiFi heatmaps from .wht projects")
+    parser.add_argument("projects", nargs="+", help=".wht project files")
+    parser.add_argument("-o", "--output-dir", default="heatmaps")
+    parser.add_argument("--format", nargs="+", choices=["png", "tiff", "npy"], default=["png"])
+    parser.add_argument("--width", type=int, help="report image width of the floor plan in pixels, defaults to the floor plan size")
+    parser.add_argument("--dpi", type=int, default=DEFAULT_DPI, help="report resolution, marker and text sizes follow it")
+    parser.add_argument("--grid-scale", type=int, default=heatmap_engine.GRID_SCALE)
+    parser.add_argument("--sigma", type=float, default=heatmap_engine.SIGMA)
+    parser.add_argument("--method", choices=list(heatmap_engine.INTERPOLATORS), help="interpolation method, defaults to the one saved in the project")
+    parser.add_argument("--no-footprint", action="store_true", help="ignore the building footprint saved in the project")
+    parser.add_argument("--per-bssid", action="store_true", help="one heatmap per BSSID instead of per SSID and band")
+    args = parser.parse_args(argv)
+
+    failed = 0
+    for path in args.projects:
+        try:
+            count = render_project(path, args.output_dir, args.format, args.grid_scale, args.sigma, args.per_bssid, args.method,
+                                   args.width, args.dpi, not args.no_footprint)
+        except (OSError, KeyError, ValueError, BadZipFile) as e:
+            print(f"{path}: {e}", file=sys.stderr)
+            failed += 1
+            continue
+        print(f"{path}: {count} heatmap(s)")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
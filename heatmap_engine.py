@@ -0,0 +1,428 @@
+import numpy as np
+from scipy.interpolate import griddata, RBFInterpolator
+from scipy.spatial import cKDTree, QhullError
+from scipy.ndimage import gaussian_filter, distance_transform_edt, maximum_filter
+
+from perf_trace import span, timed
+
+# Heatmap computation without any Qt dependency, shared by main.py and heatmap_cli.py
+
+RSSI_MIN = -90
+RSSI_MAX = -30
+GRID_SCALE = 200
+SIGMA = 3
+MIN_SAMPLES = 3
+IDW_NEIGHBOURS = 8
+IDW_POWER = 2
+RBF_MAX_SAMPLES = 2000
+COMPOSITE_REACH = 5.0
+COMPOSITE_CHUNK = 64
+
+
+def convert_frequency(frequency):
+    freq = float(frequency)
+    if 2.400 <= freq <= 2.500:
+        return "2.4 GHz"
+    elif 5.000 <= freq < 5.925:
+        return "5 GHz"
+    elif 5.925 <= freq < 7.200:
+        # UNII-5 starts at 5925 MHz, channel 1 is 5955 MHz
+        return "6 GHz"
+    else:
+        return "Unknown"
+
+
+def network_key(ssid, frequency):
+    return f"{ssid or 'hidden'} {convert_frequency(frequency)}"
+
+
+def make_grid(width_pixels, height_pixels, scale, grid_scale=GRID_SCALE):
+    X_grid = np.linspace(0, width_pixels * scale, grid_scale)
+    Y_grid = np.linspace(0, height_pixels * scale, grid_scale)
+    return np.meshgrid(X_grid, Y_grid)
+
+
+# Interpolation backends. N is the number of samples, G the number of grid cells (grid_scale ** 2).
+# nearest - nearest sample + gaussian blur, O((N + G) log N) + O(G * sigma). Fast, blocky Voronoi cells under the blur.
+# idw     - inverse distance weighting of the k nearest samples from a KD-tree, O((N + G * k) log N). Smooth, scales to large grids.
+# linear  - Delaunay triangulation, O(N log N + G log N). Exact at samples, nearest value outside the convex hull.
+# rbf     - thin-plate spline, O(N^3) to fit and O(G * N) to evaluate. Smoothest, only for small surveys (RBF_MAX_SAMPLES).
+
+# With a footprint mask (footprint.py) only the cells inside it are interpolated, the blur is a
+# normalized convolution over the bounding box of the mask so values outside neither leak in nor
+# darken the walls, and cells outside are NaN, which pyqtgraph and colorize draw transparent.
+
+# https://docs.scipy.org/doc/scipy/reference/generated/scipy.interpolate.griddata.html
+def interpolate_nearest(points, values, X_grid, Y_grid, sigma=SIGMA, mask=None):
+    if mask is not None:
+        return interpolate_nearest_masked(points, values, X_grid, Y_grid, mask, sigma)
+    with span("interpolation", method="nearest"):
+        grid_z0 = griddata(points, values, (X_grid, Y_grid), method='nearest')
+    with span("smoothing"):
+        return gaussian_filter(grid_z0, sigma=sigma) # https://docs.scipy.org/doc/scipy/reference/generated/scipy.ndimage.gaussian_filter.html
+
+
+def mask_box(mask):
+    rows = np.flatnonzero(mask.any(axis=1))
+    cols = np.flatnonzero(mask.any(axis=0))
+    if not len(rows):
+        return None
+    return slice(rows[0], rows[-1] + 1), slice(cols[0], cols[-1] + 1)
+
+
+def masked_blur(raw, inside, sigma, truncate=4.0):
+    # https://en.wikipedia.org/wiki/Normalized_convolution
+    weight = gaussian_filter(inside.astype(float), sigma=sigma, truncate=truncate, mode="constant")
+    blurred = gaussian_filter(np.where(inside, raw, 0.0), sigma=sigma, truncate=truncate, mode="constant")
+    with np.errstate(invalid="ignore", divide="ignore"):
+        blurred /= weight
+    blurred[~inside] = np.nan
+    return blurred
+
+
+def interpolate_nearest_masked(points, values, X_grid, Y_grid, mask, sigma=SIGMA):
+    grid_z0 = np.full(X_grid.shape, np.nan)
+    box = mask_box(mask)
+    if box is None:
+        return grid_z0
+    inside = mask[box]
+    raw = np.zeros(inside.shape)
+    with span("interpolation", method="nearest"):
+        raw[inside] = griddata(points, values, (X_grid[box][inside], Y_grid[box][inside]), method='nearest')
+    with span("smoothing"):
+        grid_z0[box] = masked_blur(raw, inside, sigma)
+    return grid_z0
+
+
+def interpolate_masked(method, points, values, X_grid, Y_grid, mask=None):
+    if mask is None:
+        return INTERPOLATORS[method](points, values, X_grid, Y_grid)
+    grid_z0 = np.full(X_grid.shape, np.nan)
+    if mask.any():
+        grid_z0[mask] = INTERPOLATORS[method](points, values, X_grid[mask], Y_grid[mask])
+    return grid_z0
+
+
+# https://docs.scipy.org/doc/scipy/reference/generated/scipy.spatial.cKDTree.query.html
+def interpolate_idw(points, values, X_grid, Y_grid, k=IDW_NEIGHBOURS, power=IDW_POWER):
+    k = min(k, len(values))
+    distance, nearest = cKDTree(points).query(np.column_stack([X_grid.ravel(), Y_grid.ravel()]), k=k)
+    weights = 1.0 / np.maximum(distance, 1e-9) ** power
+    grid_z0 = (weights * values[nearest]).sum(axis=1) / weights.sum(axis=1)
+    return grid_z0.reshape(X_grid.shape)
+
+
+def interpolate_linear(points, values, X_grid, Y_grid):
+    try:
+        grid_z0 = griddata(points, values, (X_grid, Y_grid), method='linear')
+    except QhullError:
+        # all samples on one line, there is nothing to triangulate
+        return griddata(points, values, (X_grid, Y_grid), method='nearest')
+    outside = np.isnan(grid_z0)
+    if outside.any():
+        grid_z0[outside] = griddata(points, values, (X_grid[outside], Y_grid[outside]), method='nearest')
+    return grid_z0
+
+
+# https://docs.scipy.org/doc/scipy/reference/generated/scipy.interpolate.RBFInterpolator.html
+def interpolate_rbf(points, values, X_grid, Y_grid):
+    if len(values) > RBF_MAX_SAMPLES:
+        raise ValueError(f"rbf interpolation supports at most {RBF_MAX_SAMPLES} samples, got {len(values)}")
+    # smoothing keeps the system solvable when several samples share a location
+    try:
+        rbf = RBFInterpolator(points, values, kernel="thin_plate_spline", smoothing=1.0)
+    except np.linalg.LinAlgError:
+        # all samples on one line, the plane term of the spline cannot be fitted
+        return griddata(points, values, (X_grid, Y_grid), method='nearest')
+    grid_z0 = rbf(np.column_stack([X_grid.ravel(), Y_grid.ravel()]))
+    return grid_z0.reshape(X_grid.shape)
+
+
+INTERPOLATORS = {
+    "nearest": interpolate_nearest,
+    "idw": interpolate_idw,
+    "linear": interpolate_linear,
+    "rbf": interpolate_rbf,
+}
+DEFAULT_METHOD = "nearest"
+
+
+def compute_heatmap(x, y, rssi, width_pixels, height_pixels, scale, grid_scale=GRID_SCALE, sigma=SIGMA, method=DEFAULT_METHOD, mask=None):
+    # mask is a (grid_scale, grid_scale) boolean footprint, see Footprint.grid
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    rssi = np.asarray(rssi, dtype=float)
+    if len(rssi) < MIN_SAMPLES:
+        return None
+
+    X_grid, Y_grid = make_grid(width_pixels, height_pixels, scale, grid_scale)
+    # https://numpy.org/doc/stable/reference/generated/numpy.column_stack.html
+    points = np.column_stack([x * scale, y * scale])
+    if method == "nearest":
+        return interpolate_nearest(points, rssi, X_grid, Y_grid, sigma=sigma, mask=mask)
+    with span("interpolation", method=method):
+        return interpolate_masked(method, points, rssi, X_grid, Y_grid, mask)
+
+
+# Composite maps over many BSSIDs on one shared grid, "best" is the strongest BSSID per cell
+# (best server) and "second" the second strongest (roaming overlap). Samples are rasterized onto
+# the grid and a distance transform over a stack of COMPOSITE_CHUNK BSSIDs gives, for every cell,
+# the nearest cell where each BSSID was heard. A BSSID only counts where it was heard within
+# COMPOSITE_REACH metres of the survey location nearest to the cell, otherwise every BSSID would
+# be extrapolated over the whole floor. nearest takes the nearest sample of every BSSID from the
+# sample positions like compute_heatmap, but only for the cells its blur can carry into the reach,
+# and blurs the whole stack at once, so a single BSSID gives exactly its own heatmap there. The
+# other methods interpolate each BSSID only over its reach. The per-cell top two are kept while
+# chunks are reduced, so memory does not grow with the number of BSSIDs.
+# https://docs.scipy.org/doc/scipy/reference/generated/scipy.ndimage.distance_transform_edt.html
+COMPOSITES = ("best", "second")
+
+
+@timed("composite")
+def compute_composite(x, y, rssi, group, width_pixels, height_pixels, scale, grid_scale=GRID_SCALE, sigma=SIGMA,
+                      method=DEFAULT_METHOD, reduce="best", mask=None):
+    # group numbers the BSSID of every sample, groups with fewer than MIN_SAMPLES samples are left out
+    x = np.asarray(x, dtype=float) * scale
+    y = np.asarray(y, dtype=float) * scale
+    rssi = np.asarray(rssi, dtype=float)
+    group = np.asarray(group, dtype=np.int64)
+    counts = np.bincount(group) if len(group) else np.empty(0, dtype=np.int64)
+    groups = np.flatnonzero(counts >= MIN_SAMPLES)
+    if not len(groups):
+        return None
+
+    X_grid, Y_grid = make_grid(width_pixels, height_pixels, scale, grid_scale)
+    shape = X_grid.shape
+    cell = (height_pixels * scale / (grid_scale - 1), width_pixels * scale / (grid_scale - 1))
+    ix = np.clip(np.rint(x / cell[1]), 0, grid_scale - 1).astype(np.int64)
+    iy = np.clip(np.rint(y / cell[0]), 0, grid_scale - 1).astype(np.int64)
+    blur_weight = None if mask is None else gaussian_filter(mask.astype(float), sigma=sigma, mode="constant")
+    surveyed = np.ones(shape, dtype=bool)
+    surveyed[iy, ix] = False
+    nearest_location = distance_transform_edt(surveyed, sampling=cell)
+    # an axis 0 spacing longer than the floor diagonal keeps every nearest cell inside its own BSSID
+    separation = 2 * (width_pixels + height_pixels) * scale + 1
+    # the blur only carries values truncate * sigma cells, farther from a BSSID's reach (or outside
+    # the footprint) no nearest sample is needed
+    support = 2 * int(4.0 * sigma + 0.5) + 1
+
+    top = np.full((2,) + shape, -np.inf)
+    for start in range(0, len(groups), COMPOSITE_CHUNK):
+        chunk = groups[start:start + COMPOSITE_CHUNK]
+        lookup = np.full(len(counts), -1, dtype=np.int64)
+        lookup[chunk] = np.arange(len(chunk))
+        member = lookup[group]
+        rows = np.flatnonzero(member >= 0)
+        flat = np.ravel_multi_index((member[rows], iy[rows], ix[rows]), (len(chunk),) + shape)
+        size = len(chunk) * shape[0] * shape[1]
+        heard = np.bincount(flat, minlength=size).reshape((len(chunk),) + shape)
+        distance = distance_transform_edt(heard == 0, sampling=(separation,) + cell)
+        reach = distance <= nearest_location + COMPOSITE_REACH
+        if mask is not None:
+            reach &= mask
+        if method == "nearest":
+            need = maximum_filter(reach, size=(1, support, support))
+            if mask is not None:
+                need &= mask
+            stack = np.zeros(heard.shape)
+            with span("interpolation", method="nearest"):
+                for i in range(len(chunk)):
+                    own = rows[member[rows] == i]
+                    _, nearest = cKDTree(np.column_stack([x[own], y[own]])).query(np.column_stack([X_grid[need[i]], Y_grid[need[i]]]))
+                    stack[i][need[i]] = rssi[own][nearest]
+            if blur_weight is None:
+                stack = gaussian_filter(stack, sigma=(0, sigma, sigma))
+            else:
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    stack = gaussian_filter(np.where(mask, stack, 0.0), sigma=(0, sigma, sigma), mode="constant") / blur_weight
+        else:
+            stack = np.full(heard.shape, -np.inf)
+            for i, g in enumerate(chunk):
+                own = rows[member[rows] == i]
+                points = np.column_stack([x[own], y[own]])
+                stack[i][reach[i]] = INTERPOLATORS[method](points, rssi[own], X_grid[reach[i]], Y_grid[reach[i]])
+        stack[~reach] = -np.inf
+        candidates = np.concatenate([top, stack])
+        top = np.sort(np.partition(candidates, len(candidates) - 2, axis=0)[-2:], axis=0)[::-1]
+
+    grid = top[COMPOSITES.index(reduce)]
+    grid[np.isinf(grid)] = np.nan
+    return grid
+
+
+def detail_sigma(width_pixels, height_pixels, region, shape, grid_scale=GRID_SCALE, sigma=SIGMA):
+    # blur in cells of the detail grid that covers the same distance as SIGMA cells of the full grid
+    x0, y0, x1, y1 = region
+    nx, ny = shape
+    coarse_x = width_pixels / (grid_scale - 1)
+    coarse_y = height_pixels / (grid_scale - 1)
+    fine_x = (x1 - x0) / max(nx - 1, 1)
+    fine_y = (y1 - y0) / max(ny - 1, 1)
+    return (sigma * coarse_y / fine_y, sigma * coarse_x / fine_x)
+
+
+def region_axes(region, shape, sigma=SIGMA, method=DEFAULT_METHOD):
+    # image pixel coordinates of the compute_heatmap_region cells, for nearest the grid is padded
+    # by the blur footprint so the edges match the full heatmap
+    x0, y0, x1, y1 = region
+    nx, ny = shape
+    step_x = (x1 - x0) / max(nx - 1, 1)
+    step_y = (y1 - y0) / max(ny - 1, 1)
+    sigma_y, sigma_x = np.broadcast_to(sigma, 2)
+    pad_x = int(np.ceil(4 * sigma_x)) if method == "nearest" else 0
+    pad_y = int(np.ceil(4 * sigma_y)) if method == "nearest" else 0
+    return x0 + step_x * np.arange(-pad_x, nx + pad_x), y0 + step_y * np.arange(-pad_y, ny + pad_y), pad_x, pad_y
+
+
+def compute_heatmap_region(x, y, rssi, scale, region, shape, sigma=SIGMA, method=DEFAULT_METHOD, mask=None):
+    # region is (x0, y0, x1, y1) in image pixels and shape (nx, ny) the number of cells across it,
+    # mask covers the padded grid of region_axes
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    rssi = np.asarray(rssi, dtype=float)
+    if len(rssi) < MIN_SAMPLES:
+        return None
+
+    nx, ny = shape
+    xs, ys, pad_x, pad_y = region_axes(region, shape, sigma, method)
+    X_grid, Y_grid = np.meshgrid(xs * scale, ys * scale)
+
+    points = np.column_stack([x * scale, y * scale])
+    if method == "nearest":
+        grid_z0 = interpolate_nearest(points, rssi, X_grid, Y_grid, sigma=tuple(np.broadcast_to(sigma, 2)), mask=mask)
+        return grid_z0[pad_y:pad_y + ny, pad_x:pad_x + nx]
+    with span("interpolation", method=method):
+        return interpolate_masked(method, points, rssi, X_grid, Y_grid, mask)
+
+# Nearest + blur heatmap that can take new samples without recomputing the whole grid.
+# A new sample only changes the cells it is now closest to, and those all lie within the
+# largest current nearest-sample distance, so the work per sample shrinks as the survey fills.
+# Only that region plus the gaussian kernel radius around it is blurred again.
+# Cells outside a footprint mask get a negative distance, so no sample ever claims them.
+class IncrementalHeatmap:
+
+    def __init__(self, width_pixels, height_pixels, scale, grid_scale=GRID_SCALE, sigma=SIGMA, truncate=4.0, mask=None):
+        X_grid, Y_grid = make_grid(width_pixels, height_pixels, scale, grid_scale)
+        self.scale = scale
+        self.xs = X_grid[0]
+        self.ys = Y_grid[:, 0]
+        self.sigma = sigma
+        self.truncate = truncate
+        self.radius = int(truncate * sigma + 0.5)
+        self.mask = mask
+        self.raw = np.full(X_grid.shape, np.nan)
+        self.distance = np.full(X_grid.shape, np.inf)
+        self._clear_outside()
+        self.grid = None
+        self.count = 0
+
+    def _clear_outside(self):
+        if self.mask is not None:
+            self.distance[~self.mask] = -1.0
+
+    def _blur(self, raw, inside):
+        if inside is None:
+            return gaussian_filter(raw, sigma=self.sigma, truncate=self.truncate)
+        return masked_blur(raw, inside, self.sigma, self.truncate)
+
+    def reset(self, x, y, rssi):
+        x_m = np.asarray(x, dtype=float) * self.scale
+        y_m = np.asarray(y, dtype=float) * self.scale
+        rssi = np.asarray(rssi, dtype=float)
+        self.count = len(rssi)
+        self.grid = None
+        self.raw.fill(np.nan)
+        self.distance.fill(np.inf)
+        self._clear_outside()
+        if self.count == 0:
+            return self.grid
+        X_grid, Y_grid = np.meshgrid(self.xs, self.ys)
+        cells = np.ones(X_grid.shape, dtype=bool) if self.mask is None else self.mask
+        with span("interpolation", method="incremental"):
+            distance, nearest = cKDTree(np.column_stack([x_m, y_m])).query(np.column_stack([X_grid[cells], Y_grid[cells]]))
+        self.distance[cells] = distance ** 2
+        self.raw[cells] = rssi[nearest]
+        if self.count >= MIN_SAMPLES:
+            with span("smoothing"):
+                self.grid = self._blur(self.raw, self.mask)
+        return self.grid
+
+    def add_samples(self, x, y, rssi):
+        rssi = np.asarray(rssi, dtype=float)
+        if len(rssi) == 0:
+            return None
+        x_m = np.asarray(x, dtype=float) * self.scale
+        y_m = np.asarray(y, dtype=float) * self.scale
+        reach = np.sqrt(self.distance.max())
+        changed = None
+        for px, py, value in zip(x_m, y_m, rssi):
+            c0, c1 = np.searchsorted(self.xs, [px - reach, px + reach], side="left")
+            r0, r1 = np.searchsorted(self.ys, [py - reach, py + reach], side="left")
+            c1 = min(c1 + 1, len(self.xs))
+            r1 = min(r1 + 1, len(self.ys))
+            dx = self.xs[c0:c1] - px
+            dy = self.ys[r0:r1] - py
+            d2 = dy[:, None] ** 2 + dx[None, :] ** 2
+            closer = d2 < self.distance[r0:r1, c0:c1]
+            if not closer.any():
+                continue
+            self.distance[r0:r1, c0:c1][closer] = d2[closer]
+            self.raw[r0:r1, c0:c1][closer] = value
+            rows = np.flatnonzero(closer.any(axis=1))
+            cols = np.flatnonzero(closer.any(axis=0))
+            box = (r0 + rows[0], r0 + rows[-1] + 1, c0 + cols[0], c0 + cols[-1] + 1)
+            if changed is None:
+                changed = box
+            else:
+                changed = (min(changed[0], box[0]), max(changed[1], box[1]), min(changed[2], box[2]), max(changed[3], box[3]))
+        self.count += len(rssi)
+
+        if self.count < MIN_SAMPLES:
+            return None
+        if self.grid is None:
+            self.grid = self._blur(self.raw, self.mask)
+        elif changed is not None:
+            self._reblur(*changed)
+        return changed
+
+    def _reblur(self, r0, r1, c0, c1):
+        # cells within the kernel radius of a changed cell get a new value, and they in turn
+        # need one more radius of input around them for the result to match a full blur
+        rows, cols = self.raw.shape
+        out_r0, out_r1 = max(r0 - self.radius, 0), min(r1 + self.radius, rows)
+        out_c0, out_c1 = max(c0 - self.radius, 0), min(c1 + self.radius, cols)
+        in_r0, in_r1 = max(out_r0 - self.radius, 0), min(out_r1 + self.radius, rows)
+        in_c0, in_c1 = max(out_c0 - self.radius, 0), min(out_c1 + self.radius, cols)
+        with span("smoothing"):
+            window = self._blur(self.raw[in_r0:in_r1, in_c0:in_c1], None if self.mask is None else self.mask[in_r0:in_r1, in_c0:in_c1])
+        self.grid[out_r0:out_r1, out_c0:out_c1] = window[out_r0 - in_r0:out_r1 - in_r0, out_c0 - in_c0:out_c1 - in_c0]
+
+
+def strongest_sample(x, y, rssi):
+    i = int(np.argmax(rssi))
+    return float(x[i]), float(y[i])
+
+
+# https://gist.github.com/mikhailov-work/0d177465a8151eb6ede1768d51d476c7
+# Polynomial approximation of the turbo colormap so the CLI does not need pyqtgraph
+def turbo_lut(n=256):
+    t = np.linspace(0.0, 1.0, n)
+    v4 = np.stack([np.ones_like(t), t, t ** 2, t ** 3], axis=1)
+    v2 = np.stack([t ** 4, t ** 5], axis=1)
+    red = v4 @ [0.13572138, 4.61539260, -42.66032258, 132.13108234] + v2 @ [-152.94239396, 59.28637943]
+    green = v4 @ [0.09140261, 2.19418839, 4.84296658, -14.18503333] + v2 @ [4.27729857, 2.82956604]
+    blue = v4 @ [0.10667330, 12.64194608, -60.58204836, 110.36276771] + v2 @ [-89.90310912, 27.34824973]
+    rgb = np.clip(np.stack([red, green, blue], axis=1), 0.0, 1.0)
+    return (rgb * 255).round().astype(np.uint8)
+
+
+def colorize(grid, levels=(RSSI_MIN, RSSI_MAX), lut=None):
+    if lut is None:
+        lut = turbo_lut()
+    low, high = levels
+    norm = np.clip((np.asarray(grid, dtype=float) - low) / (high - low), 0.0, 1.0)
+    idx = np.nan_to_num(norm * (len(lut) - 1)).astype(np.intp)
+    rgba = np.empty(norm.shape + (4,), dtype=np.uint8)
+    rgba[..., :3] = lut[idx]
+    rgba[..., 3] = np.where(np.isnan(norm), 0, 255)
+    return rgba
@@ -0,0 +1,75 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from PyQt6.QtCore import QObject, pyqtSignal
+
+# Runs heatmap jobs off the GUI thread. Each job belongs to a key (the listSSID item text),
+# submitting a key again or cancelling it makes any older result for it stale. Stale results
+# are dropped on the GUI thread, a job that has not started yet is not run at all.
+# Long jobs can report progress(key, done, total), it is emitted from the pool thread and
+# delivered queued like the results.
+# https://docs.python.org/3/library/concurrent.futures.html
+
+
+class HeatmapWorker(QObject):
+    result_ready = pyqtSignal(str, object)
+    failed = pyqtSignal(str, str)
+    progress = pyqtSignal(str, object, object)
+    _done = pyqtSignal(str, int, object, object)
+
+    def __init__(self, parent=None, max_workers=None, processes=False):
+        super().__init__(parent)
+        max_workers = max_workers or os.cpu_count() or 1
+        # a process pool needs a picklable function, e.g. heatmap_engine.compute_heatmap
+        if processes:
+            self._executor = ProcessPoolExecutor(max_workers=max_workers)
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="heatmap")
+        self._jobs = {}
+        self._next_id = 0
+        # emitted from a pool thread, Qt queues it to the thread this object lives in
+        self._done.connect(self._on_done)
+
+    def submit(self, key, fn, *args, **kwargs):
+        self.cancel(key)
+        self._next_id += 1
+        job_id = self._next_id
+        future = self._executor.submit(fn, *args, **kwargs)
+        self._jobs[key] = (job_id, future)
+        future.add_done_callback(lambda f: self._emit_done(key, job_id, f))
+        return job_id
+
+    def _emit_done(self, key, job_id, future):
+        if future.cancelled():
+            return
+        error = future.exception()
+        self._done.emit(key, job_id, None if error else future.result(), error)
+
+    def _on_done(self, key, job_id, result, error):
+        job = self._jobs.get(key)
+        if job is None or job[0] != job_id:
+            return
+        del self._jobs[key]
+        if error is not None:
+            self.failed.emit(key, str(error))
+        else:
+            self.result_ready.emit(key, result)
+
+    def progress_callback(self, key):
+        return lambda done, total: self.progress.emit(key, done, total)
+
+    def is_pending(self, key):
+        return key in self._jobs
+
+    def cancel(self, key):
+        job = self._jobs.pop(key, None)
+        if job is not None:
+            job[1].cancel()
+
+    def cancel_all(self):
+        for key in list(self._jobs):
+            self.cancel(key)
+
+    def shutdown(self):
+        self.cancel_all()
+        self._executor.shutdown(wait=False, cancel_futures=True)
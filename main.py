@@ -4,19 +4,32 @@ import os
 import numpy as np
 import pyqtgraph as pg
 from pyqtgraph.exporters import ImageExporter
-from PIL import Image
 from PyQt6 import QtWidgets
-from PyQt6.QtCore import QResource, QTimer, QProcess, Qt, QDir
-from PyQt6.QtWidgets import QFileDialog, QApplication, QTableWidgetItem, QHeaderView, QListWidgetItem
+from PyQt6.QtCore import QResource, QTimer, Qt, QDir, QStandardPaths
+from PyQt6.QtWidgets import QFileDialog, QApplication, QHeaderView, QListWidgetItem, QLabel, QProgressBar
 from PyQt6.QtGui import QIcon
 import math
-import json
+import argparse
 from map_scale import SetMapScale
 from pathlib import Path
-import csv
-from scipy.interpolate import griddata
-from scipy.ndimage import gaussian_filter
-from zipfile import ZipFile
+import heatmap_engine
+from sample_store import SampleStore, CSV_HEADERS
+from heatmap_cache import HeatmapCache, make_key
+from heatmap_worker import HeatmapWorker
+from project_io import read_project, write_project
+from floorplan_tiles import FloorplanPyramid, TiledFloorplanItem
+from capture_journal import CaptureJournal
+from csv_stream import export_csv, is_gzip
+from scanner import LswifiScanner, ReplayScanner, ScanScheduler
+from scan_table import ScanTableModel, ScanFilterProxy
+from ap_localization import APLocator, select, write_table
+from perf_trace import span, timed
+from diagnostics import DiagnosticsDialog
+from report_render import render_report, DEFAULT_DPI
+from sample_bins import SampleAggregator, REDUCERS
+from footprint import Footprint
+import channel_plan
+from channel_plan import ChannelPlanner
 
 
 # https://stackoverflow.com/questions/7674790/bundling-data-files-with-pyinstaller-onefile
@@ -32,15 +45,40 @@ ui_path = resource_path("wifi_UI.ui")
 # https://www.pythonguis.com/tutorials/pyside6-embed-pyqtgraph-custom-widgets/
 uiclass, baseclass = pg.Qt.loadUiType(ui_path)
 
-UI_COLUMNS = ["Name", "SSID", "Signal", "Freq", "Ch", "Ch Width (MHz)", "Protocol", "Time"]
-CSV_HEADERS = ["x", "y", "timestamp", "interface_mac", "bssid", "channel_frequency", "channel_number", "channel_width", "phy_type", "rssi", "ssid"]
+DETAIL_PIXELS_PER_CELL = 2
+MAX_DETAIL_CELLS = 800
+DETAIL_MARGIN = 0.25
+# koondkaart arvutatakse kõigi märgitud võrkude BSSID-dest üheks kihiks
+HEATMAP_MODES = {"Per network": None, "Best server": "best", "Second best (overlap)": "second"}
+# channel plan layers are computed from the whole survey, not only the checked networks
+HEATMAP_MODES.update({f"{label} {band}": (metric, band) for metric, (label, _) in channel_plan.METRICS.items() for band in channel_plan.BANDS})
+COMPOSITE_KEY = "composite"
+CHANNEL_KEY = "channel plan"
+# the channel summary of a layer is cached next to its grid under the grid key plus this
+SUMMARY_SUFFIX = "-summary"
+FOOTPRINT_TINT = (128, 0, 128, 90)
+
+
+def locate_with(compute, locator, key, arrays, bssids, scale, *args, **kwargs):
+    # heatmap job that also places the access points of bssids on the worker, compute None when
+    # the heatmap is cached already -> (grid, (x, y, radius in floor plan pixels))
+    grid = None if compute is None else compute(*args, **kwargs)
+    ap_x, ap_y, radius_m = locator.positions(key, arrays, bssids)
+    return grid, (ap_x, ap_y, radius_m / scale)
+
+
+def export_access_points(locator, key, arrays, path):
+    return write_table(locator.result(key, arrays), path)
+
+
+def export_channel_plan(planner, key, arrays, path):
+    return channel_plan.write_table(planner.result(key, arrays), path)
 
 class MainWindow(uiclass, baseclass):
 
-    def __init__(self):
+    def __init__(self, scanner=None, min_scan_interval=1.0, scan_timeout=30.0, journal_dir=None):
         super().__init__()
         base_dir = Path(__file__).resolve().parent
-        self.temp_json_path = str((base_dir / "temp.json").resolve())
         self.image_item = None
 
         self.setupUi(self)
@@ -59,20 +97,42 @@ class MainWindow(uiclass, baseclass):
         self.actionNew.triggered.connect(self.open_file_dialog)
         self.actionExport.triggered.connect(self.save_csv_dialog)
         self.actionExportScreenshot.triggered.connect(self.save_screenshot_dialog)
+        self.actionExportAccessPoints.triggered.connect(self.save_access_points_dialog)
+        self.actionExportChannelPlan.triggered.connect(self.save_channel_plan_dialog)
+        self.actionDiagnostics.triggered.connect(self.show_diagnostics)
+        self.diagnostics = None
         self.actionCapture.triggered.connect(self.on_capture_clicked)
         self.actionSaveProject.triggered.connect(self.save_project_dialog)
         self.actionOpenProject.triggered.connect(self.import_project)
-        self.scan_location_marker = None
         self.settings_window = None
-        self.scan_results = []
+        self.scan_results = SampleStore()
         self.map_scale_markers = []
-        self.map_ui_markers = []
+        # all survey locations are drawn by one scatter item, hovering a point lists what was heard there
+        self.survey_points = pg.ScatterPlotItem(
+            symbol='x',
+            size=20,
+            pen=pg.mkPen(color='r', width=3),
+            brush=pg.mkBrush(color='r'),
+            hoverable=True,
+            tip=self.survey_point_tip
+        )
+        self.survey_points.setZValue(10)
+        self.graphWidget.addItem(self.survey_points)
         self.ap_markers = []
+        # (x, y, radius) of the markers shown, the report draws the same ones
+        self.ap_positions = []
         self.ui_markers_visible = True
-        #https://doc.qt.io/qtforpython-6/tutorials/basictutorial/tablewidget.html
-        self.tableWidget.setColumnCount(len(UI_COLUMNS))
-        self.tableWidget.setHorizontalHeaderLabels(UI_COLUMNS)
-        header = self.tableWidget.horizontalHeader()
+        # https://doc.qt.io/qt-6/model-view-programming.html#proxy-models
+        self.scan_table = ScanTableModel(self)
+        self.scan_filter = ScanFilterProxy(self)
+        self.scan_filter.setSourceModel(self.scan_table)
+        self.tableView.setModel(self.scan_filter)
+        self.tableView.sortByColumn(2, Qt.SortOrder.DescendingOrder)
+        self.lineFilterSSID.textChanged.connect(self.scan_filter.set_ssid_filter)
+        self.comboBand.addItems(["All bands", "2.4 GHz", "5 GHz", "6 GHz"])
+        self.comboBand.currentIndexChanged.connect(lambda i: self.scan_filter.set_band_filter(self.comboBand.currentText() if i else None))
+        self.spinMinRssi.valueChanged.connect(lambda v: self.scan_filter.set_min_rssi(None if v == self.spinMinRssi.minimum() else v))
+        header = self.tableView.horizontalHeader()
 
         header.setSectionResizeMode(0, QHeaderView.ResizeMode.ResizeToContents)
         header.setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
@@ -83,104 +143,313 @@ class MainWindow(uiclass, baseclass):
         header.setSectionResizeMode(7, QHeaderView.ResizeMode.Stretch)
 
         self.latest_scan = []
-        self._scan_running = False
 
-        self.proc = QProcess(self) # käivitab lswifi
-        self.proc.setWorkingDirectory(str(base_dir)) 
-        self.proc.finished.connect(self.on_scan_finished)
+        self.scanner = scanner or LswifiScanner(base_dir) # käivitab lswifi, testimisel ReplayScanner
+        self.scanner.setParent(self)
+        self.scanner.scan_finished.connect(self.on_scan_finished)
+        self.scanner.scan_failed.connect(self.on_scan_failed)
+
+        # järgmine skaneering algab kohe, kui eelmine on valmis, kuid mitte sagedamini kui min_scan_interval
+        self.scan_scheduler = ScanScheduler(self.scanner, min_interval=min_scan_interval, timeout=scan_timeout, parent=self)
+        self.scan_scheduler.stats_changed.connect(self.on_scan_stats)
+        self.scanRateLabel = QLabel()
+        self.statusBar().addPermanentWidget(self.scanRateLabel)
 
-        self.timer = QTimer()
-        self.timer.setInterval(3000)
-        self.timer.timeout.connect(self.passive_wifi_scan)
-    
 
         self.actionStop.triggered.connect(self.on_stop_clicked)
         self.scale = None
         self.heatmap_item = None
         self.heatmap_items = {}
+        self.live_heatmaps = {}
+        self.heatmap_bssids = {}
+        self.composite_bssids = []
+        self.heatmap_cache = HeatmapCache()
+        # asukohad arvutatakse kõigile BSSID-dele korraga ja uuesti alles uute mõõtmiste järel
+        self.ap_locator = APLocator()
+        self.channel_planner = ChannelPlanner()
+        # newest cache key per channel layer, a layer recomputed for new samples replaces its older grid
+        self.channel_layer_keys = {}
+        # colormap range of heatmaps that are not RSSI, by heatmap key
+        self.heatmap_levels = {}
+        self.pending_heatmaps = {}
+        self.heatmap_worker = HeatmapWorker(self)
+        self.heatmap_worker.result_ready.connect(self.on_heatmap_ready)
+        self.heatmap_worker.failed.connect(self.on_heatmap_failed)
+        # projects and CSV files are read and written in chunks off the GUI thread
+        self.io_worker = HeatmapWorker(self, max_workers=1)
+        self.io_worker.result_ready.connect(self.on_io_done)
+        self.io_worker.failed.connect(self.on_io_failed)
+        self.io_worker.progress.connect(self.on_io_progress)
+        self.io_paths = {}
+        self.progressBar = QProgressBar()
+        self.progressBar.setMaximumWidth(200)
+        self.progressBar.hide()
+        self.statusBar().addPermanentWidget(self.progressBar)
+        # zoomed in views get a finer heatmap of the visible region on top of the full 200x200 one
+        self.detail_items = {}
+        self.pending_details = {}
+        self.detail_worker = HeatmapWorker(self, max_workers=2)
+        self.detail_worker.result_ready.connect(self.on_detail_ready)
+        self.detail_timer = QTimer(self)
+        self.detail_timer.setSingleShot(True)
+        self.detail_timer.setInterval(300)
+        self.detail_timer.timeout.connect(self.refine_visible_heatmaps)
+        self.floorplan = None
+        self.floorplan_file = None
+        # mõõtmised kirjutatakse jooksvalt ka kettale, et krahhi korral need järgmisel käivitusel taastada
+        journal_dir = journal_dir or Path(QStandardPaths.writableLocation(QStandardPaths.StandardLocation.AppDataLocation)) / "capture_journal"
+        self.journal = CaptureJournal(journal_dir)
+        self.resumed_capture = False
+        self.floorplan_timer = QTimer(self)
+        self.floorplan_timer.setSingleShot(True)
+        self.floorplan_timer.setInterval(50)
+        self.floorplan_timer.timeout.connect(self.update_floorplan_tiles)
+        # floor plan levels are decoded and cut into tiles off the GUI thread, one job at a time
+        self.tile_worker = HeatmapWorker(self, max_workers=1)
+        self.tile_worker.result_ready.connect(self.on_tiles_ready)
+        self.tile_worker.failed.connect(lambda key, error: self.statusBar().showMessage(f"Floor plan tiles failed: {error}", 5000))
+        self.graphWidget.getPlotItem().vb.sigRangeChanged.connect(self.on_view_changed)
+        self.network_items = {}
+        self.network_bssids = {}
+        # heatmaps checked while a scan is in flight, plotted when it is delivered
+        self.queued_heatmaps = set()
         self.listSSID.itemChanged.connect(self.list_changed)
+        self.interpolation = heatmap_engine.DEFAULT_METHOD
+        self.comboInterpolation.addItems(list(heatmap_engine.INTERPOLATORS))
+        self.comboInterpolation.currentTextChanged.connect(self.interpolation_changed)
+        self.heatmap_mode = None
+        # korduvad mõõtmised samas kohas liidetakse enne interpoleerimist üheks punktiks
+        self.aggregator = SampleAggregator(self.spinAggregateRadius.value())
+        self.comboAggregate.addItems(list(REDUCERS))
+        self.spinAggregateRadius.valueChanged.connect(self.aggregation_changed)
+        self.comboAggregate.currentTextChanged.connect(self.aggregation_changed)
+        # heatmaps are only computed inside the building footprint, detected from the plan or drawn by hand
+        self.footprint = None
+        self.footprint_grid = None
+        self.footprint_points = []
+        self.footprint_add = True
+        self.footprint_outline = pg.PlotDataItem(pen=pg.mkPen(color='m', width=2), symbol='o', symbolSize=6, symbolBrush='m')
+        self.footprint_outline.setZValue(20)
+        self.footprint_overlay = None
+        self.checkFootprint.toggled.connect(self.footprint_changed)
+        self.buttonDetectFootprint.clicked.connect(self.detect_footprint)
+        self.buttonFootprintAdd.toggled.connect(lambda checked: self.edit_footprint(checked, add=True))
+        self.buttonFootprintRemove.toggled.connect(lambda checked: self.edit_footprint(checked, add=False))
+        self.comboHeatmapMode.addItems(list(HEATMAP_MODES))
+        self.comboHeatmapMode.currentTextChanged.connect(self.heatmap_mode_changed)
         self.colorbar = None
 
     def closeEvent(self, event):
-        try:
-            if self.proc is not None and self.proc.state() != QProcess.ProcessState.NotRunning:
-                self.proc.kill()
-                self.proc.waitForFinished(1000)
-        except Exception:
-            pass
+        self.heatmap_worker.shutdown()
+        self.io_worker.shutdown()
+        self.detail_worker.shutdown()
+        self.tile_worker.shutdown()
+        self.scan_scheduler.stop()
+        self.journal.close()
         super().closeEvent(event)
 
     def list_changed(self, item):
-        any_ssid_checked = False
-        if self._scan_running:
+        if self.heatmap_mode is not None:
+            self.queue_heatmaps()
             return
-        bssid_list = item.data(Qt.ItemDataRole.UserRole)
         key = item.text()
         if item.checkState() == Qt.CheckState.Checked:
-            any_ssid_checked = True
-            self.plot_wifi_heatmap_griddata(bssid_list=bssid_list, key=key)
+            self.queue_heatmaps(key)
             #self.remove_ui_markers()
         else:
+            self.queued_heatmaps.discard(key)
             if key in self.heatmap_items:
-                self.graphWidget.removeItem(self.heatmap_items[key])
-                del self.heatmap_items[key]
                 self.remove_ap_markers()
                 #self.show_ui_markers()
-
-        if any_ssid_checked is False:
+            self.remove_heatmap(key)
             self.bannerFrame.hide()
 
-    def passive_wifi_scan(self):
-         if self._scan_running:
-             return
-        
-         p = Path(self.temp_json_path)
-         if p.exists():
-             p.unlink()
-         self._scan_running = True
+    def queue_heatmaps(self, key=None):
+        # key None replots every checked network. During a scan the heatmaps wait until it is
+        # delivered (on_scan_finished), so they already include the networks it adds.
+        self.queued_heatmaps.add(key)
+        if not self.scan_scheduler.scanning:
+            self.plot_queued_heatmaps()
+
+    def plot_queued_heatmaps(self):
+        queued, self.queued_heatmaps = self.queued_heatmaps, set()
+        if None in queued:
+            self.plot_checked_heatmaps()
+            return
+        for key in queued:
+            item = self.network_items.get(key)
+            if item is not None and item.checkState() == Qt.CheckState.Checked:
+                self.plot_wifi_heatmap_griddata(bssid_list=item.data(Qt.ItemDataRole.UserRole), key=key)
+
+    def remove_heatmap(self, key):
+        self.cancel_heatmap(key)
+        self.remove_detail(key)
+        self.live_heatmaps.pop(key, None)
+        self.heatmap_bssids.pop(key, None)
+        self.heatmap_levels.pop(key, None)
+        if key in self.heatmap_items:
+            self.graphWidget.removeItem(self.heatmap_items.pop(key))
 
-         self.proc.start("lswifi.exe", ["--json", self.temp_json_path])
+    def checked_items(self):
+        items = [self.listSSID.item(i) for i in range(self.listSSID.count())]
+        return [item for item in items if item.checkState() == Qt.CheckState.Checked]
 
+    def plot_checked_heatmaps(self):
+        if isinstance(self.heatmap_mode, tuple):
+            self.plot_channel_layer(*self.heatmap_mode)
+            return
+        if self.heatmap_mode is not None:
+            bssids = {bssid for item in self.checked_items() for bssid in item.data(Qt.ItemDataRole.UserRole)}
+            self.plot_composite_heatmap(sorted(bssids, key=str))
+            return
+        for item in self.checked_items():
+            self.plot_wifi_heatmap_griddata(bssid_list=item.data(Qt.ItemDataRole.UserRole), key=item.text())
+
+    def interpolation_changed(self, method):
+        self.interpolation = method
+        self.live_heatmaps.clear()
+        self.remove_ap_markers()
+        self.plot_checked_heatmaps()
+
+    def aggregation_changed(self, *args):
+        self.aggregator.configure(self.spinAggregateRadius.value(), self.comboAggregate.currentText())
+        self.live_heatmaps.clear()
+        self.remove_ap_markers()
+        self.queue_heatmaps()
+
+    def aggregation_settings(self):
+        return {"radius": self.aggregator.radius, "reduce": self.aggregator.reduce}
+
+    def apply_aggregation_settings(self, settings):
+        if not settings:
+            return
+        for widget in (self.spinAggregateRadius, self.comboAggregate):
+            widget.blockSignals(True)
+        self.spinAggregateRadius.setValue(settings.get("radius", self.aggregator.radius))
+        self.comboAggregate.setCurrentText(settings.get("reduce", self.aggregator.reduce))
+        for widget in (self.spinAggregateRadius, self.comboAggregate):
+            widget.blockSignals(False)
+        self.aggregator.configure(self.spinAggregateRadius.value(), self.comboAggregate.currentText())
+
+    def footprint_mask(self):
+        # heatmap grid cells inside the footprint, None when there is no footprint or it is switched off
+        if self.footprint is None or not self.checkFootprint.isChecked():
+            return None
+        return self.footprint_grid
+
+    def set_footprint(self, footprint):
+        self.footprint = footprint
+        self.footprint_grid = None if footprint is None else footprint.grid(heatmap_engine.GRID_SCALE)
+        self.show_footprint_overlay(self.buttonFootprintAdd.isChecked() or self.buttonFootprintRemove.isChecked())
+        self.footprint_changed()
+
+    def footprint_changed(self, *args):
+        self.live_heatmaps.clear()
+        for key in list(self.detail_items):
+            self.remove_detail(key)
+        self.queue_heatmaps()
+
+    def detect_footprint(self):
+        if self.floorplan is None:
+            return
+        self.io_paths["footprint"] = self.floorplan_file
+        self.io_worker.submit("footprint", Footprint.detect, self.floorplan.level(self.floorplan.overview_level),
+                              self.image_width_pixels, self.image_height_pixels)
 
-    def on_scan_finished(self):
-        self._scan_running = False
-        p = Path(self.temp_json_path)
-        if not p.exists():
+    def edit_footprint(self, checked, add):
+        other = self.buttonFootprintRemove if add else self.buttonFootprintAdd
+        sig = self.graphWidget.scene().sigMouseClicked
+        if checked:
+            # finishes the polygon of the other button first
+            other.setChecked(False)
+            self.footprint_add = add
+            self.footprint_points = []
+            self.footprint_outline.setData([], [])
+            self.clickable_toggle(False)
+            sig.connect(self.on_footprint_clicked)
+            self.graphWidget.addItem(self.footprint_outline)
+            self.show_footprint_overlay(True)
             return
-        
-        try:
-            with p.open("r", encoding="utf-8") as f:
-                data = json.load(f)
-        except (json.JSONDecodeError):
+        sig.disconnect(self.on_footprint_clicked)
+        self.graphWidget.removeItem(self.footprint_outline)
+        self.show_footprint_overlay(False)
+        self.clickable_toggle(self.scan_scheduler.is_active())
+        points, self.footprint_points = self.footprint_points, []
+        if len(points) < 3 or self.floorplan is None:
             return
-        
-        scan_data = data.get("scan_data", [])
+        footprint = self.footprint
+        if footprint is None:
+            # adding starts from an empty footprint, removing from the whole plan
+            width, height = self.floorplan.level(self.floorplan.overview_level).size
+            footprint = Footprint(np.full((height, width), not add), self.image_width_pixels, self.image_height_pixels)
+        self.checkFootprint.blockSignals(True)
+        self.checkFootprint.setChecked(True)
+        self.checkFootprint.blockSignals(False)
+        self.set_footprint(footprint.edit(points, add))
+
+    def on_footprint_clicked(self, event):
+        if event.double():
+            # the first click of the double-click already added the last corner
+            (self.buttonFootprintAdd if self.footprint_add else self.buttonFootprintRemove).setChecked(False)
+            return
+        pos = self.graphWidget.getPlotItem().vb.mapSceneToView(event.scenePos())
+        self.footprint_points.append((pos.x(), pos.y()))
+        xs, ys = zip(*(self.footprint_points + self.footprint_points[:1]))
+        self.footprint_outline.setData(xs, ys)
+
+    def show_footprint_overlay(self, visible):
+        # while editing, the area outside the footprint is tinted
+        if self.footprint_overlay is not None:
+            self.graphWidget.removeItem(self.footprint_overlay)
+            self.footprint_overlay = None
+        if not visible or self.footprint is None:
+            return
+        rgba = np.zeros(self.footprint.mask.shape + (4,), dtype=np.uint8)
+        rgba[~self.footprint.mask] = FOOTPRINT_TINT
+        self.footprint_overlay = pg.ImageItem(rgba[::-1].transpose(1, 0, 2))
+        self.footprint_overlay.setRect(pg.QtCore.QRectF(0, 0, self.image_width_pixels, self.image_height_pixels))
+        self.footprint_overlay.setZValue(5)
+        self.graphWidget.addItem(self.footprint_overlay)
+
+    def heatmap_input(self, bssid_list):
+        if self.aggregator.radius > 0 and self.scale:
+            return self.aggregator.heatmap_input(self.scan_results, self.scale, bssid_list)
+        return self.scan_results.heatmap_input(bssid_list)
+
+    def composite_input(self, bssid_list):
+        if self.aggregator.radius > 0 and self.scale:
+            return self.aggregator.composite_input(self.scan_results, self.scale, bssid_list)
+        return self.scan_results.composite_input(bssid_list)
+
+    def heatmap_mode_changed(self, text):
+        self.heatmap_mode = HEATMAP_MODES[text]
+        for key in list(self.heatmap_items):
+            self.remove_heatmap(key)
+        self.composite_bssids = []
+        self.remove_ap_markers()
+        self.bannerFrame.hide()
+        self.queue_heatmaps()
+
+    def on_scan_stats(self, scans_per_minute, latency):
+        self.scanRateLabel.setText(f"{scans_per_minute:.1f} scans/min, last scan {latency:.1f} s")
+
+    def on_scan_failed(self, error):
+        self.statusBar().showMessage(f"Scan failed: {error}", 5000)
+        self.plot_queued_heatmaps()
+
+    @timed("on_scan_finished")
+    def on_scan_finished(self, scan_data):
         self.latest_scan = scan_data
         self.update_table_from_latest_scan()
         self.update_list_widget(scan_data)
+        self.plot_queued_heatmaps()
 
+    @timed("update_table_from_latest_scan")
     def update_table_from_latest_scan(self):
         results = self.latest_scan
         if not isinstance(results, list):
             return
-
-        self.tableWidget.setUpdatesEnabled(False)
-        try:
-            self.tableWidget.clearContents()
-            self.tableWidget.setRowCount(len(results))
-            for i, result in enumerate(results):
-                if not isinstance(result, dict):
-                    continue
-                self.tableWidget.setItem(i, 0, QTableWidgetItem(str(result.get("bssid", ""))))
-                self.tableWidget.setItem(i, 1, QTableWidgetItem(str(result.get("ssid", "") or "hidden")))
-                self.tableWidget.setItem(i, 2, QTableWidgetItem(str(result.get("rssi", ""))))
-                self.tableWidget.setItem(i, 3, QTableWidgetItem(str(result.get("channel_frequency", ""))))
-                self.tableWidget.setItem(i, 4, QTableWidgetItem(str(result.get("channel_number", ""))))
-                self.tableWidget.setItem(i, 5, QTableWidgetItem(str(result.get("channel_width", ""))))
-                self.tableWidget.setItem(i, 6, QTableWidgetItem(str(result.get("phy_type", ""))))
-                self.tableWidget.setItem(i, 7, QTableWidgetItem(str(result.get("timestamp", ""))))
-        finally:
-            self.tableWidget.setUpdatesEnabled(True)
+        self.scan_table.apply_scan(results)
 
 
     def open_settings(self):
@@ -201,28 +470,45 @@ class MainWindow(uiclass, baseclass):
 
 
     def on_capture_clicked(self):
+        if self.resumed_capture:
+            # a capture resumed from the journal continues with its samples
+            self.resumed_capture = False
+            self.ui_markers_visible = False
+            self.capture_state()
+            self.clickable_toggle(True)
+            self.statusBar().showMessage(f"Scan resumed")
+            self.scanRateLabel.clear()
+            self.scan_scheduler.start()
+            return
         self.scan_results.clear()
         self.clear_ui_markers()
         self.latest_scan = []
-        self.tableWidget.clearContents()
-        self.listSSID.clear()
+        self.scan_table.clear()
+        self.clear_network_list()
         self.bannerFrame.hide()
         for i in self.heatmap_items.values():
             self.graphWidget.removeItem(i)
         self.heatmap_items.clear()
+        self.cancel_all_heatmaps()
+        self.live_heatmaps.clear()
+        self.heatmap_bssids.clear()
+        self.composite_bssids = []
         self.colorbar = None
-        self.remove_ui_markers()
         self.ui_markers_visible = False
-        self.bannerLabel.setText("Click on your current location to start collecting data.\n" "Wi-Fi scan updates every 3 seconds.")
+        self.bannerLabel.setText("Click on your current location to start collecting data.\n" "Wi-Fi scans run continuously.")
         self.bannerFrame.show()
         self.capture_state()
         self.clickable_toggle(True)
         self.statusBar().showMessage(f"Scan started")
-        self.timer.start()
-        self.passive_wifi_scan()
+        self.scanRateLabel.clear()
+        self.journal.start({"scale": float(self.scale), "interpolation": self.interpolation, "aggregation": self.aggregation_settings()},
+                           self.floorplan_bytes, self.floorplan_file, self.scan_results)
+        self.scan_scheduler.start()
     
     def on_stop_clicked(self):
-        self.timer.stop()
+        self.scan_scheduler.stop()
+        self.plot_queued_heatmaps()
+        self.journal.sync()
         self.clickable_toggle(False)
         self.bannerFrame.hide()
         self.statusBar().showMessage(f"Scan stopped")
@@ -230,16 +516,6 @@ class MainWindow(uiclass, baseclass):
         self.show_ui_markers()
         self.ui_markers_visible = True
 
-
-        try:
-            if self.proc is not None and self.proc.state() != QProcess.ProcessState.NotRunning:
-                self.proc.kill()
-                self.proc.waitForFinished(1000)
-        except Exception:
-            pass
-
-        self._scan_running = False
-        
     def open_file_dialog(self):
         file_dialog = QtWidgets.QFileDialog(self)
 
@@ -258,12 +534,34 @@ class MainWindow(uiclass, baseclass):
 # https://stackoverflow.com/questions/42988983/qfiledialog-getsavefilename-is-not-saving-into-any-kind-of-file
 
     def save_csv_dialog(self):
-        filename, filter = QtWidgets.QFileDialog.getSaveFileName(self, "Save file", QDir.currentPath(), "All Files (*);; CSV Files (*.csv)")
+        filename, filter = QtWidgets.QFileDialog.getSaveFileName(self, "Save file", QDir.currentPath(), "CSV Files (*.csv);; Compressed CSV Files (*.csv.gz);; All Files (*)")
         if filename and self.scan_results:
-            with open(filename, 'w', newline='') as csvfile:
-                writer = csv.DictWriter(csvfile, fieldnames=CSV_HEADERS)
-                writer.writeheader()
-                writer.writerows(self.scan_results)
+            if "Compressed" in filter and not is_gzip(filename):
+                filename += ".gz"
+            # written in chunks on the io worker, the capture can go on meanwhile
+            self.io_paths["export"] = filename
+            self.show_progress("Exporting CSV")
+            self.io_worker.submit("export", export_csv, self.scan_results, filename, progress=self.io_worker.progress_callback("export"))
+
+    def save_channel_plan_dialog(self):
+        if not self.scan_results:
+            return
+        filename, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Export channel plan", QDir.currentPath(), "CSV Files (*.csv);; All Files (*)")
+        if filename:
+            # analyzed on the io worker like the other exports
+            self.io_paths["channel plan"] = filename
+            self.io_worker.submit("channel plan", export_channel_plan, self.channel_planner, self.channel_planner.key(self.scan_results),
+                                  self.scan_results.to_arrays(), filename)
+
+    def save_access_points_dialog(self):
+        if not self.scan_results or self.scale is None:
+            return
+        filename, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Export access points", QDir.currentPath(), "CSV Files (*.csv);; All Files (*)")
+        if filename:
+            # fitted on the io worker like the other exports
+            self.io_paths["access points"] = filename
+            self.io_worker.submit("access points", export_access_points, self.ap_locator, self.ap_locator.key(self.scan_results, self.scale),
+                                  self.scan_results.to_arrays(), filename)
 
 # https://stackoverflow.com/questions/15757213/custom-filetype-in-python-3
 # https://www.geeksforgeeks.org/python/json-dump-in-python/
@@ -273,69 +571,132 @@ class MainWindow(uiclass, baseclass):
         filename, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Save project", QDir.currentPath(), "WiFi Heatmap project (*.wht)")
         if not filename:
             return
-        with ZipFile(filename, "w") as zipref:
-            csv_path = "scan_results.csv"
-            with open(csv_path, 'w', newline='') as csvfile:
-                writer = csv.DictWriter(csvfile, fieldnames=CSV_HEADERS)
-                writer.writeheader()
-                writer.writerows(self.scan_results)
-            zipref.write(csv_path)
-            zipref.write(self.current_image_path, "floorplan.png")
-
-            data = {
-                "scale": float(self.scale),
-                "image_file": "floorplan.png",
-                "ui_markers_visible": self.ui_markers_visible
-            }
-            with open("project.json", "w") as f:
-                json.dump(data, f)
-            zipref.write("project.json")
+        heatmap_cache = self.heatmap_cache.to_bytes() if len(self.heatmap_cache) else None
+        write_project(filename, self.scan_results, self.floorplan_bytes, self.scale, ui_markers_visible=self.ui_markers_visible,
+                      interpolation=self.interpolation, heatmap_cache=heatmap_cache, aggregation=self.aggregation_settings(),
+                      footprint=self.footprint.to_png() if self.footprint is not None else None, footprint_enabled=self.checkFootprint.isChecked())
+        # the journal is only dropped once the samples it holds are in the saved project, another
+        # project opened after resuming a capture leaves the recovered capture in it
+        if not self.scan_scheduler.is_active() and self.scan_results.storage is self.journal:
+            self.journal.discard()
 
     def import_project(self):
         filename, _ = QtWidgets.QFileDialog.getOpenFileName(self, "Open project", QDir.currentPath(), "WiFi Heatmap project (*.wht)")
         if not filename:
             return
-        with ZipFile(filename, "r") as zipref:
-            zipref.extractall()
-        with open("project.json", "r") as f:
-            project = json.load(f)
-        image_path = "floorplan.png"
-        self.load_image(image_path, open_scale_window=False)
-        self.scale = project["scale"]
-        with open("scan_results.csv", newline="") as csvfile:
-            reader = csv.DictReader(csvfile)
-            self.scan_results = list(reader)
-            self.build_map_ui_markers_from_scan_results()
-            self.ui_markers_visible = project.get("ui_markers_visible", True)
-            if self.ui_markers_visible:
-                self.show_ui_markers()
+        self.io_paths["import"] = filename
+        self.actionOpenProject.setEnabled(False)
+        self.show_progress("Opening project")
+        self.io_worker.submit("import", read_project, filename, progress=self.io_worker.progress_callback("import"))
+
+    def show_progress(self, text):
+        self.progressBar.setFormat(f"{text} %p%")
+        self.progressBar.setValue(0)
+        self.progressBar.show()
+
+    def on_io_progress(self, key, done, total):
+        self.progressBar.setValue(int(100 * done / total) if total else 0)
+
+    def on_io_done(self, key, result):
+        self.progressBar.hide()
+        if key == "import":
+            self.apply_project(result)
+        elif key == "footprint":
+            self.set_footprint(result)
+            if result is None:
+                self.statusBar().showMessage("No building footprint found on the floor plan, heatmaps cover the whole plan", 5000)
             else:
-                self.remove_ui_markers()
-        
-        last_bssid = {}
-        for r in self.scan_results:
-            bssid = r.get("bssid")
-            if bssid:
-                last_bssid[bssid] = r
-        self.latest_scan = list(last_bssid.values())
-        self.update_table_from_latest_scan()
+                self.statusBar().showMessage(f"Building footprint covers {result.coverage():.0%} of the floor plan", 5000)
+        elif key == "report":
+            self.statusBar().showMessage(f"Saved {result[0]} x {result[1]} px report to {self.io_paths[key]}", 5000)
+        else:
+            self.statusBar().showMessage(f"Exported {result} rows to {self.io_paths[key]}", 5000)
+
+    def on_io_failed(self, key, error):
+        self.progressBar.hide()
+        self.actionOpenProject.setEnabled(True)
+        self.statusBar().showMessage(f"{self.io_paths[key]}: {error}", 5000)
+
+    def apply_project(self, project):
+        self.load_image(project["image_file"], open_scale_window=False, data=project["image_bytes"])
+        self.scale = project["scale"]
+        self.comboInterpolation.blockSignals(True)
+        self.comboInterpolation.setCurrentText(project.get("interpolation", heatmap_engine.DEFAULT_METHOD))
+        self.comboInterpolation.blockSignals(False)
+        self.interpolation = self.comboInterpolation.currentText()
+        self.apply_aggregation_settings(project.get("aggregation"))
+        if project.get("footprint_bytes"):
+            self.checkFootprint.blockSignals(True)
+            self.checkFootprint.setChecked(project.get("footprint_enabled", True))
+            self.checkFootprint.blockSignals(False)
+            self.io_worker.cancel("footprint")
+            self.set_footprint(Footprint.from_png(project["footprint_bytes"], self.image_width_pixels, self.image_height_pixels))
+        if project.get("heatmap_cache_bytes"):
+            self.heatmap_cache.load_bytes(project["heatmap_cache_bytes"])
+        self.scan_results = project["store"]
+        self.build_map_ui_markers_from_scan_results()
+        self.ui_markers_visible = project.get("ui_markers_visible", True)
+        if self.ui_markers_visible:
+            self.show_ui_markers()
+        else:
+            self.remove_ui_markers()
+
+        self.latest_scan = self.scan_results.latest_by_bssid()
+        self.scan_table.reset(self.latest_scan)
         self.update_list_widget(self.latest_scan)
         self.initial_actions_state()
-        
 
-    def load_image(self, file_path, open_scale_window=True):
+
+    def resume_capture_journal(self):
+        if not self.journal.exists():
+            return False
+        try:
+            session, floorplan_bytes, arrays = self.journal.load()
+        except (OSError, ValueError, KeyError) as e:
+            self.statusBar().showMessage(f"Could not resume the interrupted capture: {e}", 5000)
+            self.journal.discard()
+            return False
+        if len(arrays["rssi"]) == 0:
+            self.journal.discard()
+            return False
+        self.load_image(session["image_file"], open_scale_window=False, data=floorplan_bytes)
+        self.scale = session["scale"]
+        self.comboInterpolation.blockSignals(True)
+        self.comboInterpolation.setCurrentText(session.get("interpolation", heatmap_engine.DEFAULT_METHOD))
+        self.comboInterpolation.blockSignals(False)
+        self.interpolation = self.comboInterpolation.currentText()
+        self.apply_aggregation_settings(session.get("aggregation"))
+        self.scan_results.load_arrays(arrays)
+        self.journal.resume(self.scan_results)
+        self.resumed_capture = True
+        self.build_map_ui_markers_from_scan_results()
+        self.show_ui_markers()
+        self.latest_scan = self.scan_results.latest_by_bssid()
+        self.scan_table.reset(self.latest_scan)
+        self.update_list_widget(self.latest_scan)
+        self.stopped_state()
+        self.statusBar().showMessage(f"Resumed {len(self.scan_results)} samples of an interrupted capture, press Capture to continue or save the project")
+        return True
+
+    def load_image(self, file_path, open_scale_window=True, data=None):
         if open_scale_window:
             self.scale = None
+        self.resumed_capture = False
         self.scan_results.clear()
+        self.heatmap_cache.clear()
         self.remove_colorbar()
         self.latest_scan = []
-        self.tableWidget.clearContents()
-        self.listSSID.clear()
+        self.scan_table.clear()
+        self.clear_network_list()
         self.bannerFrame.hide()
 
         for i in self.heatmap_items.values():
             self.graphWidget.removeItem(i)
         self.heatmap_items.clear()
+        self.cancel_all_heatmaps()
+        self.live_heatmaps.clear()
+        self.heatmap_bssids.clear()
+        self.composite_bssids = []
         self.colorbar = None
         self.clear_ui_markers()
 
@@ -343,25 +704,30 @@ class MainWindow(uiclass, baseclass):
             self.graphWidget.removeItem(m)
         self.map_scale_markers.clear()
 
-        img = Image.open(file_path).convert("RGB")
-        self.image_array = np.array(img)
-        self.image_height_pixels, self.image_width_pixels = (
-            self.image_array.shape[:2]
-        )
+        self.footprint_points = []
+        self.buttonFootprintAdd.setChecked(False)
+        self.buttonFootprintRemove.setChecked(False)
+        self.io_worker.cancel("footprint")
+        self.footprint = None
+        self.footprint_grid = None
+
+        # the encoded file is kept as is, projects store the floor plan in its original format
+        self.floorplan_bytes = Path(file_path).read_bytes() if data is None else data
+        self.floorplan_file = "floorplan" + Path(file_path).suffix.lower()
+        self.floorplan = FloorplanPyramid(self.floorplan_bytes)
+        self.image_width_pixels = self.floorplan.width
+        self.image_height_pixels = self.floorplan.height
 
         if self.image_item is not None:
             self.graphWidget.removeItem(self.image_item)
-        img_flipped = np.flipud(self.image_array)
-        img_data = img_flipped.transpose((1, 0, 2))
-
-        self.image_item = pg.ImageItem(img_data)
+        self.tile_worker.cancel("tiles")
+        # only the overview and the visible tiles are decoded, see floorplan_tiles.py
+        self.image_item = TiledFloorplanItem(self.floorplan)
         self.graphWidget.setAspectLocked(True)
         self.graphWidget.addItem(self.image_item)
-        self.image_item.setRect(pg.QtCore.QRectF(
-            0, 0,
-            self.image_width_pixels,
-            self.image_height_pixels
-        ))
+        self.floorplan_timer.start()
+        # projects with a saved footprint replace the detected one in apply_project
+        self.detect_footprint()
         self.image_loaded_state()
         if open_scale_window:
             self.open_settings()
@@ -423,15 +789,7 @@ class MainWindow(uiclass, baseclass):
 
     def update_scan_location_marker(self):
         x, y = self.scan_location
-        self.scan_location_marker = pg.ScatterPlotItem(
-            [x], [y],
-            symbol='x',
-            size=20,
-            pen=pg.mkPen(color='r', width=3),
-            brush=pg.mkBrush(color='r')
-        )
-        self.graphWidget.addItem(self.scan_location_marker)
-        self.map_ui_markers.append(self.scan_location_marker)
+        self.survey_points.addPoints([x], [y])
         results = getattr(self, "latest_scan", [])
 
         if isinstance(results, dict): 
@@ -442,59 +800,91 @@ class MainWindow(uiclass, baseclass):
                    if key in CSV_HEADERS} for result in results]
 
         self.scan_results.extend(results)
+        self.journal.append(self.scan_results)
+        if self.actionLiveHeatmap.isChecked():
+            self.refresh_live_heatmaps(results)
     
     def build_map_ui_markers_from_scan_results(self):
-        self.clear_ui_markers()
-        for m in self.scan_results:
-            x = float(m.get("x"))
-            y = float(m.get("y"))
-            marker = pg.ScatterPlotItem(
-            [x], [y],
-            symbol='x',
-            size=20,
-            pen=pg.mkPen(color='r', width=3),
-            brush=pg.mkBrush(color='r')
-        )
-            self.graphWidget.addItem(marker)
-            self.map_ui_markers.append(marker)
-        
-
+        x, y = self.scan_results.locations()
+        self.survey_points.setData(x=x, y=y)
+
+    def survey_point_tip(self, x, y, data):
+        rows = self.scan_results.rows_at(x, y)
+        if len(rows) == 0:
+            return f"x: {x:.0f}\ny: {y:.0f}"
+        rows = rows[np.argsort(-self.scan_results.rssi[rows], kind="stable")]
+        bssids = self.scan_results.dictionary("bssid")
+        ssids = self.scan_results.dictionary("ssid")
+        lines = [f"x: {x:.0f}  y: {y:.0f}  ({len(rows)} BSSIDs)"]
+        # with merging on, each sample is followed by the size and spread of the bin it was merged into
+        merged = self.aggregator.radius > 0 and self.scale
+        if merged:
+            count, variance = self.aggregator.variance(self.scan_results, self.scale, rows[:5])
+        for n, i in enumerate(rows[:5]):
+            ssid = ssids[self.scan_results.codes("ssid")[i]] or "hidden"
+            line = f"{ssid} {bssids[self.scan_results.codes('bssid')[i]]} {self.scan_results.rssi[i]} dBm"
+            if merged:
+                line += f"  (bin: {count[n]:.0f} samples, σ {np.sqrt(variance[n]):.1f} dB)"
+            lines.append(line)
+        return "\n".join(lines)
+
+
+    @timed("update_list_widget")
     def update_list_widget(self, results):
         self.listSSID.blockSignals(True)
         # https://forum.qt.io/topic/113630/item-in-qlistwidget-cannot-be-checked-even-set-the-flags
 
         self.listSSID.setSelectionMode(QtWidgets.QAbstractItemView.SelectionMode.SingleSelection)
         # https://doc.qt.io/qtforpython-6/PySide6/QtWidgets/QListWidget.html#PySide6.QtWidgets.QListWidget.addItem
-        # https://forum.qt.io/topic/113710/remove-duplicate-entries-from-qlistwidget?_=1766934140002
-        networks = {}
+        # network_items and network_bssids index the list by "SSID band", so a scan only touches what changed
+        grown = set()
         for result in results:
-            ssid = result.get("ssid", "") or "hidden"
-            frequency = self.convert_frequency(frequency=result.get("channel_frequency"))
             bssid = result.get("bssid")
-            text = f"{ssid} {frequency}"
-
-            networks.setdefault(text, []).append(bssid)
-
-        for text, bssid in networks.items():
-            if not self.listSSID.findItems(text, Qt.MatchFlag.MatchFixedString | Qt.MatchFlag.MatchCaseSensitive):
+            text = heatmap_engine.network_key(result.get("ssid", ""), result.get("channel_frequency"))
+            bssids = self.network_bssids.get(text)
+            if bssids is None:
                 item_ssid = QListWidgetItem(text)
                 item_ssid.setFlags(item_ssid.flags() | Qt.ItemFlag.ItemIsUserCheckable)
                 item_ssid.setCheckState(Qt.CheckState.Unchecked)
-                item_ssid.setData(Qt.ItemDataRole.UserRole, bssid)
                 self.listSSID.addItem(item_ssid)
+                self.network_items[text] = item_ssid
+                bssids = self.network_bssids[text] = set()
+            if bssid not in bssids:
+                bssids.add(bssid)
+                grown.add(text)
+
+        for text in grown:
+            bssid_list = sorted(self.network_bssids[text], key=str)
+            self.network_items[text].setData(Qt.ItemDataRole.UserRole, bssid_list)
 
         self.listSSID.blockSignals(False)
 
+        for text in grown:
+            if self.network_items[text].checkState() == Qt.CheckState.Checked:
+                self.network_grown(text)
+
+    def network_grown(self, key):
+        if self.heatmap_mode is not None:
+            added = set(self.network_items[key].data(Qt.ItemDataRole.UserRole)) - set(self.composite_bssids)
+            if any(self.scan_results.bssid_count(bssid) for bssid in added):
+                self.plot_checked_heatmaps()
+            return
+        bssid_list = self.network_items[key].data(Qt.ItemDataRole.UserRole)
+        added = set(bssid_list) - self.heatmap_bssids.get(key, set())
+        self.heatmap_bssids[key] = set(bssid_list)
+        # BSSIDs without samples yet do not change the heatmap, live updates pick up their samples later
+        if any(self.scan_results.bssid_count(bssid) for bssid in added):
+            self.live_heatmaps.pop(key, None)
+            self.plot_wifi_heatmap_griddata(bssid_list=bssid_list, key=key)
+
+    def clear_network_list(self):
+        self.queued_heatmaps.clear()
+        self.listSSID.clear()
+        self.network_items.clear()
+        self.network_bssids.clear()
+
     def convert_frequency(self, frequency:str):
-        freq = float(frequency)
-        if 2.400 <= freq <= 2.500:
-            return "2.4 GHz"
-        elif 5.000 <= freq < 6.000:
-            return "5 GHz"
-        elif 6.000 <= freq < 7.000:
-            return "6 GHz"
-        else:
-            return "Unknown"
+        return heatmap_engine.convert_frequency(frequency)
 
     def is_click_within_bounds(self, x_pos, y_pos):
         if (0 > x_pos or x_pos >= self.image_width_pixels) or (0 > y_pos or y_pos >= self.image_height_pixels):
@@ -503,24 +893,21 @@ class MainWindow(uiclass, baseclass):
         return True
     
     def remove_ui_markers(self):
-        for marker in self.map_ui_markers:
-            self.graphWidget.removeItem(marker)
+        self.survey_points.setVisible(False)
 
     def clear_ui_markers(self):
-        for marker in self.map_ui_markers:
-            self.graphWidget.removeItem(marker)
-        self.map_ui_markers.clear()
+        self.survey_points.clear()
+        self.survey_points.setVisible(True)
 
     def show_ui_markers(self):
-        for marker in self.map_ui_markers:
-            if marker.scene() is None:
-                self.graphWidget.addItem(marker)
+        self.survey_points.setVisible(True)
 
 
     def remove_ap_markers(self):
         for ap_marker in self.ap_markers:
             self.graphWidget.removeItem(ap_marker)
         self.ap_markers.clear()
+        self.ap_positions.clear()
 
     def remove_map_scale_markers(self):
         for marker in self.map_scale_markers:
@@ -574,109 +961,383 @@ class MainWindow(uiclass, baseclass):
         self.actionSaveProject.setEnabled(True)
         self.actionOpenProject.setEnabled(True)
 
-# https://docs.scipy.org/doc/scipy/reference/generated/scipy.interpolate.griddata.html
     def plot_wifi_heatmap_griddata(self, bssid_list, key):
         #self.remove_ui_markers()
         self.bannerFrame.hide()
         self.bannerLabel.setText(f"Yellow marker(s) show estimated access point locations and may not match the exact physical position")
         self.bannerFrame.show()
-        unique_bssid_results = []
+        X, Y, rssi_values = self.heatmap_input(bssid_list)
+        self.heatmap_bssids[key] = set(bssid_list)
 
-        grid_scale = 200
-        X_grid = np.linspace(0, self.image_width_pixels * self.scale, grid_scale)
-        Y_grid = np.linspace(0, self.image_height_pixels * self.scale, grid_scale)
-
-        X_grid, Y_grid = np.meshgrid(X_grid, Y_grid)
-
-
-        for result in self.scan_results:
-            if result.get('bssid') in bssid_list:
-                unique_bssid_results.append(result)
-
-        if not self.scan_results or len(unique_bssid_results) < 3:
+        if len(rssi_values) < heatmap_engine.MIN_SAMPLES:
             self.bannerLabel.setText(f"Not enough data to create heatmap for {key} network")
             self.bannerFrame.show()
             return
-        
-        best_rssi = unique_bssid_results[0]
 
-        for result in unique_bssid_results:
-            if int(result["rssi"]) > int(best_rssi["rssi"]):
-                best_rssi = result
-        ap_x = float(best_rssi["x"])
-        ap_y = float(best_rssi["y"])
-        
-        X = []
-        Y = []
-        X_m = []
-        Y_m = []
-        rssi_values = []
-        for result in unique_bssid_results:
-            x = float(result.get('x'))
-            y = float(result.get('y'))
-            rssi = int(result.get('rssi'))
-            scale = self.scale
-            X_meters = x * scale
-            Y_meters = y * scale
-
-            X.append(x)
-            Y.append(y)
-            X_m.append(X_meters)
-            Y_m.append(Y_meters)
-            rssi_values.append(rssi)
-        
-    # https://numpy.org/doc/stable/reference/generated/numpy.column_stack.html
-
-        grid_z0 = griddata(np.column_stack([X_m, Y_m]), rssi_values, (X_grid, Y_grid), method='nearest')
-
-        RSSI_MIN = -90
-        RSSI_MAX = -30
+        self.submit_heatmap(key, bssid_list, X, Y, rssi_values, ap=True)
+
+    def plot_composite_heatmap(self, bssid_list, markers=True):
+        # one heatmap of the strongest (or second strongest) BSSID per cell instead of a layer per network
+        if markers:
+            self.remove_ap_markers()
+        self.composite_bssids = bssid_list
+        X, Y, rssi_values, group = self.composite_input(bssid_list)
+        if not len(group) or np.bincount(group).max() < heatmap_engine.MIN_SAMPLES:
+            self.remove_heatmap(COMPOSITE_KEY)
+            if bssid_list:
+                self.bannerLabel.setText("Not enough data to create a composite heatmap")
+                self.bannerFrame.show()
+            return
+        self.submit_heatmap(COMPOSITE_KEY, bssid_list, X, Y, rssi_values, ap=markers, group=group)
 
-        grid_z0 = gaussian_filter(grid_z0, sigma=3) # https://docs.scipy.org/doc/scipy/reference/generated/scipy.ndimage.gaussian_filter.html
+    def plot_channel_layer(self, metric, band):
+        # the whole survey is analyzed on the heatmap worker, the grid and the channel summary of the
+        # band are cached per sample content and layer
+        if not self.scan_results or self.scale is None:
+            self.remove_heatmap(CHANNEL_KEY)
+            return
+        self.heatmap_levels[CHANNEL_KEY] = channel_plan.METRICS[metric][1]
+        mask = self.footprint_mask()
+        key = self.channel_planner.key(self.scan_results)
+        params = f"{self.interpolation}/{heatmap_engine.SIGMA}/channel/{'/'.join(map(str, key))}"
+        cache_key = make_key([metric, band], [], [], [], self.scale, heatmap_engine.GRID_SCALE, params, mask=mask)
+        grid_z0 = self.heatmap_cache.get(cache_key)
+        summary = self.heatmap_cache.get(cache_key + SUMMARY_SUFFIX)
+        if grid_z0 is not None and summary is not None:
+            self.cancel_heatmap(CHANNEL_KEY)
+            self.show_heatmap(CHANNEL_KEY, grid_z0)
+            self.show_channel_summary(band, summary)
+            return
+        previous = self.channel_layer_keys.get((metric, band))
+        if previous is not None and previous != cache_key:
+            self.heatmap_cache.discard(previous)
+            self.heatmap_cache.discard(previous + SUMMARY_SUFFIX)
+        self.channel_layer_keys[(metric, band)] = cache_key
+        self.pending_heatmaps[CHANNEL_KEY] = (cache_key, None)
+        self.heatmap_worker.submit(CHANNEL_KEY, self.channel_planner.compute_layer, key, self.scan_results.to_arrays(), metric, band,
+                                   self.image_width_pixels, self.image_height_pixels, self.scale, method=self.interpolation, mask=mask)
+        self.statusBar().showMessage(f"Computing {self.comboHeatmapMode.currentText()}")
+
+    def show_channel_summary(self, band, summary):
+        # summary from channel_plan.channel_summary
+        if not len(summary):
+            self.bannerLabel.setText(f"No {band} radios in the survey")
+        else:
+            self.bannerLabel.setText(f"{band} at {self.channel_planner.threshold} dBm, channel: radios / occupied locations - " +
+                                     ", ".join(f"{channel:g}: {radios:.0f} / {occupied:.0%}" for channel, radios, occupied in summary))
+        self.bannerFrame.show()
 
-        if key in self.heatmap_items:
-            self.graphWidget.removeItem(self.heatmap_items[key])
+    def submit_heatmap(self, key, bssid_list, X, Y, rssi_values, ap=False, group=None):
+        # with ap the access points of bssid_list are marked too, they are placed on the worker
+        # unless the locator already has them for this sample version
+        params = f"{self.interpolation}/{heatmap_engine.SIGMA}" if group is None else f"{self.interpolation}/{heatmap_engine.SIGMA}/{self.heatmap_mode}"
+        mask = self.footprint_mask()
+        cache_key = make_key(bssid_list, X, Y, rssi_values, self.scale, heatmap_engine.GRID_SCALE, params, group, mask)
+        ap_key = self.ap_locator.key(self.scan_results, self.scale) if ap else None
+        located = self.ap_locator.cached(ap_key) if ap else None
+        grid_z0 = self.heatmap_cache.get(cache_key)
+        if grid_z0 is not None:
+            self.cancel_heatmap(key)
+            self.show_heatmap(key, grid_z0)
+            if located is not None:
+                ap_x, ap_y, radius_m = select(located, bssid_list)
+                self.add_ap_marker(ap_x, ap_y, radius_m / self.scale)
+            elif ap:
+                # the heatmap is shown, only the access points are still to be placed
+                self.pending_heatmaps[key] = (None, True)
+                self.heatmap_worker.submit(key, locate_with, None, self.ap_locator, ap_key, self.scan_results.to_arrays(), bssid_list, self.scale)
+            return
 
+        if group is not None:
+            job = (heatmap_engine.compute_composite, X, Y, rssi_values, group, self.image_width_pixels, self.image_height_pixels, self.scale)
+            options = {"method": self.interpolation, "reduce": self.heatmap_mode, "mask": mask}
+        else:
+            job = (heatmap_engine.compute_heatmap, X, Y, rssi_values, self.image_width_pixels, self.image_height_pixels, self.scale)
+            options = {"method": self.interpolation, "mask": mask}
+        if ap:
+            job = (locate_with, job[0], self.ap_locator, ap_key, self.scan_results.to_arrays(), bssid_list, self.scale) + job[1:]
+        self.pending_heatmaps[key] = (cache_key, ap)
+        self.heatmap_worker.submit(key, *job, **options)
+        self.statusBar().showMessage(f"Computing heatmap for {key}")
+
+    def on_heatmap_ready(self, key, grid_z0):
+        pending = self.pending_heatmaps.pop(key, None)
+        if pending is None:
+            return
+        cache_key, ap = pending
+        if ap:
+            grid_z0, ap = grid_z0
+        elif key == CHANNEL_KEY:
+            grid_z0, summary = grid_z0
+        if cache_key is None:
+            # the heatmap came from the cache, the job only placed the access points
+            self.add_ap_marker(*ap)
+            return
+        if grid_z0 is None:
+            # a channel layer with fewer than MIN_SAMPLES survey locations
+            self.remove_heatmap(key)
+            return
+        self.heatmap_cache.put(cache_key, grid_z0)
+        self.show_heatmap(key, grid_z0)
+        if key == CHANNEL_KEY:
+            self.heatmap_cache.put(cache_key + SUMMARY_SUFFIX, summary)
+            if isinstance(self.heatmap_mode, tuple):
+                self.show_channel_summary(self.heatmap_mode[1], summary)
+        if ap:
+            self.add_ap_marker(*ap)
+        if not self.pending_heatmaps:
+            self.statusBar().clearMessage()
+
+    def on_heatmap_failed(self, key, error):
+        self.pending_heatmaps.pop(key, None)
+        self.statusBar().showMessage(f"Heatmap for {key} failed: {error}", 5000)
+
+    def cancel_heatmap(self, key):
+        self.heatmap_worker.cancel(key)
+        self.pending_heatmaps.pop(key, None)
+
+    def cancel_all_heatmaps(self):
+        self.heatmap_worker.cancel_all()
+        self.pending_heatmaps.clear()
+        for key in list(self.detail_items):
+            self.remove_detail(key)
+        self.detail_worker.cancel_all()
+        self.pending_details.clear()
+
+    def add_ap_marker(self, ap_x, ap_y, radius=None):
+        ap_marker = pg.ScatterPlotItem(
+            ap_x, ap_y,
+            symbol='o',
+            size=8,
+            pen=pg.mkPen(color='y', width=3),
+            brush=pg.mkBrush(color='y')
+        )
+        
+        self.graphWidget.addItem(ap_marker)
+        self.ap_markers.append(ap_marker)
+        self.ap_positions.append((ap_x, ap_y, np.zeros(len(ap_x)) if radius is None else radius))
+        if radius is not None:
+            # confidence circles, sized in floor plan pixels
+            confidence = pg.ScatterPlotItem(ap_x, ap_y, symbol='o', size=2 * np.asarray(radius), pxMode=False,
+                                            pen=pg.mkPen(color='y', width=1, style=Qt.PenStyle.DashLine), brush=pg.mkBrush(None))
+            self.graphWidget.addItem(confidence)
+            self.ap_markers.append(confidence)
+
+    def make_heatmap_item(self, grid_z0, rect, levels=(heatmap_engine.RSSI_MIN, heatmap_engine.RSSI_MAX)):
         heatmap_item = pg.ImageItem(grid_z0.transpose())
-        heatmap_item.setRect(pg.QtCore.QRectF(0, 0, self.image_width_pixels, self.image_height_pixels))
+        heatmap_item.setRect(rect)
 
-                
         cmap = pg.colormap.get("turbo")
         heatmap_item.setLookupTable(cmap.getLookupTable(0.0, 1.0, 256))
-        heatmap_item.setLevels((RSSI_MIN, RSSI_MAX))
+        heatmap_item.setLevels(levels)
         heatmap_item.setOpacity(0.5)
+        return heatmap_item
 
-        self.graphWidget.addItem(heatmap_item)
+    def show_heatmap(self, key, grid_z0):
+        RSSI_MIN = heatmap_engine.RSSI_MIN
+        RSSI_MAX = heatmap_engine.RSSI_MAX
+
+        if key in self.heatmap_items:
+            self.graphWidget.removeItem(self.heatmap_items[key])
+        self.remove_detail(key)
+
+        levels = self.heatmap_levels.get(key, (RSSI_MIN, RSSI_MAX))
+        with span("image_upload"):
+            heatmap_item = self.make_heatmap_item(grid_z0, pg.QtCore.QRectF(0, 0, self.image_width_pixels, self.image_height_pixels), levels)
+            self.graphWidget.addItem(heatmap_item)
         # https://pyqtgraph.readthedocs.io/en/pyqtgraph-0.13.0/colormap.html
 
+        if self.colorbar is not None and tuple(self.colorbar.levels()) != tuple(levels):
+            self.remove_colorbar()
         if self.colorbar is None:
-            self.colorbar = pg.ColorBarItem(values=(RSSI_MIN, RSSI_MAX), colorMap=cmap, interactive=False)
+            cmap = pg.colormap.get("turbo")
+            self.colorbar = pg.ColorBarItem(values=levels, colorMap=cmap, interactive=False)
             self.colorbar.setImageItem(heatmap_item, insert_in=self.graphWidget.getPlotItem())
 
-        ap_marker = pg.ScatterPlotItem(
-            [ap_x], [ap_y],
-            symbol='o',
-            size=8,
-            pen=pg.mkPen(color='y', width=3),
-            brush=pg.mkBrush(color='y')
-        )
-        
-        self.graphWidget.addItem(ap_marker)
-        self.ap_markers.append(ap_marker)
         self.heatmap_items[key] = heatmap_item
+        self.detail_timer.start()
+
+    def visible_region(self):
+        (vx0, vx1), (vy0, vy1) = self.graphWidget.getPlotItem().vb.viewRange()
+        x0, x1 = max(vx0, 0), min(vx1, self.image_width_pixels)
+        y0, y1 = max(vy0, 0), min(vy1, self.image_height_pixels)
+        if x1 <= x0 or y1 <= y0:
+            return None
+        return (x0, y0, x1, y1)
+
+    def update_floorplan_tiles(self):
+        if self.image_item is None:
+            return
+        vb = self.graphWidget.getPlotItem().vb
+        ratio = self.graphWidget.devicePixelRatioF()
+        self.floorplan.fit_viewport(vb.width() * ratio, vb.height() * ratio)
+        k, missing = self.image_item.update_tiles(self.visible_region(), max(vb.viewPixelSize()))
+        if missing:
+            self.tile_worker.submit("tiles", self.floorplan.load_tiles, k, missing)
+        else:
+            self.tile_worker.cancel("tiles")
 
-    def save_screenshot_dialog(self):
-        filename, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Save screenshot", QDir.currentPath(), "Image files (*.png *.jpg)")
-        if not filename:
+    def on_tiles_ready(self, key, tiles):
+        if self.image_item is not None:
+            self.image_item.add_tiles(tiles)
+
+    def on_view_changed(self, *args):
+        if self.image_item is not None:
+            self.floorplan_timer.start()
+        if not self.heatmap_items:
+            return
+        region = self.visible_region()
+        for key, (item, item_region, cell) in list(self.detail_items.items()):
+            if region is None or not (item_region[0] <= region[0] and item_region[1] <= region[1] and item_region[2] >= region[2] and item_region[3] >= region[3]):
+                self.remove_detail(key)
+        self.detail_timer.start()
+
+    def refine_visible_heatmaps(self):
+        region = self.visible_region()
+        if region is None or self.scale is None:
+            return
+        vb = self.graphWidget.getPlotItem().vb
+        (vx0, vx1), (vy0, vy1) = vb.viewRange()
+        x0, y0, x1, y1 = region
+        # the refined region gets a margin so small pans keep the detail heatmap
+        mx, my = (x1 - x0) * DETAIL_MARGIN, (y1 - y0) * DETAIL_MARGIN
+        padded = (max(x0 - mx, 0), max(y0 - my, 0), min(x1 + mx, self.image_width_pixels), min(y1 + my, self.image_height_pixels))
+        screen_x = vb.width() * (padded[2] - padded[0]) / (vx1 - vx0)
+        screen_y = vb.height() * (padded[3] - padded[1]) / (vy1 - vy0)
+        shape = (min(int(screen_x / DETAIL_PIXELS_PER_CELL), MAX_DETAIL_CELLS), min(int(screen_y / DETAIL_PIXELS_PER_CELL), MAX_DETAIL_CELLS))
+        coarse_x = heatmap_engine.GRID_SCALE * (padded[2] - padded[0]) / self.image_width_pixels
+        coarse_y = heatmap_engine.GRID_SCALE * (padded[3] - padded[1]) / self.image_height_pixels
+        if shape[0] < 1.5 * coarse_x and shape[1] < 1.5 * coarse_y:
+            # the full heatmap already has about one cell per screen pixel pair
+            for key in list(self.detail_items):
+                self.remove_detail(key)
             return
-        #exporter = ImageExporter(self.graphWidget.scene())
-        #exporter.export(filename)
-        pic = self.grab()
-        pic.save(filename)
 
+        cell = (padded[2] - padded[0]) / shape[0]
+        sigma = heatmap_engine.detail_sigma(self.image_width_pixels, self.image_height_pixels, padded, shape)
+        mask = None
+        if self.footprint_mask() is not None:
+            xs, ys, _, _ = heatmap_engine.region_axes(padded, shape, sigma, self.interpolation)
+            mask = self.footprint.sample(xs, ys)
+        for key, bssids in self.heatmap_bssids.items():
+            if key not in self.heatmap_items:
+                continue
+            detail = self.detail_items.get(key)
+            if detail is not None and detail[2] <= 1.25 * cell:
+                # the current detail heatmap covers the view (see on_view_changed) and is fine enough
+                continue
+            X, Y, rssi_values = self.heatmap_input(bssids)
+            self.pending_details[key] = (padded, cell)
+            self.detail_worker.submit(key, heatmap_engine.compute_heatmap_region, X, Y, rssi_values, self.scale, padded, shape, sigma=sigma, method=self.interpolation, mask=mask)
+
+    def on_detail_ready(self, key, grid_z0):
+        pending = self.pending_details.pop(key, None)
+        if pending is None or grid_z0 is None or key not in self.heatmap_items:
+            return
+        self.remove_detail(key)
+        region, cell = pending
+        x0, y0, x1, y1 = region
+        with span("image_upload", detail=True):
+            detail_item = self.make_heatmap_item(grid_z0, pg.QtCore.QRectF(x0, y0, x1 - x0, y1 - y0))
+            self.graphWidget.addItem(detail_item)
+        self.heatmap_items[key].setVisible(False)
+        self.detail_items[key] = (detail_item, region, cell)
+
+    def remove_detail(self, key):
+        self.detail_worker.cancel(key)
+        self.pending_details.pop(key, None)
+        detail = self.detail_items.pop(key, None)
+        if detail is None:
+            return
+        self.graphWidget.removeItem(detail[0])
+        if key in self.heatmap_items:
+            self.heatmap_items[key].setVisible(True)
 
+    def refresh_live_heatmaps(self, results):
+        x, y = self.scan_location
+        if isinstance(self.heatmap_mode, tuple):
+            self.plot_channel_layer(*self.heatmap_mode)
+        composite = set(self.composite_bssids)
+        if composite and any(r.get("bssid") in composite for r in results):
+            self.plot_composite_heatmap(self.composite_bssids, markers=False)
+        for key, bssids in self.heatmap_bssids.items():
+            rssi = [int(r["rssi"]) for r in results if r.get("bssid") in bssids]
+            if not rssi:
+                continue
+            if self.interpolation != "nearest" or self.aggregator.radius > 0:
+                # only nearest + blur of raw samples can be updated in place, anything else is recomputed on the worker
+                self.submit_heatmap(key, bssids, *self.heatmap_input(bssids))
+                continue
+            # the first live update seeds the incremental state from every sample, later ones only add the new click
+            heatmap = self.live_heatmaps.get(key)
+            if heatmap is None:
+                heatmap = heatmap_engine.IncrementalHeatmap(self.image_width_pixels, self.image_height_pixels, self.scale, mask=self.footprint_mask())
+                heatmap.reset(*self.scan_results.heatmap_input(bssids))
+                self.live_heatmaps[key] = heatmap
+            else:
+                heatmap.add_samples([x] * len(rssi), [y] * len(rssi), rssi)
+            if heatmap.grid is None:
+                continue
+            self.cancel_heatmap(key)
+            if key in self.heatmap_items:
+                with span("image_upload", live=True):
+                    self.heatmap_items[key].setImage(heatmap.grid.transpose(), autoLevels=False)
+                self.remove_detail(key)
+                self.detail_timer.start()
+            else:
+                self.show_heatmap(key, heatmap.grid)
+
+    def show_diagnostics(self):
+        if self.diagnostics is None:
+            self.diagnostics = DiagnosticsDialog(self)
+        self.diagnostics.show()
+        self.diagnostics.raise_()
 
-app = QApplication(sys.argv)
-window = MainWindow()
-window.show()
-app.exec()
+    def save_screenshot_dialog(self):
+        filename, filter = QtWidgets.QFileDialog.getSaveFileName(self, "Save screenshot", QDir.currentPath(),
+                                                                 "Report PNG (*.png);; Report TIFF (*.tif *.tiff);; Window screenshot (*.png *.jpg)")
+        if not filename:
+            return
+        if "Window" in filter:
+            pic = self.grab()
+            pic.save(filename)
+            return
+        if "TIFF" in filter and not filename.lower().endswith((".tif", ".tiff")):
+            filename += ".tif"
+        self.save_report(filename)
+
+    def save_report(self, filename, width=None, dpi=DEFAULT_DPI):
+        # rendered offscreen at the floor plan resolution on the io worker, independent of the window size
+        layers = [item.image.transpose() for item in self.heatmap_items.values()]
+        points = self.scan_results.locations() if self.survey_points.isVisible() else None
+        aps = None
+        if self.ap_positions:
+            aps = tuple(np.concatenate(column) for column in zip(*self.ap_positions))
+        title = self.comboHeatmapMode.currentText() if COMPOSITE_KEY in self.heatmap_items or CHANNEL_KEY in self.heatmap_items else ", ".join(self.heatmap_items)
+        colors = {"levels": self.heatmap_levels[CHANNEL_KEY], "unit": "radios"} if CHANNEL_KEY in self.heatmap_items else {}
+        self.io_paths["report"] = filename
+        self.show_progress("Rendering report")
+        self.io_worker.submit("report", render_report, filename, self.floorplan, self.image_width_pixels, self.image_height_pixels, layers,
+                              points=points, aps=aps, width=width, dpi=dpi, title=title or None, progress=self.io_worker.progress_callback("report"), **colors)
+
+
+if __name__ == "__main__":
+    # --replay plays back a recorded scan trace instead of running lswifi, --record saves one
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--replay", help="scan trace (JSON lines) or lswifi JSON export to replay")
+    parser.add_argument("--replay-speed", type=float, default=1.0)
+    parser.add_argument("--replay-loop", action="store_true")
+    parser.add_argument("--record", help="append every scan to this trace file")
+    parser.add_argument("--min-scan-interval", type=float, default=1.0, help="seconds between scan starts")
+    parser.add_argument("--scan-timeout", type=float, default=30.0, help="seconds before a scan is abandoned")
+    args, qt_args = parser.parse_known_args()
+
+    app = QApplication(sys.argv[:1] + qt_args)
+    if args.replay:
+        scanner = ReplayScanner(args.replay, speed=args.replay_speed, loop=args.replay_loop, record_path=args.record)
+    else:
+        scanner = LswifiScanner(Path(__file__).resolve().parent, record_path=args.record)
+    window = MainWindow(scanner, min_scan_interval=args.min_scan_interval, scan_timeout=args.scan_timeout)
+    window.resume_capture_journal()
+    window.show()
+    app.exec()
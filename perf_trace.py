@@ -0,0 +1,156 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+import numpy as np
+
+# Lightweight timing of the hot paths, cheap enough to stay on in the field. A span is a named
+# interval measured with time.perf_counter; the last ROLLING_WINDOW durations of every name feed
+# the percentiles of the diagnostics panel and the last MAX_EVENTS spans can be exported as JSON
+# or as a Chrome trace (chrome://tracing or https://ui.perfetto.dev).
+# Spans that start and end in different callbacks (a scan from spawn to finish) use begin/end.
+# https://docs.google.com/document/d/1CvAClvFfyA5R-PhYUmn5OOQtYMH4h6I0nSsKchNAySU
+# Qt-free, so heatmap_engine can record spans from worker threads and processes.
+
+ROLLING_WINDOW = 512
+MAX_EVENTS = 50_000
+PERCENTILES = (50, 90, 99)
+
+
+class Tracer:
+
+    def __init__(self, rolling_window=ROLLING_WINDOW, max_events=MAX_EVENTS):
+        self.enabled = True
+        self.rolling_window = rolling_window
+        self.origin = time.perf_counter()
+        self._durations = {}
+        self._events = deque(maxlen=max_events)
+        self._lock = threading.Lock()
+
+    def record(self, name, start, duration, args=None):
+        if not self.enabled:
+            return
+        thread = threading.current_thread()
+        with self._lock:
+            durations = self._durations.get(name)
+            if durations is None:
+                durations = self._durations[name] = deque(maxlen=self.rolling_window)
+            durations.append(duration)
+            self._events.append((name, start, duration, thread.ident, thread.name, args))
+
+    @contextmanager
+    def span(self, name, **args):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter() - start, args or None)
+
+    def begin(self, name, **args):
+        return (name, time.perf_counter(), args)
+
+    def end(self, token, **args):
+        if token is None:
+            return
+        name, start, begin_args = token
+        self.record(name, start, time.perf_counter() - start, {**begin_args, **args} or None)
+
+    def timed(self, name):
+        def decorate(fn):
+            @wraps(fn)
+            def wrapper(*a, **kw):
+                with self.span(name):
+                    return fn(*a, **kw)
+            return wrapper
+        return decorate
+
+    def reset(self):
+        with self._lock:
+            self._durations.clear()
+            self._events.clear()
+
+    def statistics(self):
+        # {name: {"count", "p50", "p90", "p99", "max", "total"}} over the rolling window, in milliseconds
+        with self._lock:
+            snapshot = {name: np.array(durations) for name, durations in self._durations.items()}
+        stats = {}
+        for name, durations in sorted(snapshot.items()):
+            if not len(durations):
+                continue
+            ms = durations * 1000
+            stats[name] = {"count": len(ms), **{f"p{p}": float(v) for p, v in zip(PERCENTILES, np.percentile(ms, PERCENTILES))},
+                           "max": float(ms.max()), "total": float(ms.sum())}
+        return stats
+
+    def events(self):
+        with self._lock:
+            return list(self._events)
+
+    def write_json(self, path):
+        events = [{"name": name, "start_ms": (start - self.origin) * 1000, "duration_ms": duration * 1000, "thread": thread_name,
+                   **({"args": args} if args else {})}
+                  for name, start, duration, _, thread_name, args in self.events()]
+        with open(path, "w") as f:
+            json.dump({"statistics": self.statistics(), "events": events}, f, indent=1)
+
+    def write_chrome_trace(self, path):
+        # complete ("X") events with microsecond timestamps plus the thread names as metadata
+        pid = os.getpid()
+        trace = []
+        threads = {}
+        for name, start, duration, tid, thread_name, args in self.events():
+            threads[tid] = thread_name
+            event = {"name": name, "ph": "X", "ts": (start - self.origin) * 1e6, "dur": duration * 1e6, "pid": pid, "tid": tid}
+            if args:
+                event["args"] = args
+            trace.append(event)
+        trace += [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": thread_name}} for tid, thread_name in threads.items()]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f)
+
+
+class Profiler:
+    # opt-in cProfile capture, it only sees the thread that started it (the GUI thread)
+
+    def __init__(self):
+        self._profile = None
+        self.last = None
+
+    def is_running(self):
+        return self._profile is not None
+
+    def start(self):
+        if self._profile is None:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+    def stop(self):
+        if self._profile is None:
+            return None
+        self._profile.disable()
+        self.last, self._profile = self._profile, None
+        return self.last
+
+    def summary(self, limit=30, sort="cumulative"):
+        if self.last is None:
+            return ""
+        out = io.StringIO()
+        pstats.Stats(self.last, stream=out).sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+    def dump(self, path):
+        # .prof file for snakeviz, pstats or gprof2dot
+        if self.last is not None:
+            self.last.dump_stats(path)
+
+
+TRACER = Tracer()
+span = TRACER.span
+timed = TRACER.timed
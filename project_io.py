@@ -0,0 +1,90 @@
+import io
+import json
+from zipfile import ZipFile, ZIP_DEFLATED, ZIP_STORED
+
+import numpy as np
+from PIL import Image
+
+from csv_stream import import_stream
+from footprint import FOOTPRINT_MEMBER
+from heatmap_cache import CACHE_MEMBER
+from sample_store import SampleStore
+
+# Reads .wht projects straight from the archive, without extracting into the working directory.
+# v1: project.json, scan_results.csv and floorplan.png.
+# v2: project.json ("format": 2), samples.npz with the SampleStore columns, the floor plan in
+# its original encoding and optionally heatmaps.npz and the footprint mask as footprint.png. The .npz and image members are already
+# compressed, so they are stored as is and only project.json is deflated.
+
+FORMAT_VERSION = 2
+SAMPLES_MEMBER = "samples.npz"
+IMAGE_SUFFIXES = {"JPEG": ".jpg", "TIFF": ".tif"}
+
+
+def read_project(path, progress=None):
+    # progress(done, total) follows the scan_results.csv import of v1 projects
+    with ZipFile(path, "r") as zipref:
+        project = json.loads(zipref.read("project.json"))
+        image_file = project.get("image_file", "floorplan.png")
+        project["image_bytes"] = zipref.read(image_file)
+        store = SampleStore()
+        if project.get("format", 1) >= 2:
+            with np.load(io.BytesIO(zipref.read(project.get("samples", SAMPLES_MEMBER)))) as arrays:
+                store.load_arrays(arrays)
+        else:
+            with zipref.open("scan_results.csv") as f:
+                import_stream(f, zipref.getinfo("scan_results.csv").file_size, store, progress)
+        if project.get("heatmap_cache"):
+            project["heatmap_cache_bytes"] = zipref.read(project["heatmap_cache"])
+        if project.get("footprint"):
+            project["footprint_bytes"] = zipref.read(project["footprint"])
+    project["image"] = Image.open(io.BytesIO(project["image_bytes"]))
+    project["store"] = store
+    return project
+
+
+def image_file_name(image_bytes):
+    image_format = Image.open(io.BytesIO(image_bytes)).format or "PNG"
+    return "floorplan" + IMAGE_SUFFIXES.get(image_format, "." + image_format.lower())
+
+
+def write_project(path, samples, image, scale, ui_markers_visible=True, interpolation=None, heatmap_cache=None, aggregation=None,
+                  footprint=None, footprint_enabled=True):
+    # samples is a SampleStore or an iterable of CSV_HEADERS rows, image a PIL image or the
+    # encoded file bytes, heatmap_cache the HeatmapCache.to_bytes() of the cached grids,
+    # aggregation the {"radius": metres, "reduce": "median" | "mean"} sample merging settings and
+    # footprint the Footprint.to_png() mask, applied to heatmaps when footprint_enabled
+    if not isinstance(samples, SampleStore):
+        store = SampleStore()
+        store.extend(samples)
+        samples = store
+    if isinstance(image, Image.Image):
+        png = io.BytesIO()
+        image.save(png, "PNG")
+        image = png.getvalue()
+    arrays = io.BytesIO()
+    np.savez_compressed(arrays, **samples.to_arrays())
+
+    data = {
+        "format": FORMAT_VERSION,
+        "scale": float(scale),
+        "image_file": image_file_name(image),
+        "samples": SAMPLES_MEMBER,
+        "ui_markers_visible": ui_markers_visible
+    }
+    if interpolation:
+        data["interpolation"] = interpolation
+    if aggregation is not None:
+        data["aggregation"] = aggregation
+    with ZipFile(path, "w", ZIP_DEFLATED) as zipref:
+        zipref.writestr(SAMPLES_MEMBER, arrays.getvalue(), compress_type=ZIP_STORED)
+        zipref.writestr(data["image_file"], image, compress_type=ZIP_STORED)
+        if heatmap_cache:
+            data["heatmap_cache"] = CACHE_MEMBER
+            zipref.writestr(data["heatmap_cache"], heatmap_cache, compress_type=ZIP_STORED)
+        if footprint:
+            data["footprint"] = FOOTPRINT_MEMBER
+            data["footprint_enabled"] = footprint_enabled
+            zipref.writestr(data["footprint"], footprint, compress_type=ZIP_STORED)
+        zipref.writestr("project.json", json.dumps(data))
+
@@ -0,0 +1,273 @@
+import struct
+import zlib
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+from scipy.ndimage import map_coordinates
+
+import heatmap_engine
+
+# Offscreen report images: floor plan, heatmap layers (turbo, RSSI_MIN..RSSI_MAX or the levels of
+# a channel plan layer), survey points,
+# access point markers with confidence circles, a colorbar and a title, at any size and DPI.
+# The image is composed with NumPy and PIL in horizontal stripes of STRIPE_ROWS rows that are
+# written out as soon as they are done, PNG as a stream of IDAT chunks and TIFF as deflate
+# compressed strips, so a poster needs the decoded floor plan plus one stripe, never the canvas.
+# Marker sizes and fonts are given in points and scale with the DPI.
+# https://www.w3.org/TR/png/#5Chunk-layout
+# https://www.itu.int/itudoc/itu-t/com16/tiff-fx/docs/tiff6.pdf
+
+STRIPE_ROWS = 256
+DEFAULT_DPI = 150
+OPACITY = 0.5
+POINT_RADIUS_PT = 2.5
+AP_RADIUS_PT = 4.0
+LINE_PT = 0.75
+FONT_PT = 10
+TITLE_PT = 14
+# about this many labelled ticks, whole numbers
+COLORBAR_TICKS = 6
+RSSI_LEVELS = (heatmap_engine.RSSI_MIN, heatmap_engine.RSSI_MAX)
+BACKGROUND = (255, 255, 255)
+
+
+def points_to_pixels(points, dpi):
+    return points * dpi / 72.0
+
+
+def font(points, dpi):
+    return ImageFont.load_default(size=max(points_to_pixels(points, dpi), 6))
+
+
+class PngStripeWriter:
+    # RGB PNG written row stripe by row stripe, every row uses the Up filter
+
+    def __init__(self, f, width, height, dpi=DEFAULT_DPI):
+        self.f = f
+        self.width = width
+        self._compressor = zlib.compressobj(6)
+        self._previous = np.zeros(width * 3, dtype=np.uint8)
+        f.write(b"\x89PNG\r\n\x1a\n")
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        per_metre = round(dpi / 0.0254)
+        self._chunk(b"pHYs", struct.pack(">IIB", per_metre, per_metre, 1))
+
+    def _chunk(self, kind, data):
+        self.f.write(struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data)))
+
+    def write(self, rows):
+        rows = rows.reshape(len(rows), -1)
+        up = rows - np.vstack([self._previous[None], rows[:-1]])
+        self._previous = rows[-1].copy()
+        filtered = np.empty((len(rows), rows.shape[1] + 1), dtype=np.uint8)
+        filtered[:, 0] = 2
+        filtered[:, 1:] = up
+        data = self._compressor.compress(filtered.tobytes())
+        if data:
+            self._chunk(b"IDAT", data)
+
+    def close(self):
+        self._chunk(b"IDAT", self._compressor.flush())
+        self._chunk(b"IEND", b"")
+
+
+class TiffStripeWriter:
+    # RGB baseline TIFF, one deflate compressed strip per stripe, the IFD is written last
+
+    def __init__(self, f, width, height, rows_per_strip, dpi=DEFAULT_DPI):
+        self.f = f
+        self.width = width
+        self.height = height
+        self.rows_per_strip = rows_per_strip
+        self.dpi = dpi
+        self._offsets = []
+        self._counts = []
+        f.write(b"II*\x00\x00\x00\x00\x00")
+
+    def write(self, rows):
+        data = zlib.compress(np.ascontiguousarray(rows).tobytes(), 6)
+        self._offsets.append(self.f.tell())
+        self._counts.append(len(data))
+        self.f.write(data)
+
+    def close(self):
+        if self.f.tell() >= 2 ** 32:
+            raise ValueError("TIFF output over 4 GB, use a smaller size or PNG")
+        extra = bytearray()
+        base = self.f.tell()
+
+        def array(fmt, values):
+            offset = base + len(extra)
+            extra.extend(struct.pack(f"<{len(values)}{fmt}", *values))
+            if len(extra) % 2:
+                extra.append(0)
+            return offset
+
+        dpi = (round(self.dpi * 100), 100)
+        strips = len(self._offsets)
+        # entries (tag, type, count, value or offset), type 3 SHORT, 4 LONG, 5 RATIONAL
+        entries = [
+            (256, 4, 1, self.width),
+            (257, 4, 1, self.height),
+            (258, 3, 3, array("H", [8, 8, 8])),
+            (259, 3, 1, 8),
+            (262, 3, 1, 2),
+            (273, 4, strips, self._offsets[0] if strips == 1 else array("I", self._offsets)),
+            (277, 3, 1, 3),
+            (278, 4, 1, self.rows_per_strip),
+            (279, 4, strips, self._counts[0] if strips == 1 else array("I", self._counts)),
+            (282, 5, 1, array("I", dpi)),
+            (283, 5, 1, array("I", dpi)),
+            (284, 3, 1, 1),
+            (296, 3, 1, 2),
+        ]
+        ifd_offset = base + len(extra)
+        self.f.write(bytes(extra))
+        self.f.write(struct.pack("<H", len(entries)))
+        for tag, kind, count, value in entries:
+            packed = struct.pack("<H", value) + b"\x00\x00" if kind == 3 and count == 1 else struct.pack("<I", value)
+            self.f.write(struct.pack("<HHI", tag, kind, count) + packed)
+        self.f.write(struct.pack("<I", 0))
+        self.f.seek(4)
+        self.f.write(struct.pack("<I", ifd_offset))
+
+
+class ReportLayout:
+    # output pixel geometry: title band on top, floor plan below it, colorbar on the right
+
+    def __init__(self, plan_width, plan_height, width=None, dpi=DEFAULT_DPI, title=None):
+        self.dpi = dpi
+        self.plan_out_width = int(width or plan_width)
+        self.plan_out_height = max(1, round(self.plan_out_width * plan_height / plan_width))
+        self.zoom = self.plan_out_width / plan_width
+        self.title = title
+        self.title_height = round(points_to_pixels(TITLE_PT * 2.2, dpi)) if title else 0
+        self.colorbar_width = round(points_to_pixels(72, dpi))
+        self.width = self.plan_out_width + self.colorbar_width
+        self.height = self.title_height + self.plan_out_height
+
+
+def plan_source(floorplan, layout):
+    # the coarsest pyramid level that still has at least one pixel per output pixel
+    source = floorplan
+    if hasattr(floorplan, "level_for"):
+        source = floorplan.level(floorplan.level_for(1 / layout.zoom))
+    if source.mode not in ("L", "RGB"):
+        source = source.convert("RGB")
+    return source
+
+
+def plan_stripe(source, layout, top, bottom):
+    # plan rows top..bottom (output pixels, within the plan area) as an RGB array
+    sx = source.width / layout.plan_out_width
+    sy = source.height / layout.plan_out_height
+    box = (0, top * sy, source.width, bottom * sy)
+    resample = Image.Resampling.BILINEAR if sx <= 1 else Image.Resampling.BOX
+    return np.asarray(source.resize((layout.plan_out_width, bottom - top), resample, box=box).convert("RGB"))
+
+
+def blend_layers(rgb, layers, layout, top, bottom, opacity=OPACITY, levels=RSSI_LEVELS):
+    # each grid is sampled bilinearly at the output pixel centres, grid row 0 is the bottom of the plan
+    rows = (np.arange(top, bottom) + 0.5) / layout.plan_out_height
+    cols = (np.arange(layout.plan_out_width) + 0.5) / layout.plan_out_width
+    out = rgb.astype(np.float32)
+    for grid in layers:
+        grid = np.asarray(grid, dtype=float)
+        n_rows, n_cols = grid.shape
+        r, c = np.meshgrid((1 - rows) * (n_rows - 1), cols * (n_cols - 1), indexing="ij")
+        values = map_coordinates(grid, [r, c], order=1, mode="nearest", cval=np.nan)
+        rgba = heatmap_engine.colorize(values, levels)
+        alpha = rgba[..., 3:4].astype(np.float32) / 255 * opacity
+        out = out * (1 - alpha) + rgba[..., :3] * alpha
+    return out.round().astype(np.uint8)
+
+
+def draw_markers(draw, layout, top, bottom, plan_height, points, aps):
+    # top/bottom are canvas rows of the stripe, markers outside it are skipped
+    def to_canvas(x, y):
+        return np.asarray(x, dtype=float) * layout.zoom, layout.title_height + (plan_height - np.asarray(y, dtype=float)) * layout.zoom - top
+
+    line = max(1, round(points_to_pixels(LINE_PT, layout.dpi)))
+    if points is not None and len(points[0]):
+        radius = points_to_pixels(POINT_RADIUS_PT, layout.dpi)
+        xs, ys = to_canvas(*points)
+        inside = (ys >= -radius) & (ys <= bottom - top + radius)
+        for x, y in zip(xs[inside], ys[inside]):
+            draw.ellipse([x - radius, y - radius, x + radius, y + radius], fill=(255, 0, 0), outline=(120, 0, 0))
+    if aps is not None and len(aps[0]):
+        radius = points_to_pixels(AP_RADIUS_PT, layout.dpi)
+        xs, ys = to_canvas(aps[0], aps[1])
+        confidence = np.asarray(aps[2], dtype=float) * layout.zoom if len(aps) > 2 else np.zeros(len(xs))
+        for x, y, c in zip(xs, ys, confidence):
+            reach = max(radius, c)
+            if y + reach < 0 or y - reach > bottom - top:
+                continue
+            if c > radius:
+                draw.ellipse([x - c, y - c, x + c, y + c], outline=(255, 200, 0), width=line)
+            draw.ellipse([x - radius, y - radius, x + radius, y + radius], fill=(255, 230, 0), outline=(0, 0, 0), width=line)
+
+
+def colorbar_stripe(layout, top, bottom, levels=RSSI_LEVELS):
+    # the colorbar column for canvas rows top..bottom, bar from 10 % to 90 % of the plan height
+    width = layout.colorbar_width
+    column = np.full((bottom - top, width, 3), BACKGROUND, dtype=np.uint8)
+    bar_top = layout.title_height + round(layout.plan_out_height * 0.1)
+    bar_bottom = layout.title_height + round(layout.plan_out_height * 0.9)
+    bar_left, bar_right = round(width * 0.1), round(width * 0.35)
+    rows = np.arange(max(top, bar_top), min(bottom, bar_bottom))
+    if len(rows):
+        t = (rows - bar_top) / max(bar_bottom - bar_top - 1, 1)
+        low, high = levels
+        values = high - t * (high - low)
+        column[rows - top, bar_left:bar_right] = heatmap_engine.colorize(values, levels)[:, None, :3]
+    return column, (bar_top, bar_bottom, bar_right)
+
+
+def draw_colorbar_labels(draw, layout, top, bar, levels=RSSI_LEVELS, unit="dBm"):
+    bar_top, bar_bottom, bar_right = bar
+    x0 = layout.plan_out_width
+    label_font = font(FONT_PT, layout.dpi)
+    tick = round(points_to_pixels(4, layout.dpi))
+    line = max(1, round(points_to_pixels(LINE_PT, layout.dpi)))
+    low, high = levels
+    for value in range(low, high + 1, max(1, round((high - low) / COLORBAR_TICKS))):
+        t = (high - value) / (high - low)
+        y = bar_top + t * (bar_bottom - bar_top - 1) - top
+        draw.line([x0 + bar_right, y, x0 + bar_right + tick, y], fill=(0, 0, 0), width=line)
+        draw.text((x0 + bar_right + tick * 1.5, y), f"{value}", fill=(0, 0, 0), font=label_font, anchor="lm")
+    draw.text((x0 + layout.colorbar_width / 2, bar_bottom + tick * 2 - top), unit, fill=(0, 0, 0), font=label_font, anchor="mt")
+
+
+def render_report(path, floorplan, plan_width, plan_height, layers=(), points=None, aps=None, width=None, dpi=DEFAULT_DPI,
+                  title=None, opacity=OPACITY, progress=None, stripe_rows=STRIPE_ROWS, levels=RSSI_LEVELS, unit="dBm"):
+    # floorplan is a PIL image or a FloorplanPyramid, layers heatmap grids, points (x, y) and
+    # aps (x, y[, radius]) in floor plan pixels with y up, like the samples. .tif/.tiff -> TIFF, else PNG.
+    # levels is the value range of the colormap and unit the caption under the colorbar.
+    layout = ReportLayout(plan_width, plan_height, width, dpi, title)
+    tiff = str(path).lower().endswith((".tif", ".tiff"))
+    title_font = font(TITLE_PT, dpi) if title else None
+    source = plan_source(floorplan, layout)
+    with open(path, "wb") as f:
+        writer = TiffStripeWriter(f, layout.width, layout.height, stripe_rows, dpi) if tiff else PngStripeWriter(f, layout.width, layout.height, dpi)
+        for top in range(0, layout.height, stripe_rows):
+            bottom = min(top + stripe_rows, layout.height)
+            canvas = np.empty((bottom - top, layout.width, 3), dtype=np.uint8)
+            canvas[:] = BACKGROUND
+            plan_top, plan_bottom = max(top, layout.title_height) - layout.title_height, bottom - layout.title_height
+            if plan_bottom > plan_top:
+                rgb = plan_stripe(source, layout, plan_top, plan_bottom)
+                rgb = blend_layers(rgb, layers, layout, plan_top, plan_bottom, opacity, levels)
+                canvas[plan_top + layout.title_height - top:, :layout.plan_out_width] = rgb
+            column, bar = colorbar_stripe(layout, top, bottom, levels)
+            canvas[:, layout.plan_out_width:] = column
+            image = Image.fromarray(canvas, "RGB")
+            draw = ImageDraw.Draw(image)
+            draw_markers(draw, layout, top, bottom, plan_height, points, aps)
+            draw_colorbar_labels(draw, layout, top, bar, levels, unit)
+            if title and top < layout.title_height:
+                draw.text((points_to_pixels(TITLE_PT, dpi), layout.title_height / 2 - top), title, fill=(0, 0, 0), font=title_font, anchor="lm")
+            writer.write(np.asarray(image))
+            if progress is not None:
+                progress(bottom, layout.height)
+        writer.close()
+    return layout.width, layout.height
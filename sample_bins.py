@@ -0,0 +1,127 @@
+import numpy as np
+
+# Spatial aggregation of repeated samples before interpolation. Standing still for a few scans
+# or revisiting a spot gives many almost coincident samples with noisy RSSI, griddata then gets
+# a cloud of conflicting points. Samples are binned per BSSID into square cells of 2 * radius
+# metres, each bin becomes one point at the centroid of its samples with the median (or mean)
+# RSSI. The count, sum and sum of squares per bin are kept as well, so the variance is available
+# (the survey point tooltip shows it). The bins are built once and then only updated with the rows
+# appended since the last call. For the median the RSSI values of every bin are kept sorted per
+# bin, so a click only touches the bins its rows fall into. Clearing or reloading the store
+# (a new SampleStore.generation) or a different scale or radius rebuilds them.
+# Merging is off by default (radius 0): the live heatmap can only add raw samples in place
+# (IncrementalHeatmap), a merged bin that moves or changes its value needs a full recompute.
+
+DEFAULT_RADIUS = 0.0
+REDUCERS = ("median", "mean")
+CELL_BITS = 21
+
+
+class SampleAggregator:
+
+    def __init__(self, radius=DEFAULT_RADIUS, reduce="median"):
+        if reduce not in REDUCERS:
+            raise ValueError(f"unknown reducer {reduce!r}, expected one of {REDUCERS}")
+        self.radius = radius
+        self.reduce = reduce
+        self._state = None
+        self._reset(None, None)
+
+    def _reset(self, generation, scale):
+        self._state = (generation, scale, self.radius, self.reduce)
+        self._done = 0
+        self._values = {}
+        self.keys = np.empty(0, dtype=np.int64)
+        self.count = np.empty(0)
+        self.total = np.empty(0)
+        self.squares = np.empty(0)
+        self.sum_x = np.empty(0)
+        self.sum_y = np.empty(0)
+        self.value = np.empty(0)
+
+    def configure(self, radius=None, reduce=None):
+        if reduce is not None and reduce not in REDUCERS:
+            raise ValueError(f"unknown reducer {reduce!r}, expected one of {REDUCERS}")
+        self.radius = self.radius if radius is None else radius
+        self.reduce = self.reduce if reduce is None else reduce
+
+    def update(self, store, scale):
+        if self._state != (store.generation, scale, self.radius, self.reduce):
+            self._reset(store.generation, scale)
+        n = len(store)
+        if n <= self._done:
+            return 0
+        start = self._done
+        x, y, rssi = store.x[start:n], store.y[start:n], store.rssi[start:n].astype(float)
+        keys = self._bin_keys(store, scale, slice(start, n))
+
+        new_keys, inverse = np.unique(keys, return_inverse=True)
+        # bins that do not exist yet are inserted in key order, existing ones are added to in place
+        at = np.searchsorted(self.keys, new_keys)
+        added = np.ones(len(new_keys), dtype=bool)
+        if len(self.keys):
+            added = self.keys[np.minimum(at, len(self.keys) - 1)] != new_keys
+        insert_at = at[added]
+        merged = np.insert(self.keys, insert_at, new_keys[added])
+        new = np.searchsorted(merged, new_keys)
+        columns = []
+        for current, values in ((self.count, None), (self.total, rssi), (self.squares, rssi * rssi), (self.sum_x, x), (self.sum_y, y)):
+            column = np.insert(current, insert_at, 0.0)
+            column[new] += np.bincount(inverse, weights=values, minlength=len(new_keys))
+            columns.append(column)
+        self.count, self.total, self.squares, self.sum_x, self.sum_y = columns
+        value = np.insert(self.value, insert_at, 0.0)
+        self.keys = merged
+        if self.reduce == "mean":
+            self.value = self.total / self.count
+        else:
+            value[new] = self._medians(new_keys, inverse, rssi)
+            self.value = value
+        self._done = n
+        return n - start
+
+    def _bin_keys(self, store, scale, rows):
+        cell = 2 * self.radius / scale
+        ix = np.clip(np.floor(store.x[rows] / cell), 0, 2 ** CELL_BITS - 1).astype(np.int64)
+        iy = np.clip(np.floor(store.y[rows] / cell), 0, 2 ** CELL_BITS - 1).astype(np.int64)
+        return (store.codes("bssid")[rows].astype(np.int64) << 2 * CELL_BITS) | (iy << CELL_BITS) | ix
+
+    def _medians(self, keys, inverse, rssi):
+        # median of every bin in keys (sorted) after adding the new rssi values, inverse maps them
+        # to keys. Bins that are new in this batch are done at once, existing ones one by one.
+        counts = np.bincount(inverse, minlength=len(keys))
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        values = rssi[np.lexsort((rssi, inverse))]
+        medians = (values[starts + (counts - 1) // 2] + values[starts + counts // 2]) / 2
+        groups = np.split(values, starts[1:])
+        for i, key in enumerate(keys.tolist()):
+            stored = self._values.get(key)
+            if stored is not None:
+                merged = np.sort(np.concatenate([stored, groups[i]]))
+                medians[i] = (merged[(len(merged) - 1) // 2] + merged[len(merged) // 2]) / 2
+                groups[i] = merged
+        self._values.update(zip(keys.tolist(), groups))
+        return medians
+
+    def _select(self, store, scale, bssids):
+        self.update(store, scale)
+        lookup = {bssid: code for code, bssid in enumerate(store.dictionary("bssid"))}
+        codes = np.array([lookup[b] for b in set(bssids) if b in lookup], dtype=np.int64)
+        return np.flatnonzero(np.isin(self.keys >> 2 * CELL_BITS, codes))
+
+    def heatmap_input(self, store, scale, bssids):
+        # like SampleStore.heatmap_input, one point per bin
+        i = self._select(store, scale, bssids)
+        return self.sum_x[i] / self.count[i], self.sum_y[i] / self.count[i], self.value[i]
+
+    def composite_input(self, store, scale, bssids):
+        i = self._select(store, scale, bssids)
+        _, group = np.unique(self.keys[i] >> 2 * CELL_BITS, return_inverse=True)
+        return self.sum_x[i] / self.count[i], self.sum_y[i] / self.count[i], self.value[i], group
+
+    def variance(self, store, scale, rows):
+        # (count, variance) of the bin each of the store rows falls into
+        self.update(store, scale)
+        i = np.searchsorted(self.keys, self._bin_keys(store, scale, rows))
+        mean = self.total[i] / self.count[i]
+        return self.count[i], np.maximum(self.squares[i] / self.count[i] - mean * mean, 0.0)
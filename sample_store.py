@@ -0,0 +1,328 @@
+import itertools
+
+import numpy as np
+
+from heatmap_engine import network_key
+
+CSV_HEADERS = ["x", "y", "timestamp", "interface_mac", "bssid", "channel_frequency", "channel_number", "channel_width", "phy_type", "rssi", "ssid"]
+
+# Columnar replacement for the old list-of-dicts scan_results.
+# x, y and rssi are kept as typed arrays, the rest are dictionary encoded (int32 codes
+# into a table of the original strings) so CSV export round-trips exactly and
+# numeric views such as channel_number are a single table lookup.
+# The sample columns are plain arrays unless a storage is set: storage.allocate(columns, size,
+# capacity) then returns them grown, CaptureJournal maps them from its file during a capture so
+# only the indexes and dictionaries stay in memory.
+FLOAT_COLUMNS = ("x", "y")
+INT_COLUMNS = ("rssi",)
+CODED_COLUMNS = ("timestamp", "interface_mac", "bssid", "channel_frequency", "channel_number", "channel_width", "phy_type", "ssid")
+# version changes on every modification and is unique across stores, so it can key derived caches,
+# generation only when the rows are replaced (clear, load_arrays), so caches can tell appends apart
+VERSIONS = itertools.count(1)
+
+
+def numeric_table(values):
+    # float of every dictionary value, NaN for values that are not numbers
+    table = np.empty(len(values), dtype=np.float64)
+    for code, value in enumerate(values):
+        try:
+            table[code] = float(value)
+        except ValueError:
+            table[code] = np.nan
+    return table
+
+
+class GrowableIndex:
+
+    def __init__(self, dtype=np.int64, array=None):
+        if array is None:
+            self.array = np.empty(8, dtype=dtype)
+            self.size = 0
+        else:
+            self.array = np.array(array, dtype=dtype)
+            self.size = len(self.array)
+
+    def append(self, value):
+        if self.size == len(self.array):
+            self.array = np.resize(self.array, 2 * len(self.array))
+        self.array[self.size] = value
+        self.size += 1
+
+    def extend(self, values):
+        if self.size + len(values) > len(self.array):
+            self.array = np.resize(self.array, max(2 * len(self.array), self.size + len(values)))
+        self.array[self.size:self.size + len(values)] = values
+        self.size += len(values)
+
+    def view(self):
+        return self.array[:self.size]
+
+
+class SampleStore:
+
+    def __init__(self):
+        self.storage = None
+        self.clear()
+
+    def clear(self):
+        self.storage = None
+        self._size = 0
+        self._capacity = 0
+        self._columns = {}
+        for name in FLOAT_COLUMNS:
+            self._columns[name] = np.empty(0, dtype=np.float64)
+        for name in INT_COLUMNS:
+            self._columns[name] = np.empty(0, dtype=np.int32)
+        for name in CODED_COLUMNS:
+            self._columns[name] = np.empty(0, dtype=np.int32)
+        self._values = {name: [] for name in CODED_COLUMNS}
+        self._lookup = {name: {} for name in CODED_COLUMNS}
+        self._numeric = {}
+        self._network_values = []
+        self._network_lookup = {}
+        self._network_of_pair = {}
+        self._network_column = np.empty(0, dtype=np.int32)
+        self.bssid_index = {}
+        self.network_index = {}
+        self.version = next(VERSIONS)
+        self.generation = self.version
+
+    def __len__(self):
+        return self._size
+
+    def __bool__(self):
+        return self._size > 0
+
+    def __iter__(self):
+        for i in range(self._size):
+            yield self.row(i)
+
+    def _reserve(self, extra):
+        needed = self._size + extra
+        if needed <= self._capacity:
+            return
+        self._relocate(max(needed, 2 * self._capacity, 64))
+
+    def set_storage(self, storage):
+        # moves the rows into storage, or back into memory for None
+        self.storage = storage
+        self._relocate(self._capacity)
+
+    def _relocate(self, capacity):
+        columns = self._columns
+        grown = self.storage.allocate(columns, self._size, capacity) if self.storage is not None else None
+        if grown is None:
+            grown = {}
+            for name, column in columns.items():
+                grown[name] = np.empty(capacity, dtype=column.dtype)
+                grown[name][:self._size] = column[:self._size]
+        self._columns = grown
+        grown = np.empty(capacity, dtype=np.int32)
+        grown[:self._size] = self._network_column[:self._size]
+        self._network_column = grown
+        self._capacity = capacity
+
+    def _encode(self, name, value):
+        value = "" if value is None else str(value)
+        lookup = self._lookup[name]
+        code = lookup.get(value)
+        if code is None:
+            code = len(self._values[name])
+            lookup[value] = code
+            self._values[name].append(value)
+            self._numeric.pop(name, None)
+        return code
+
+    def _network_code(self, ssid_code, freq_code):
+        pair = (ssid_code, freq_code)
+        code = self._network_of_pair.get(pair)
+        if code is None:
+            key = network_key(self._values["ssid"][ssid_code], self._values["channel_frequency"][freq_code])
+            code = self._network_lookup.get(key)
+            if code is None:
+                code = len(self._network_values)
+                self._network_lookup[key] = code
+                self._network_values.append(key)
+            self._network_of_pair[pair] = code
+        return code
+
+    def extend(self, rows):
+        rows = list(rows)
+        if not rows:
+            return
+        self._reserve(len(rows))
+        columns = self._columns
+        for r in rows:
+            i = self._size
+            columns["x"][i] = float(r.get("x"))
+            columns["y"][i] = float(r.get("y"))
+            columns["rssi"][i] = int(float(r.get("rssi")))
+            for name in CODED_COLUMNS:
+                columns[name][i] = self._encode(name, r.get(name))
+            bssid = self._values["bssid"][columns["bssid"][i]]
+            network = self._network_code(columns["ssid"][i], columns["channel_frequency"][i])
+            self._network_column[i] = network
+            self.bssid_index.setdefault(bssid, GrowableIndex()).append(i)
+            self.network_index.setdefault(self._network_values[network], GrowableIndex()).append(i)
+            self._size += 1
+        self.version = next(VERSIONS)
+
+    def extend_columns(self, x, y, rssi, coded):
+        # bulk counterpart of extend for a chunk of typed columns, coded maps column name -> strings
+        n = len(rssi)
+        if n == 0:
+            return
+        self._reserve(n)
+        start = self._size
+        self._columns["x"][start:start + n] = x
+        self._columns["y"][start:start + n] = y
+        self._columns["rssi"][start:start + n] = rssi
+        for name in CODED_COLUMNS:
+            values = coded.get(name) or [""] * n
+            lookup = self._lookup[name]
+            self._columns[name][start:start + n] = [lookup[v] if v in lookup else self._encode(name, v) for v in values]
+
+        ssid = self._columns["ssid"][start:start + n]
+        frequency = self._columns["channel_frequency"][start:start + n]
+        self._network_column[start:start + n] = self._network_codes_for(ssid, frequency)
+
+        bssids = self._values["bssid"]
+        for code, rows in self._groups(self._columns["bssid"][start:start + n]):
+            self.bssid_index.setdefault(bssids[code], GrowableIndex()).extend(rows + start)
+        for code, rows in self._groups(self._network_column[start:start + n]):
+            self.network_index.setdefault(self._network_values[code], GrowableIndex()).extend(rows + start)
+        self._size += n
+        self.version = next(VERSIONS)
+
+    def to_arrays(self):
+        # columnar form for .wht v2: typed x, y, rssi and code arrays plus one string table per coded column
+        arrays = {name: self._columns[name][:self._size] for name in FLOAT_COLUMNS + INT_COLUMNS + CODED_COLUMNS}
+        for name in CODED_COLUMNS:
+            arrays[f"{name}.values"] = np.array(self._values[name], dtype=str)
+        return arrays
+
+    def load_arrays(self, arrays):
+        # bulk counterpart of extend for to_arrays output, the indexes are built with one sort per column.
+        # The arrays are used as they are, a read-only mapping is replaced before the next append.
+        self.clear()
+        n = len(arrays["rssi"])
+        for name in FLOAT_COLUMNS:
+            self._columns[name] = np.asarray(arrays[name], dtype=np.float64)
+        for name in INT_COLUMNS + CODED_COLUMNS:
+            self._columns[name] = np.asarray(arrays[name], dtype=np.int32)
+        for name in CODED_COLUMNS:
+            self._values[name] = arrays[f"{name}.values"].tolist()
+            self._lookup[name] = {value: code for code, value in enumerate(self._values[name])}
+        self._size = self._capacity = n
+
+        self._network_column = self._network_codes_for(self._columns["ssid"], self._columns["channel_frequency"])
+
+        bssids = self._values["bssid"]
+        for code, rows in self._groups(self._columns["bssid"]):
+            self.bssid_index[bssids[code]] = GrowableIndex(array=rows)
+        for code, rows in self._groups(self._network_column):
+            self.network_index[self._network_values[code]] = GrowableIndex(array=rows)
+        self.version = next(VERSIONS)
+
+    def _network_codes_for(self, ssid, frequency):
+        # network code per row of the ssid and channel_frequency code arrays, new networks in order of first appearance
+        if len(ssid) == 0:
+            return np.empty(0, dtype=np.int32)
+        frequencies = np.int64(max(len(self._values["channel_frequency"]), 1))
+        pairs, first, inverse = np.unique(ssid * frequencies + frequency, return_index=True, return_inverse=True)
+        networks = np.empty(len(pairs), dtype=np.int32)
+        for k in np.argsort(first):
+            networks[k] = self._network_code(int(pairs[k] // frequencies), int(pairs[k] % frequencies))
+        return networks[inverse.reshape(-1)]
+
+    @staticmethod
+    def _groups(codes):
+        # (code, row numbers) per distinct code, in order of first appearance like extend builds them
+        if len(codes) == 0:
+            return []
+        order = np.argsort(codes, kind="stable")
+        unique, starts = np.unique(codes[order], return_index=True)
+        bounds = np.append(starts, len(codes))
+        groups = [(int(code), order[bounds[k]:bounds[k + 1]]) for k, code in enumerate(unique)]
+        groups.sort(key=lambda group: group[1][0])
+        return groups
+
+    @property
+    def x(self):
+        return self._columns["x"][:self._size]
+
+    @property
+    def y(self):
+        return self._columns["y"][:self._size]
+
+    @property
+    def rssi(self):
+        return self._columns["rssi"][:self._size]
+
+    def codes(self, name):
+        return self._columns[name][:self._size]
+
+    def dictionary(self, name):
+        return self._values[name]
+
+    def numeric(self, name):
+        # float view of a coded column, values that are not numbers become NaN
+        table = self._numeric.get(name)
+        if table is None:
+            table = self._numeric[name] = numeric_table(self._values[name])
+        return table[self.codes(name)]
+
+    def network_codes(self):
+        return self._network_column[:self._size]
+
+    def network_keys(self):
+        return list(self._network_values)
+
+    def bssids(self):
+        return list(self.bssid_index)
+
+    def bssid_count(self, bssid):
+        index = self.bssid_index.get(bssid)
+        return 0 if index is None else index.size
+
+    def rows_for_bssids(self, bssids):
+        parts = [self.bssid_index[b].view() for b in set(bssids) if b in self.bssid_index]
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        if len(parts) == 1:
+            return parts[0]
+        return np.sort(np.concatenate(parts))
+
+    def rows_for_network(self, key):
+        index = self.network_index.get(key)
+        if index is None:
+            return np.empty(0, dtype=np.int64)
+        return index.view()
+
+    def heatmap_input(self, bssids):
+        rows = self.rows_for_bssids(bssids)
+        return self.x[rows], self.y[rows], self.rssi[rows]
+
+    def composite_input(self, bssids):
+        # heatmap_input plus the BSSID of every row numbered from 0, for compute_composite
+        rows = self.rows_for_bssids(bssids)
+        _, group = np.unique(self.codes("bssid")[rows], return_inverse=True)
+        return self.x[rows], self.y[rows], self.rssi[rows], group
+
+    def locations(self):
+        if self._size == 0:
+            return np.empty(0), np.empty(0)
+        unique = np.unique(np.column_stack([self.x, self.y]), axis=0)
+        return unique[:, 0], unique[:, 1]
+
+    def rows_at(self, x, y):
+        return np.flatnonzero((self.x == x) & (self.y == y))
+
+    def row(self, i):
+        result = {"x": float(self._columns["x"][i]), "y": float(self._columns["y"][i]), "rssi": int(self._columns["rssi"][i])}
+        for name in CODED_COLUMNS:
+            result[name] = self._values[name][self._columns[name][i]]
+        return {key: result[key] for key in CSV_HEADERS}
+
+    def latest_by_bssid(self):
+        return [self.row(index.array[index.size - 1]) for bssid, index in self.bssid_index.items() if bssid]
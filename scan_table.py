@@ -0,0 +1,211 @@
+from PyQt6.QtCore import QAbstractTableModel, QModelIndex, QSortFilterProxyModel, Qt
+
+import heatmap_engine
+
+# Live scan table keyed by BSSID. Each scan is applied as a diff: new BSSIDs are inserted,
+# dataChanged is emitted only for the cells that changed and BSSIDs missing from more than
+# max_missed scans in a row are removed, so selection and scroll position survive a scan.
+# https://doc.qt.io/qt-6/qabstracttablemodel.html
+
+COLUMNS = [
+    # (header, scan_data field)
+    ("Name", "bssid"),
+    ("SSID", "ssid"),
+    ("Signal", "rssi"),
+    ("Freq", "channel_frequency"),
+    ("Ch", "channel_number"),
+    ("Ch Width (MHz)", "channel_width"),
+    ("Protocol", "phy_type"),
+    ("Time", "timestamp"),
+]
+NUMERIC_FIELDS = {"rssi", "channel_frequency", "channel_number", "channel_width"}
+SORT_ROLE = Qt.ItemDataRole.UserRole
+RSSI_COLUMN = 2
+
+
+def band_of(result):
+    try:
+        return heatmap_engine.convert_frequency(result.get("channel_frequency"))
+    except (TypeError, ValueError):
+        return "Unknown"
+
+
+def display_values(result):
+    values = [str(result.get(field, "")) for _, field in COLUMNS]
+    values[1] = str(result.get("ssid", "") or "hidden")
+    return tuple(values)
+
+
+def sort_value(field, text):
+    if field in NUMERIC_FIELDS:
+        try:
+            return float(text)
+        except ValueError:
+            return float("-inf")
+    return text
+
+
+class ScanTableModel(QAbstractTableModel):
+
+    def __init__(self, parent=None, max_missed=2):
+        super().__init__(parent)
+        self.max_missed = max_missed
+        self._bssids = []
+        self._values = []
+        self._bands = []
+        self._missed = []
+        self._rows = {}
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._bssids)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return COLUMNS[section][0]
+        return None
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        text = self._values[index.row()][index.column()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return text
+        if role == SORT_ROLE:
+            return sort_value(COLUMNS[index.column()][1], text)
+        return None
+
+    def bssid(self, row):
+        return self._bssids[row]
+
+    def band(self, row):
+        return self._bands[row]
+
+    def rssi(self, row):
+        return sort_value("rssi", self._values[row][RSSI_COLUMN])
+
+    def row_of(self, bssid):
+        return self._rows.get(bssid)
+
+    def clear(self):
+        self.beginResetModel()
+        self._bssids.clear()
+        self._values.clear()
+        self._bands.clear()
+        self._missed.clear()
+        self._rows.clear()
+        self.endResetModel()
+
+    def reset(self, results):
+        self.beginResetModel()
+        self._bssids.clear()
+        self._values.clear()
+        self._bands.clear()
+        self._missed.clear()
+        self._rows.clear()
+        for result in results:
+            self._append(result)
+        self.endResetModel()
+
+    def _append(self, result):
+        if not isinstance(result, dict) or not result.get("bssid") or result["bssid"] in self._rows:
+            return False
+        bssid = result["bssid"]
+        self._rows[bssid] = len(self._bssids)
+        self._bssids.append(bssid)
+        self._values.append(display_values(result))
+        self._bands.append(band_of(result))
+        self._missed.append(0)
+        return True
+
+    def apply_scan(self, results):
+        seen = set()
+        new = []
+        for result in results:
+            if not isinstance(result, dict) or not result.get("bssid"):
+                continue
+            bssid = result["bssid"]
+            if bssid in seen:
+                continue
+            seen.add(bssid)
+            row = self._rows.get(bssid)
+            if row is None:
+                new.append(result)
+                continue
+            self._missed[row] = 0
+            values = display_values(result)
+            old = self._values[row]
+            if values == old:
+                continue
+            changed = [c for c in range(len(COLUMNS)) if values[c] != old[c]]
+            self._values[row] = values
+            self._bands[row] = band_of(result)
+            self.dataChanged.emit(self.index(row, changed[0]), self.index(row, changed[-1]))
+
+        for row, bssid in enumerate(self._bssids):
+            if bssid not in seen:
+                self._missed[row] += 1
+        self._age_out()
+
+        if new:
+            first = len(self._bssids)
+            self.beginInsertRows(QModelIndex(), first, first + len(new) - 1)
+            for result in new:
+                self._append(result)
+            self.endInsertRows()
+
+    def _age_out(self):
+        stale = [row for row, missed in enumerate(self._missed) if missed > self.max_missed]
+        if not stale:
+            return
+        # contiguous runs from the bottom up, so the earlier row numbers stay valid
+        runs = []
+        for row in stale:
+            if runs and runs[-1][1] == row - 1:
+                runs[-1][1] = row
+            else:
+                runs.append([row, row])
+        for first, last in reversed(runs):
+            self.beginRemoveRows(QModelIndex(), first, last)
+            for row in range(last, first - 1, -1):
+                del self._rows[self._bssids[row]]
+                del self._bssids[row], self._values[row], self._bands[row], self._missed[row]
+            self.endRemoveRows()
+        self._rows = {bssid: row for row, bssid in enumerate(self._bssids)}
+
+
+class ScanFilterProxy(QSortFilterProxyModel):
+    # filters on SSID text, band and minimum RSSI, sorts numerically through SORT_ROLE
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.ssid_filter = ""
+        self.band_filter = None
+        self.min_rssi = None
+        self.setSortRole(SORT_ROLE)
+        self.setDynamicSortFilter(True)
+
+    def set_ssid_filter(self, text):
+        self.ssid_filter = text.casefold()
+        self.invalidateFilter()
+
+    def set_band_filter(self, band):
+        self.band_filter = band or None
+        self.invalidateFilter()
+
+    def set_min_rssi(self, rssi):
+        self.min_rssi = rssi
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        model = self.sourceModel()
+        if self.band_filter and model.band(source_row) != self.band_filter:
+            return False
+        if self.min_rssi is not None and model.rssi(source_row) < self.min_rssi:
+            return False
+        if self.ssid_filter:
+            ssid = model.data(model.index(source_row, 1))
+            return self.ssid_filter in ssid.casefold()
+        return True
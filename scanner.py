@@ -0,0 +1,328 @@
+import json
+import os
+import tempfile
+import time
+from collections import deque
+from pathlib import Path
+
+from PyQt6.QtCore import QObject, QProcess, QTimer, pyqtSignal
+
+from perf_trace import TRACER, span
+
+# Scanner backends deliver one list of BSSID dicts (lswifi "scan_data") per scan.
+# ProcessScanner reads the JSON document from a process stdout, LswifiScanner runs lswifi and
+# ReplayScanner plays back a trace recorded with any backend, so the capture path runs on Linux.
+# ScanScheduler decides when the next scan starts.
+
+
+def parse_scan_output(data):
+    if isinstance(data, (bytes, bytearray)):
+        data = bytes(data).decode("utf-8", errors="replace")
+    start = data.find("{")
+    end = data.rfind("}")
+    if start < 0 or end < start:
+        raise ValueError("no JSON document in scanner output")
+    scan_data = json.loads(data[start:end + 1]).get("scan_data", [])
+    # lswifi appends to an existing file, in that case the last scan is the newest one
+    if scan_data and isinstance(scan_data[-1], list):
+        scan_data = scan_data[-1]
+    return scan_data
+
+
+class ScannerBackend(QObject):
+    scan_finished = pyqtSignal(list)
+    scan_failed = pyqtSignal(str)
+
+    def __init__(self, parent=None, record_path=None):
+        super().__init__(parent)
+        self.record_path = record_path
+        self._record_start = None
+        self._scan_started = None
+        self._scan_span = None
+        # failures end the scan span as well, including the timeouts ScanScheduler reports
+        self.scan_failed.connect(self._scan_span_failed)
+
+    def start_scan(self):
+        if self.is_running():
+            return
+        # a scan killed by stop() never reports back
+        self._end_scan_span(failed="stopped")
+        self._scan_started = time.monotonic()
+        self._scan_span = TRACER.begin("scan", backend=type(self).__name__)
+        self._start()
+
+    def _start(self):
+        raise NotImplementedError
+
+    def is_running(self):
+        return False
+
+    def stop(self):
+        pass
+
+    def _scan_span_failed(self, error):
+        self._end_scan_span(failed=error)
+
+    def _end_scan_span(self, **args):
+        TRACER.end(self._scan_span, **args)
+        self._scan_span = None
+
+    def deliver(self, scan_data):
+        if self.record_path:
+            now = time.monotonic()
+            started = self._scan_started if self._scan_started is not None else now
+            if self._record_start is None:
+                self._record_start = started
+            record = {"t": started - self._record_start, "duration": now - started, "scan_data": scan_data}
+            with open(self.record_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+        self._end_scan_span(bssids=len(scan_data))
+        self.scan_finished.emit(scan_data)
+
+
+class ProcessScanner(ScannerBackend):
+
+    def __init__(self, program, arguments=(), working_directory=None, parent=None, record_path=None):
+        super().__init__(parent, record_path)
+        self.program = program
+        self.arguments = list(arguments)
+        self._output = bytearray()
+        self._stopped = False
+        self.proc = QProcess(self)
+        if working_directory:
+            self.proc.setWorkingDirectory(str(working_directory))
+        self.proc.readyReadStandardOutput.connect(self._read_output)
+        self.proc.finished.connect(self._on_finished)
+        self.proc.errorOccurred.connect(self._on_error)
+
+    def is_running(self):
+        return self.proc.state() != QProcess.ProcessState.NotRunning
+
+    def _start(self):
+        self._stopped = False
+        self._output.clear()
+        self.proc.start(self.program, self.arguments)
+
+    def stop(self):
+        try:
+            if self.is_running():
+                self._stopped = True
+                self.proc.kill()
+                self.proc.waitForFinished(1000)
+        except Exception:
+            pass
+
+    def _read_output(self):
+        self._output += self.proc.readAllStandardOutput().data()
+
+    def _on_error(self, error):
+        if error == QProcess.ProcessError.FailedToStart:
+            self.scan_failed.emit(f"{self.program} failed to start")
+
+    def _on_finished(self, exit_code, exit_status):
+        self._read_output()
+        if self._stopped:
+            return
+        if exit_status != QProcess.ExitStatus.NormalExit:
+            self.scan_failed.emit(f"{self.program} crashed")
+            return
+        try:
+            with span("parse"):
+                scan_data = self.read_result()
+        except (ValueError, OSError) as e:
+            self.scan_failed.emit(str(e))
+            return
+        self.deliver(scan_data)
+
+    def read_result(self):
+        return parse_scan_output(self._output)
+
+
+class LswifiScanner(ProcessScanner):
+    # lswifi can only export JSON to a file and appends to it when it exists, so it writes to a
+    # private file in a temp directory that is read back in one go and removed after each scan.
+    # The directory is created by the first scan and removed by stop(), or at exit at the latest.
+
+    def __init__(self, working_directory=None, program="lswifi.exe", parent=None, record_path=None):
+        super().__init__(program, [], working_directory, parent, record_path)
+        self._json_dir = None
+        self.json_path = None
+
+    def _start(self):
+        if self._json_dir is None:
+            self._json_dir = tempfile.TemporaryDirectory(prefix="lswifi-")
+            self.json_path = os.path.join(self._json_dir.name, "scan.json")
+            self.arguments = ["--json", self.json_path]
+        Path(self.json_path).unlink(missing_ok=True)
+        super()._start()
+
+    def stop(self):
+        super().stop()
+        if self._json_dir is not None:
+            self._json_dir.cleanup()
+            self._json_dir = None
+
+    def read_result(self):
+        p = Path(self.json_path)
+        if not p.exists():
+            # lswifi writes no file when it hears no networks, an empty scan is not a failure
+            return []
+        data = p.read_bytes()
+        p.unlink(missing_ok=True)
+        return parse_scan_output(data)
+
+
+class ReplayScanner(ScannerBackend):
+    # plays back a JSON lines trace of {"t": start, "duration": seconds, "scan_data": [...]} as written
+    # by record_path, or a single lswifi JSON export. Each replayed scan takes its recorded duration
+    # divided by speed, speed 0 delivers on the next event loop pass.
+
+    def __init__(self, trace_path, speed=1.0, loop=False, parent=None, record_path=None):
+        super().__init__(parent, record_path)
+        self.speed = speed
+        self.loop = loop
+        self.scans = self.load_trace(trace_path)
+        self.position = 0
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._emit_next)
+
+    @staticmethod
+    def load_trace(trace_path):
+        text = Path(trace_path).read_text(encoding="utf-8")
+        try:
+            document = json.loads(text)
+        except json.JSONDecodeError:
+            document = None
+        if isinstance(document, dict) and "t" not in document:
+            return [(0.0, parse_scan_output(text))]
+        scans = []
+        for line in text.splitlines():
+            if line.strip():
+                record = json.loads(line)
+                scans.append((float(record.get("duration", 0.0)), record["scan_data"]))
+        return scans
+
+    def is_running(self):
+        return self._timer.isActive()
+
+    def _start(self):
+        if self.position >= len(self.scans):
+            if not self.loop or not self.scans:
+                self.scan_failed.emit("end of replay trace")
+                return
+            self.position = 0
+        duration = self.scans[self.position][0]
+        delay = duration / self.speed if self.speed > 0 else 0.0
+        self._timer.start(int(delay * 1000))
+
+    def stop(self):
+        self._timer.stop()
+
+    def _emit_next(self):
+        _, scan_data = self.scans[self.position]
+        self.position += 1
+        self.deliver(scan_data)
+
+
+class ScanScheduler(QObject):
+    # Starts the next scan as soon as the previous one is delivered, but never sooner than
+    # min_interval after the previous start. A failed or timed out scan doubles the wait, up to
+    # max_backoff, until a scan succeeds again. Achieved scans per minute are counted over the
+    # last RATE_WINDOW seconds.
+    RATE_WINDOW = 60.0
+    stats_changed = pyqtSignal(float, float)
+
+    def __init__(self, scanner, min_interval=1.0, timeout=30.0, max_backoff=30.0, parent=None):
+        super().__init__(parent)
+        self.scanner = scanner
+        self.min_interval = min_interval
+        self.timeout = timeout
+        self.max_backoff = max_backoff
+        self.failures = 0
+        self.latency = 0.0
+        self.scanning = False
+        self._active = False
+        self._started = None
+        self._completed = deque()
+        self._next = QTimer(self)
+        self._next.setSingleShot(True)
+        self._next.timeout.connect(self._start_scan)
+        self._watchdog = QTimer(self)
+        self._watchdog.setSingleShot(True)
+        self._watchdog.timeout.connect(self._on_timeout)
+        scanner.scan_finished.connect(self._on_finished)
+        scanner.scan_failed.connect(self._on_failed)
+
+    def is_active(self):
+        return self._active
+
+    def start(self):
+        self._active = True
+        self.failures = 0
+        self._completed.clear()
+        self._start_scan()
+
+    def stop(self):
+        self._active = False
+        self._next.stop()
+        self._watchdog.stop()
+        self.scanning = False
+        self.scanner.stop()
+
+    def scans_per_minute(self):
+        now = time.monotonic()
+        while self._completed and now - self._completed[0] > self.RATE_WINDOW:
+            self._completed.popleft()
+        if not self._completed:
+            return 0.0
+        if len(self._completed) == 1:
+            return 60.0 / max(self.latency, self.min_interval, 1e-3)
+        return (len(self._completed) - 1) * 60.0 / max(now - self._completed[0], 1e-3)
+
+    def _start_scan(self):
+        if not self._active or self.scanning:
+            return
+        self.scanning = True
+        self._started = time.monotonic()
+        if self.timeout:
+            self._watchdog.start(int(self.timeout * 1000))
+        self.scanner.start_scan()
+
+    def _schedule_next(self):
+        if not self._active:
+            return
+        if self.failures:
+            delay = min(self.min_interval * 2 ** self.failures, self.max_backoff)
+        else:
+            delay = self.min_interval
+        delay -= time.monotonic() - self._started
+        self._next.start(max(0, int(delay * 1000)))
+
+    def _on_finished(self, scan_data):
+        # a scan killed by the watchdog or stop() is no longer in flight, its late result is ignored
+        if not self.scanning:
+            return
+        self.scanning = False
+        self._watchdog.stop()
+        now = time.monotonic()
+        self.latency = now - self._started
+        self.failures = 0
+        self._completed.append(now)
+        self.stats_changed.emit(self.scans_per_minute(), self.latency)
+        self._schedule_next()
+
+    def _on_failed(self, error):
+        if not self.scanning:
+            return
+        self.scanning = False
+        self._watchdog.stop()
+        self.failures += 1
+        self._schedule_next()
+
+    def _on_timeout(self):
+        self.scanning = False
+        self.failures += 1
+        self.scanner.stop()
+        self.scanner.scan_failed.emit(f"scan timed out after {self.timeout:g} s")
+        self._schedule_next()
@@ -0,0 +1,112 @@
+import argparse
+import sys
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from project_io import write_project
+
+# Synthetic surveys for benchmarks and load tests. Access points are placed at random on the
+# floor plan and every scan location hears the strongest bssids_per_scan of them, with RSSI from
+# a log-distance path-loss model: rssi = p0 - 10 * n * log10(d / 1 m) + noise.
+# https://en.wikipedia.org/wiki/Log-distance_path_loss_model
+
+BANDS = [
+    # (frequency GHz, channels, channel width MHz)
+    ("2.4", [1, 6, 11], 20),
+    ("5", [36, 40, 44, 48, 52, 100, 149], 80),
+    ("6", [5, 37, 69], 160),
+]
+
+
+def channel_frequency(band, channel):
+    if band == "2.4":
+        return 2.407 + 0.005 * channel
+    if band == "5":
+        return 5.000 + 0.005 * channel
+    return 5.950 + 0.005 * channel
+
+
+def generate_survey(width_pixels=2000, height_pixels=1500, scale=0.02, locations=500, access_points=40,
+                    bssids_per_scan=20, path_loss_exponent=3.0, p0=-35.0, noise_db=4.0, ssids=5, seed=0):
+    rng = np.random.default_rng(seed)
+    ap_x = rng.uniform(0, width_pixels, access_points)
+    ap_y = rng.uniform(0, height_pixels, access_points)
+    aps = []
+    for i in range(access_points):
+        band, channels, width = BANDS[i % len(BANDS)]
+        channel = int(rng.choice(channels))
+        aps.append({
+            "bssid": "02:00:00:%02x:%02x:%02x" % (i >> 16 & 0xff, i >> 8 & 0xff, i & 0xff),
+            "ssid": f"Network{i % ssids}",
+            "channel_frequency": f"{channel_frequency(band, channel):.3f}",
+            "channel_number": str(channel),
+            "channel_width": str(width),
+            "phy_type": "ax",
+        })
+
+    # a random walk, the way a surveyor moves through the building
+    steps = rng.normal(0, 0.03, (locations, 2)) * [width_pixels, height_pixels]
+    walk = np.cumsum(steps, axis=0) + [width_pixels / 2, height_pixels / 2]
+    walk[:, 0] = np.abs((walk[:, 0] + width_pixels) % (2 * width_pixels) - width_pixels)
+    walk[:, 1] = np.abs((walk[:, 1] + height_pixels) % (2 * height_pixels) - height_pixels)
+    walk = np.minimum(walk, [width_pixels - 1, height_pixels - 1])
+
+    distance = np.hypot(walk[:, 0, None] - ap_x[None, :], walk[:, 1, None] - ap_y[None, :]) * scale
+    rssi = p0 - 10 * path_loss_exponent * np.log10(np.maximum(distance, 1.0))
+    rssi += rng.normal(0, noise_db, rssi.shape)
+    rssi = np.clip(np.round(rssi), -100, -20).astype(int)
+    heard = np.argsort(-rssi, axis=1)[:, :min(bssids_per_scan, access_points)]
+
+    rows = []
+    for k in range(locations):
+        x, y = float(walk[k, 0]), float(walk[k, 1])
+        timestamp = f"{1700000000 + 3 * k:.6f}"
+        for i in heard[k]:
+            rows.append({"x": x, "y": y, "timestamp": timestamp, "interface_mac": "02:00:00:ff:ff:ff",
+                         "rssi": int(rssi[k, i]), **aps[i]})
+    return rows
+
+
+def generate_floorplan(width_pixels=2000, height_pixels=1500, rooms=6, seed=0):
+    rng = np.random.default_rng(seed)
+    image = Image.new("RGB", (width_pixels, height_pixels), "white")
+    draw = ImageDraw.Draw(image)
+    wall = max(2, width_pixels // 400)
+    margin = width_pixels // 20
+    draw.rectangle([margin, margin, width_pixels - margin, height_pixels - margin], outline="black", width=wall)
+    for x in np.linspace(margin, width_pixels - margin, rooms + 1)[1:-1]:
+        x = int(x + rng.integers(-margin // 2, margin // 2 + 1))
+        draw.line([x, margin, x, height_pixels // 2 - margin // 2], fill="black", width=wall)
+    draw.line([margin, height_pixels // 2, width_pixels - margin, height_pixels // 2], fill="black", width=wall)
+    return image
+
+
+def survey_for_rows(rows, bssids_per_scan=20, **kwargs):
+    locations = max(1, rows // bssids_per_scan)
+    return generate_survey(locations=locations, bssids_per_scan=bssids_per_scan, **kwargs)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic .wht survey project")
+    parser.add_argument("output")
+    parser.add_argument("--width", type=int, default=2000)
+    parser.add_argument("--height", type=int, default=1500)
+    parser.add_argument("--scale", type=float, default=0.02, help="metres per pixel")
+    parser.add_argument("--locations", type=int, default=500)
+    parser.add_argument("--access-points", type=int, default=40)
+    parser.add_argument("--bssids-per-scan", type=int, default=20)
+    parser.add_argument("--path-loss-exponent", type=float, default=3.0)
+    parser.add_argument("--noise", type=float, default=4.0, help="RSSI noise standard deviation in dB")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rows = generate_survey(args.width, args.height, args.scale, args.locations, args.access_points,
+                           args.bssids_per_scan, args.path_loss_exponent, noise_db=args.noise, seed=args.seed)
+    write_project(args.output, rows, generate_floorplan(args.width, args.height, seed=args.seed), args.scale)
+    print(f"{args.output}: {len(rows)} rows")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())